@@ -0,0 +1,382 @@
+"""
+<Program Name>
+  chunks.py
+
+<Started>
+  October 18, 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Hash large targets in fixed-size chunks, so that a client can verify a
+  target chunk by chunk as it is downloaded instead of only once it is
+  complete.  A mirror that sends a bad chunk is dropped right away, and
+  chunks downloaded from different mirrors can be combined safely.
+
+  The repository lists the chunk size and the Merkle root of the chunk
+  hashes in the 'custom' field of the target's file information:
+
+    'custom': {'chunks': {'size': 1048576, 'algorithm': 'sha256',
+                          'root': <Merkle root>}}
+
+  The chunk hashes themselves, one hexdigest per line, are stored under
+  CHUNKS_DIRECTORY in the targets directory (see
+  get_chunk_hashes_filepath()).  The client downloads them and trusts them
+  only if their Merkle root matches the one in the signed metadata.
+
+"""
+
+import binascii
+
+import tuf
+import tuf.formats
+import tuf.hash
+
+
+# The directory, relative to the targets directory of the repository and
+# the 'targets_path' of the mirrors, under which the chunk hashes are
+# stored.
+CHUNKS_DIRECTORY = '.chunks'
+
+# The default size of the chunks.  Targets no larger than one chunk are
+# not chunked.
+DEFAULT_CHUNK_SIZE = 1048576
+
+# The hash algorithm of the chunks and of the Merkle tree.
+CHUNK_HASH_ALGORITHM = 'sha256'
+
+# Prefixed to the two children of an interior node of the Merkle tree
+# before they are hashed, so interior nodes and chunks hash differently.
+_NODE_PREFIX = '\x01'
+
+
+
+
+
+def get_chunk_hashes_filepath(target_filepath):
+  """
+  <Purpose>
+    Get the path of the chunk hashes of 'target_filepath'.
+
+  <Arguments>
+    target_filepath:
+      The path of the target, relative to the targets directory.
+
+  <Returns>
+    The path of the chunk hashes, relative to the targets directory.
+
+  """
+
+  return '/'.join([CHUNKS_DIRECTORY, target_filepath.lstrip('/') + '.chunks'])
+
+
+
+
+
+def get_chunk_hashes_length(target_length, chunk_size,
+                            algorithm=CHUNK_HASH_ALGORITHM):
+  """
+  <Purpose>
+    Get the length of the chunk hashes file of a target of 'target_length'
+    bytes, which is known in advance: one hexdigest and newline per chunk.
+
+  <Exceptions>
+    tuf.UnsupportedAlgorithmError, if 'algorithm' is not supported.
+
+  <Returns>
+    The length in bytes.
+
+  """
+
+  chunk_count = (target_length + chunk_size - 1) // chunk_size
+  digest_size = tuf.hash.digest(algorithm).digest_size
+  return chunk_count * (digest_size * 2 + 1)
+
+
+
+
+
+def get_merkle_root(chunk_hashes, algorithm=CHUNK_HASH_ALGORITHM):
+  """
+  <Purpose>
+    Compute the root of the Merkle tree whose leaves are 'chunk_hashes'.
+    Each interior node is the hash of its two children; a node without a
+    sibling is carried up to the next level unchanged.
+
+  <Arguments>
+    chunk_hashes:
+      The list of the hexdigests of the chunks, in order.
+
+    algorithm:
+      The hash algorithm of the tree.
+
+  <Returns>
+    The hexdigest of the root.
+
+  """
+
+  level = [binascii.unhexlify(chunk_hash) for chunk_hash in chunk_hashes]
+  if not level:
+    return tuf.hash.digest(algorithm).hexdigest()
+
+  while len(level) > 1:
+    next_level = []
+    for index in range(0, len(level) - 1, 2):
+      digest_object = tuf.hash.digest(algorithm)
+      digest_object.update(_NODE_PREFIX + level[index] + level[index + 1])
+      next_level.append(digest_object.digest())
+    if len(level) % 2:
+      next_level.append(level[-1])
+    level = next_level
+
+  return binascii.hexlify(level[0])
+
+
+
+
+
+def generate_chunk_hashes(target_filename, chunk_hashes_filename,
+                          chunk_size=DEFAULT_CHUNK_SIZE):
+  """
+  <Purpose>
+    Hash 'target_filename' in chunks and write the chunk hashes to
+    'chunk_hashes_filename'.
+
+  <Arguments>
+    target_filename:
+      The target file.
+
+    chunk_hashes_filename:
+      The file to write the chunk hashes to.  Its parent directory must
+      exist.
+
+    chunk_size:
+      The size of the chunks.
+
+  <Exceptions>
+    IOError, if the files cannot be read or written.
+
+  <Side Effects>
+    The chunk hashes file is written.
+
+  <Returns>
+    The chunk information to list in the target's file information,
+    conformant to 'tuf.formats.CHUNKINFO_SCHEMA'.
+
+  """
+
+  chunk_hashes = []
+  target_file = open(target_filename, 'rb')
+  try:
+    while True:
+      data = target_file.read(chunk_size)
+      if not data:
+        break
+      digest_object = tuf.hash.digest(CHUNK_HASH_ALGORITHM)
+      digest_object.update(data)
+      chunk_hashes.append(digest_object.hexdigest())
+  finally:
+    target_file.close()
+
+  chunk_hashes_file = open(chunk_hashes_filename, 'wb')
+  try:
+    for chunk_hash in chunk_hashes:
+      chunk_hashes_file.write(chunk_hash + '\n')
+  finally:
+    chunk_hashes_file.close()
+
+  return {'size': chunk_size, 'algorithm': CHUNK_HASH_ALGORITHM,
+          'root': get_merkle_root(chunk_hashes)}
+
+
+
+
+
+def load_chunk_hashes(file_object, chunkinfo, target_length):
+  """
+  <Purpose>
+    Read the chunk hashes of a target and verify them against the trusted
+    chunk information.
+
+  <Arguments>
+    file_object:
+      The chunk hashes file, e.g. a downloaded 'tuf.util.TempFile'.
+
+    chunkinfo:
+      The trusted chunk information of the target, conformant to
+      'tuf.formats.CHUNKINFO_SCHEMA'.
+
+    target_length:
+      The trusted length of the target.
+
+  <Exceptions>
+    tuf.FormatError, if the chunk hashes file is malformed.
+
+    tuf.BadHashError, if the chunk hashes do not match the trusted Merkle
+    root.
+
+  <Returns>
+    A ChunkHashes object.
+
+  """
+
+  tuf.formats.CHUNKINFO_SCHEMA.check_match(chunkinfo)
+
+  file_object.seek(0)
+  chunk_hashes = file_object.read().lower().split('\n')
+  if chunk_hashes and chunk_hashes[-1] == '':
+    chunk_hashes.pop()
+
+  chunk_count = (target_length + chunkinfo['size'] - 1) // chunkinfo['size']
+  if len(chunk_hashes) != chunk_count:
+    raise tuf.FormatError('Expected '+str(chunk_count)+' chunk hashes, got '+
+                          str(len(chunk_hashes))+'.')
+  try:
+    root = get_merkle_root(chunk_hashes, chunkinfo['algorithm'])
+  except TypeError, e:
+    raise tuf.FormatError('Malformed chunk hashes: '+str(e))
+
+  if root != chunkinfo['root'].lower():
+    raise tuf.BadHashError('The chunk hashes do not match their Merkle root.')
+
+  return ChunkHashes(chunk_hashes, chunkinfo['size'], chunkinfo['algorithm'])
+
+
+
+
+
+class ChunkHashes(object):
+  """
+  <Purpose>
+    The verified chunk hashes of a target.
+
+  <Arguments>
+    chunk_hashes:
+      The list of the hexdigests of the chunks, in order.
+
+    chunk_size:
+      The size of the chunks.
+
+    algorithm:
+      The hash algorithm of the chunks.
+
+  """
+
+  def __init__(self, chunk_hashes, chunk_size,
+               algorithm=CHUNK_HASH_ALGORITHM):
+    self.chunk_hashes = chunk_hashes
+    self.chunk_size = chunk_size
+    self.algorithm = algorithm
+
+
+
+  def check_chunk(self, index, data):
+    """
+    <Purpose>
+      Check the data of the chunk at 'index'.
+
+    <Exceptions>
+      tuf.BadHashError, if the data does not match the chunk's hash.
+
+    """
+
+    digest_object = tuf.hash.digest(self.algorithm)
+    digest_object.update(data)
+    if index >= len(self.chunk_hashes) or \
+       digest_object.hexdigest() != self.chunk_hashes[index]:
+      raise tuf.BadHashError('Chunk '+str(index)+' does not match its '+
+                             'hash.')
+
+
+
+  def check_range(self, first_byte, data):
+    """
+    <Purpose>
+      Check 'data', the bytes of the target starting at 'first_byte'.  The
+      range must start on a chunk boundary and consist of whole chunks, or
+      end at the end of the target.
+
+    <Exceptions>
+      tuf.BadHashError, if one of the chunks does not match its hash.
+
+    """
+
+    if first_byte % self.chunk_size:
+      raise tuf.Error('The range does not start on a chunk boundary.')
+
+    first_index = first_byte // self.chunk_size
+    for offset in range(0, len(data), self.chunk_size):
+      self.check_chunk(first_index + offset // self.chunk_size,
+                       data[offset:offset+self.chunk_size])
+
+
+
+
+
+class ChunkVerifier(object):
+  """
+  <Purpose>
+    Verify a target chunk by chunk as it is downloaded, from its beginning.
+
+  <Arguments>
+    chunk_hashes:
+      The ChunkHashes of the target.
+
+  """
+
+  def __init__(self, chunk_hashes):
+    self.chunk_hashes = chunk_hashes
+    # The number of bytes verified so far, always whole chunks.
+    self.verified_length = 0
+    self._buffered_data = []
+    self._buffered_length = 0
+
+
+
+  def update(self, data):
+    """
+    <Purpose>
+      Verify the chunks 'data' completes.
+
+    <Exceptions>
+      tuf.BadHashError, if a chunk does not match its hash.
+
+    """
+
+    chunk_size = self.chunk_hashes.chunk_size
+    self._buffered_data.append(data)
+    self._buffered_length = self._buffered_length + len(data)
+    if self._buffered_length < chunk_size:
+      return
+
+    buffered_data = ''.join(self._buffered_data)
+    offset = 0
+    while len(buffered_data) - offset >= chunk_size:
+      self.chunk_hashes.check_chunk(self.verified_length // chunk_size,
+                                    buffered_data[offset:offset+chunk_size])
+      offset = offset + chunk_size
+      self.verified_length = self.verified_length + chunk_size
+
+    self._buffered_data = [buffered_data[offset:]]
+    self._buffered_length = len(buffered_data) - offset
+
+
+
+  def finish(self):
+    """
+    <Purpose>
+      Verify the last, shorter chunk, once the whole target was received.
+
+    <Exceptions>
+      tuf.BadHashError, if the chunk does not match its hash.
+
+    """
+
+    if self._buffered_length:
+      self.chunk_hashes.check_chunk(
+        self.verified_length // self.chunk_hashes.chunk_size,
+        ''.join(self._buffered_data))
+      self.verified_length = self.verified_length + self._buffered_length
+      self._buffered_data = []
+      self._buffered_length = 0
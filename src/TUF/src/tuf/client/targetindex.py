@@ -0,0 +1,169 @@
+"""
+<Program Name>
+  targetindex.py
+
+<Started>
+  October 18, 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Index the targets listed by the targets roles a client has loaded, by
+  target path, so that looking up a target does not scan every role.  The
+  updater replaces the entries of a role whenever it loads or updates the
+  role's metadata, and drops them when the role is deleted.
+
+  Besides exact lookups, the index lists the target paths under a prefix
+  or matching a glob pattern (e.g., 'packages/linux/*'), for directory-style
+  queries.
+
+"""
+
+import bisect
+import fnmatch
+
+
+# The characters that start a wildcard in a glob pattern (see 'fnmatch').
+_WILDCARD_CHARACTERS = '*?['
+
+
+
+
+
+class TargetIndex(object):
+  """
+  <Purpose>
+    Map each target path to the roles that list it and the file
+    information they list for it.
+
+  <Arguments>
+    None.
+
+  """
+
+  def __init__(self):
+    # The indexed targets.  The dict keys are target paths, the dict values
+    # dicts of the fileinfo of the target by role.
+    self._targets = {}
+
+    # The target paths indexed for each role.
+    self._role_filepaths = {}
+
+    # The sorted target paths, for prefix listing.  Built on demand, and
+    # reset whenever a role is added or removed.
+    self._sorted_filepaths = None
+
+
+
+  def add_role(self, rolename, targets):
+    """
+    <Purpose>
+      Index the targets of 'rolename', replacing the ones indexed for it
+      before.
+
+    <Arguments>
+      rolename:
+        The name of the targets role, e.g. 'targets/linux/x86'.
+
+      targets:
+        The 'targets' field of the role's metadata: a dict of the fileinfo
+        of each target by path.
+
+    <Returns>
+      None.
+
+    """
+
+    self.remove_role(rolename)
+
+    for filepath, fileinfo in targets.items():
+      self._targets.setdefault(filepath, {})[rolename] = fileinfo
+    self._role_filepaths[rolename] = targets.keys()
+    self._sorted_filepaths = None
+
+
+
+  def remove_role(self, rolename):
+    """
+    <Purpose>
+      Drop the targets indexed for 'rolename', if any.
+
+    <Returns>
+      None.
+
+    """
+
+    filepaths = self._role_filepaths.pop(rolename, None)
+    if filepaths is None:
+      return
+
+    for filepath in filepaths:
+      role_fileinfo = self._targets[filepath]
+      del role_fileinfo[rolename]
+      if not role_fileinfo:
+        del self._targets[filepath]
+    self._sorted_filepaths = None
+
+
+
+  def get(self, target_filepath):
+    """
+    <Purpose>
+      Look up 'target_filepath'.
+
+    <Returns>
+      A dict of the fileinfo listed for 'target_filepath' by role, empty
+      if no role lists it.
+
+    """
+
+    return dict(self._targets.get(target_filepath, {}))
+
+
+
+  def list_filepaths(self, prefix='', pattern=None):
+    """
+    <Purpose>
+      List the indexed target paths that start with 'prefix' and, if
+      'pattern' is given, match the glob 'pattern'.  Note that '*' also
+      matches '/', so 'a/*' lists every target under 'a/'.
+
+    <Arguments>
+      prefix:
+        The prefix of the target paths, e.g. a directory such as 'a/b/'.
+
+      pattern:
+        A glob pattern (see 'fnmatch'), e.g. 'a/b/*.tar.gz'.
+
+    <Returns>
+      The sorted list of the matching target paths.
+
+    """
+
+    # Only the target paths that start with the literal part of the
+    # pattern can match it.
+    if pattern is not None:
+      literal_prefix = pattern
+      for index, character in enumerate(pattern):
+        if character in _WILDCARD_CHARACTERS:
+          literal_prefix = pattern[:index]
+          break
+      if literal_prefix.startswith(prefix):
+        prefix = literal_prefix
+      elif not prefix.startswith(literal_prefix):
+        return []
+
+    if self._sorted_filepaths is None:
+      self._sorted_filepaths = sorted(self._targets.keys())
+
+    filepaths = []
+    index = bisect.bisect_left(self._sorted_filepaths, prefix)
+    while index < len(self._sorted_filepaths) and \
+          self._sorted_filepaths[index].startswith(prefix):
+      filepath = self._sorted_filepaths[index]
+      if pattern is None or fnmatch.fnmatchcase(filepath, pattern):
+        filepaths.append(filepath)
+      index = index + 1
+
+    return filepaths
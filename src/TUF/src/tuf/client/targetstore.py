@@ -0,0 +1,280 @@
+"""
+<Program Name>
+  targetstore.py
+
+<Started>
+  October 18, 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Keep a single copy of every verified target on the host, so that
+  applications (or destination directories) that need the same target do
+  not download it again.  Targets are stored by their sha256 hash under
+  '{tuf.conf.repository_directory}/targets_store/' and hard linked into
+  their destination directories.  Where hard links are not possible, e.g.
+  across filesystems, the target is copied out of the store instead.
+
+  A stored target is referenced by the destinations it is hard linked to,
+  so a target whose link count dropped to one is no longer used and is
+  removed by TargetStore.collect_garbage(), which the updater calls from
+  remove_obsolete_targets().  A target that was copied rather than linked
+  into its destinations has a link count of one too, and is removed at the
+  next collection; it is downloaded again if it is needed later.
+
+  The store is enabled by 'tuf.conf.use_target_store'.
+
+"""
+
+import os
+import shutil
+import time
+import logging
+
+import tuf
+import tuf.hash
+import tuf.util
+
+# See 'log.py' to learn how logging is handled in TUF.
+logger = logging.getLogger('tuf.targetstore')
+
+# The directory of the store, relative to 'tuf.conf.repository_directory'.
+STORE_DIRECTORY = 'targets_store'
+
+# The hash algorithm targets are stored by.
+STORE_HASH_ALGORITHM = 'sha256'
+
+# Temporary files older than this many seconds are left over from
+# interrupted downloads and removed by collect_garbage().
+STALE_TEMPORARY_FILE_AGE = 3600
+
+
+
+
+
+class TargetStore(object):
+  """
+  <Purpose>
+    A content-addressed store of verified target files.
+
+  <Arguments>
+    store_directory:
+      The directory the targets are stored in.  It is created if needed.
+
+  """
+
+  def __init__(self, store_directory):
+    self.store_directory = store_directory
+
+
+
+  def get_target_path(self, fileinfo):
+    """
+    <Purpose>
+      Get the path in the store of the target described by 'fileinfo'.
+
+    <Arguments>
+      fileinfo:
+        The trusted file information of the target, conformant to
+        'tuf.formats.FILEINFO_SCHEMA'.
+
+    <Returns>
+      The path, or None if the target cannot be stored because its
+      metadata does not list its sha256 hash.
+
+    """
+
+    digest = fileinfo['hashes'].get(STORE_HASH_ALGORITHM)
+    if digest is None:
+      return None
+
+    return os.path.join(self.store_directory, digest[:2], digest)
+
+
+
+  def get_temp_directory(self, fileinfo):
+    """
+    <Purpose>
+      Get the directory a download of the target should be stored in, so
+      that add() can rename it into the store (see 'tuf.util.TempFile').
+
+    <Returns>
+      The directory, or None if the target cannot be stored.
+
+    """
+
+    target_path = self.get_target_path(fileinfo)
+    if target_path is None:
+      return None
+
+    directory = os.path.dirname(target_path)
+    try:
+      os.makedirs(directory)
+    except OSError, e:
+      if not os.path.isdir(directory):
+        logger.warn('Unable to create '+repr(directory)+': '+str(e))
+        return None
+
+    return directory
+
+
+
+  def add(self, target_file_object, fileinfo):
+    """
+    <Purpose>
+      Store a downloaded and verified target.
+
+    <Arguments>
+      target_file_object:
+        The 'tuf.util.TempFile' of the target, preferably created in
+        get_temp_directory().  It is moved into the store.
+
+      fileinfo:
+        The trusted file information the target was verified against.
+
+    <Returns>
+      True if the target was stored, False if it cannot be.  The TempFile
+      is left untouched in that case.
+
+    """
+
+    if self.get_temp_directory(fileinfo) is None:
+      return False
+
+    target_file_object.move(self.get_target_path(fileinfo))
+    return True
+
+
+
+  def materialize(self, fileinfo, destination, verify=True):
+    """
+    <Purpose>
+      Install the stored target described by 'fileinfo' at 'destination',
+      replacing the file there atomically.
+
+    <Arguments>
+      fileinfo:
+        The trusted file information of the target.
+
+      destination:
+        The path of the target in a destination directory.  Its parent
+        directory must exist.
+
+      verify:
+        Whether to check the stored target against 'fileinfo' first.  A
+        stored target can have been changed through one of its hard links,
+        in which case it is removed from the store.
+
+    <Side Effects>
+      The target is hard linked or copied to 'destination'.
+
+    <Returns>
+      True if the target was installed, False if the store does not have
+      it.
+
+    """
+
+    target_path = self.get_target_path(fileinfo)
+    if target_path is None or not os.path.isfile(target_path):
+      return False
+
+    if verify and not self._matches(target_path, fileinfo):
+      logger.warn('Removing '+repr(target_path)+', it does not match its '+
+                  'trusted metadata.')
+      self._remove(target_path)
+      return False
+
+    # Link the target next to the destination, then rename the link over it.
+    link_path = os.path.join(os.path.dirname(destination),
+                             '.'+os.path.basename(destination)+'.'+
+                             str(os.getpid())+'.link')
+    try:
+      if os.path.lexists(link_path):
+        os.remove(link_path)
+      os.link(target_path, link_path)
+      os.rename(link_path, destination)
+      return True
+
+    # os.link() is not available on Windows, or the destination is on
+    # another filesystem.
+    except (OSError, AttributeError), e:
+      logger.debug('Unable to link '+repr(target_path)+': '+str(e))
+      if os.path.lexists(link_path):
+        self._remove(link_path)
+
+    temp_file = tuf.util.TempFile(directory=os.path.dirname(destination),
+                                  spool_size=0)
+    target_file_object = open(target_path, 'rb')
+    try:
+      shutil.copyfileobj(target_file_object, temp_file.temporary_file)
+    finally:
+      target_file_object.close()
+    temp_file.move(destination)
+
+    return True
+
+
+
+  def collect_garbage(self):
+    """
+    <Purpose>
+      Remove the stored targets no destination links to any more, and the
+      temporary files interrupted downloads left behind.  Stored targets
+      whose destinations are copies rather than hard links are removed
+      too, since nothing links to them.
+
+    <Side Effects>
+      Files are removed from the store.
+
+    <Returns>
+      The number of files removed.
+
+    """
+
+    removed_count = 0
+    now = time.time()
+
+    for root, directories, files in os.walk(self.store_directory):
+      for filename in files:
+        filepath = os.path.join(root, filename)
+        try:
+          file_stat = os.stat(filepath)
+        except OSError:
+          continue
+
+        if filename.startswith('.'):
+          # A temporary file, possibly of a download in progress.
+          unused = now - file_stat.st_mtime > STALE_TEMPORARY_FILE_AGE
+        else:
+          unused = file_stat.st_nlink <= 1
+
+        if unused and self._remove(filepath):
+          removed_count = removed_count + 1
+
+    logger.info('Removed '+str(removed_count)+' unused files from '+
+                repr(self.store_directory)+'.')
+    return removed_count
+
+
+
+  def _matches(self, target_path, fileinfo):
+    if os.path.getsize(target_path) != fileinfo['length']:
+      return False
+
+    for algorithm, digest in fileinfo['hashes'].items():
+      digest_object = tuf.hash.digest_filename(target_path, algorithm=algorithm)
+      if digest_object.hexdigest() != digest:
+        return False
+
+    return True
+
+
+
+  def _remove(self, filepath):
+    try:
+      os.remove(filepath)
+      return True
+    except OSError, e:
+      logger.warn('Unable to remove '+repr(filepath)+': '+str(e))
+      return False
@@ -103,16 +103,24 @@ import os
 import time
 import logging
 import shutil
+import threading
+import Queue
 
+import tuf.delta
 import tuf.formats
+import tuf.hash
+import tuf.hashcache
 import tuf.keydb
 import tuf.roledb
 import tuf.mirrors
 import tuf.download
+import tuf.chunks
 import tuf.conf
 import tuf.log
 import tuf.sig
 import tuf.util
+import tuf.client.targetindex
+import tuf.client.targetstore
 
 logger = logging.getLogger('tuf')
 
@@ -181,6 +189,10 @@ class Repository(object):
       This method performs the actual download of the specified target.  The
       file is saved to the 'destination_directory' argument.
 
+    download_targets(targets, destination_directory):
+      Downloads many targets concurrently with a bounded pool of worker
+      threads, and returns which of them could not be downloaded.
+
     remove_obsolete_targets(destination_directory):
       Any files located in 'destination_directory' that were previously
       served by the repository but have since been removed, can be deleted
@@ -267,6 +279,9 @@ class Repository(object):
     # Store the previously trusted/verified metadata.
     self.metadata['previous'] = {}
 
+    # Index the targets of the current targets roles by target path.
+    self.target_index = tuf.client.targetindex.TargetIndex()
+
     # Store the file information of all the metadata files.  The dict keys are
     # paths, the dict values fileinfo data. This information can help determine
     # whether a metadata file has changed and so needs to be re-downloaded.
@@ -301,6 +316,14 @@ class Repository(object):
       message = 'Missing '+repr(previous_path)+'.  This path must exist.' 
       raise tuf.RepositoryError(message)
     self.metadata_directory['previous'] = previous_path
+
+    # The store of verified targets shared by all destination directories,
+    # if enabled.
+    self.target_store = None
+    if tuf.conf.use_target_store:
+      store_path = os.path.join(repository_directory,
+                                tuf.client.targetstore.STORE_DIRECTORY)
+      self.target_store = tuf.client.targetstore.TargetStore(store_path)
     
     # Load current and previous metadata.
     for metadata_set in ['current', 'previous']:
@@ -398,11 +421,13 @@ class Repository(object):
       self.metadata[metadata_set][metadata_role] = metadata_object
    
       # We need to rebuild the key and role databases if 
-      # metadata object is 'root' or target metadata.
+      # metadata object is 'root' or target metadata.  The targets of
+      # target metadata are indexed too.
       if metadata_set == 'current':
         if metadata_role == 'root':
           self._rebuild_key_and_role_db()
         elif metadata_object['_type'] == 'Targets':
+          self.target_index.add_role(metadata_role, metadata_object['targets'])
           tuf.roledb.remove_delegated_roles(metadata_role)
           self._import_delegations(metadata_role)
 
@@ -585,7 +610,8 @@ class Repository(object):
   
   
   
-  def _update_metadata(self, metadata_role, compression=None):
+  def _update_metadata(self, metadata_role, compression=None,
+                       downloaded_metadata=None):
     """
     <Purpose>
       Download, verify, and 'install' the metadata belonging to 'metadata_role'.
@@ -600,10 +626,16 @@ class Repository(object):
         in '.txt'.  Examples: 'root', 'targets', 'targets/linux/x86'.
       
       compression:
-        A string designating the compression type of 'metadata_role'.
-        The 'release' metadata file may be optionally downloaded and stored in
-        compressed form.  Currently, only metadata files compressed with 'gzip'
-        are considered.  Any other string is ignored.
+        A string designating the compression type of 'metadata_role', one
+        of 'tuf.util.get_supported_compressions()' or None.  The compressed
+        version of the metadata file is downloaded and decompressed as it
+        arrives; the decompressed file is stored.
+
+      downloaded_metadata:
+        The result of an earlier _download_metadata() call for
+        'metadata_role' and 'compression', either a (file object, signable)
+        tuple or the tuf.RepositoryError it raised.  If None, the metadata
+        is downloaded now.
 
     <Exceptions>
       tuf.RepositoryError:
@@ -621,13 +653,102 @@ class Repository(object):
     
     """
     
+    metadata_filename = metadata_role + '.txt'
+    uncompressed_filename = metadata_filename
+
+    if downloaded_metadata is None:
+      metadata_file_object, metadata_signable = \
+        self._download_metadata(metadata_role, compression)
+    elif isinstance(downloaded_metadata, Exception):
+      raise downloaded_metadata
+    else:
+      metadata_file_object, metadata_signable = downloaded_metadata
+
+    # Ensure the loaded 'metadata_signable' is properly formatted.
+    try:
+      tuf.formats.check_signable_object_format(metadata_signable)
+    except tuf.FormatError, e:
+      message = 'Unable to load '+repr(metadata_filename)+' after update: '+str(e)
+      raise tuf.RepositoryError(message)
+
+    # Reject the metadata if any specified targets aren't allowed.
+    if metadata_signable['signed']['_type'] == 'Targets':
+      self._ensure_all_targets_allowed(metadata_role, metadata_signable['signed'])
+
+    # The metadata has been verified. Move the metadata files into place.
+    # First, move the 'current' metadata file to the 'previous' directory.
+    current_filepath = os.path.join(self.metadata_directory['current'],
+                                    uncompressed_filename)
+    current_filepath = os.path.abspath(current_filepath)
+    tuf.util.ensure_parent_dir(current_filepath)
+    
+    previous_filepath = os.path.join(self.metadata_directory['previous'],
+                                     uncompressed_filename)
+    previous_filepath = os.path.abspath(previous_filepath)
+    shutil.move(current_filepath, previous_filepath)
+
+    # Now move the verified updated metadata file to the 'current' directory.
+    # Note that the 'move' method comes from util's TempFile class.
+    # 'metadata_file_object' is an instance of this class.
+    metadata_file_object.move(current_filepath)
+    
+    # Extract the metadata object so we can store it to the metadata store.
+    updated_metadata_object = metadata_signable['signed']
+    current_metadata_object = self.metadata['current'][metadata_role]
+
+    # Update the metadata store.
+    logger.debug('Updated '+current_filepath+'.')
+    self.metadata['previous'][metadata_role] = current_metadata_object
+    self.metadata['current'][metadata_role] = updated_metadata_object
+    if updated_metadata_object['_type'] == 'Targets':
+      self.target_index.add_role(metadata_role,
+                                 updated_metadata_object['targets'])
+
+    return
+
+
+
+
+
+  def _download_metadata(self, metadata_role, compression=None):
+    """
+    <Purpose>
+      Download the metadata belonging to 'metadata_role' from the first
+      mirror that serves a copy with a valid signature.  The metadata is
+      only downloaded and verified, not installed (see _update_metadata()).
+      It only reads the key and role databases, so the metadata of several
+      roles can be downloaded at the same time.
+
+    <Arguments>
+      metadata_role:
+        The name of the metadata. This is a role name and should not end
+        in '.txt'.  Examples: 'root', 'targets', 'targets/linux/x86'.
+
+      compression:
+        A string designating the compression type of 'metadata_role', one
+        of 'tuf.util.get_supported_compressions()' or None.
+
+    <Exceptions>
+      tuf.RepositoryError:
+        If no mirror served the metadata with a valid signature.
+
+    <Side Effects>
+      A temporary file is created in the current metadata directory.
+
+    <Returns>
+      A tuple of the 'tuf.util.TempFile' of the metadata and its signable
+      object.
+
+    """
+
     # Construct the metadata filename as expected by the download/mirror modules.
     metadata_filename = metadata_role + '.txt'
    
-    # The 'release' metadata file may be compressed.  Add the appropriate
-    # extension to 'metadata_filename'. 
-    if compression == 'gzip':
-      metadata_filename = metadata_filename + '.gz'
+    # The metadata file may be compressed.  Add the appropriate extension to
+    # 'metadata_filename'. 
+    if compression is not None:
+      extension = tuf.util.COMPRESSION_EXTENSIONS[compression]
+      metadata_filename = metadata_filename + '.' + extension
 
     # Reference to the 'get_list_of_mirrors' function.
     get_mirrors = tuf.mirrors.get_list_of_mirrors
@@ -635,6 +756,10 @@ class Repository(object):
     # Reference to the 'download_url_to_tempfileobj' function.
     download_file = tuf.download.download_url_to_tempfileobj
 
+    # The downloaded file is created in the metadata directory, so it can be
+    # renamed into place.
+    temp_directory = self.metadata_directory['current']
+
     # Attempt a file download from each mirror until the file is downloaded and
     # verified.  If the signature of the downloaded file is valid, proceed,
     # otherwise log a warning and try the next mirror.  'metadata_file_object'
@@ -645,13 +770,16 @@ class Repository(object):
     metadata_file_object = None
     metadata_signable = None
     for mirror_url in get_mirrors('meta', metadata_filename, self.mirrors):
+      if metadata_file_object is not None:
+        metadata_file_object.close_temp_file()
       try:
-        metadata_file_object = download_file(mirror_url)
+        metadata_file_object = download_file(mirror_url,
+                                             temp_directory=temp_directory,
+                                             decompression=compression)
       except tuf.DownloadError, e:
         logger.warn('Download failed from '+mirror_url+'.')
+        metadata_file_object = None
         continue
-      if compression:
-        metadata_file_object.decompress_temp_file_object(compression)
 
       # Read and load the downloaded file.
       metadata_signable = tuf.util.load_json_string(metadata_file_object.read())
@@ -662,7 +790,7 @@ class Repository(object):
       except (tuf.UnknownRoleError, tuf.FormatError, tuf.Error), e:
         message = 'Unable to verify '+repr(metadata_filename)+':'+str(e)
         logger.warn(message)
-        metedata_signable = None
+        metadata_signable = None
         continue
       if valid:
         logger.debug('Good signature on '+mirror_url+'.')
@@ -675,52 +803,57 @@ class Repository(object):
     # Raise an exception if a valid metadata signable could not be downloaded
     # from any of the mirrors.
     if metadata_signable is None:
+      if metadata_file_object is not None:
+        metadata_file_object.close_temp_file()
       raise tuf.RepositoryError('Unable to update '+repr(metadata_filename)+'.')
 
-    # Ensure the loaded 'metadata_signable' is properly formatted.
-    try:
-      tuf.formats.check_signable_object_format(metadata_signable)
-    except tuf.FormatError, e:
-      message = 'Unable to load '+repr(metadata_filename)+' after update: '+str(e)
-      raise tuf.RepositoryError(message)
+    return metadata_file_object, metadata_signable
 
-    # Reject the metadata if any specified targets aren't allowed.
-    if metadata_signable['signed']['_type'] == 'Targets':
-      self._ensure_all_targets_allowed(metadata_role, metadata_signable['signed'])
 
-    # The metadata has been verified. Move the metadata files into place.
-    # First, move the 'current' metadata file to the 'previous' directory.
-    current_filepath = os.path.join(self.metadata_directory['current'],
-                                    metadata_filename)
-    current_filepath = os.path.abspath(current_filepath)
-    tuf.util.ensure_parent_dir(current_filepath)
-    
-    previous_filepath = os.path.join(self.metadata_directory['previous'],
-                                     metadata_filename)
-    previous_filepath = os.path.abspath(previous_filepath)
-    shutil.move(current_filepath, previous_filepath)
 
-    # Now move the verified updated metadata file to the 'current' directory.
-    # Note that the 'move' method comes from util's TempFile class.
-    # 'metadata_file_object' is an instance of this class.
-    metadata_file_object.move(current_filepath)
-    
-    # Extract the metadata object so we can store it to the metadata store.
-    updated_metadata_object = metadata_signable['signed']
-    current_metadata_object = self.metadata['current'][metadata_role]
 
-    # Update the metadata store.
-    logger.debug('Updated '+current_filepath+'.')
-    self.metadata['previous'][metadata_role] = current_metadata_object
-    self.metadata['current'][metadata_role] = updated_metadata_object
 
-    return
+  def _choose_compression(self, metadata_filename, length, meta):
+    """
+    <Purpose>
+      Pick the smallest of the versions of 'metadata_filename' listed in
+      'meta' that can be decompressed.
 
+    <Arguments>
+      metadata_filename:
+        The name of the uncompressed metadata file, e.g. 'release.txt'.
 
+      length:
+        The length of the uncompressed metadata file.
 
+      meta:
+        The 'meta' field of the metadata referencing 'metadata_filename',
+        e.g. the 'meta' field of the 'timestamp' metadata.
 
+    <Returns>
+      The compression to download, or None for the uncompressed file.
 
-  def _update_metadata_if_changed(self, metadata_role, referenced_metadata='release'):
+    """
+
+    compression = None
+    for supported_compression in tuf.util.get_supported_compressions():
+      extension = tuf.util.COMPRESSION_EXTENSIONS[supported_compression]
+      compressed_fileinfo = meta.get(metadata_filename + '.' + extension)
+      if compressed_fileinfo is None:
+        continue
+      if compressed_fileinfo['length'] < length:
+        compression = supported_compression
+        length = compressed_fileinfo['length']
+
+    return compression
+
+
+
+
+
+  def _update_metadata_if_changed(self, metadata_role,
+                                  referenced_metadata='release',
+                                  downloaded_metadata=None):
     """
     <Purpose>
       Update the metadata for 'metadata_role' if it has changed.  With the
@@ -756,6 +889,11 @@ class Repository(object):
         other words, it is updated by calling _update_metadata('timestamp')
         and not by this function.  The referenced metadata for 'release'
         is 'timestamp'.  See refresh().
+
+      downloaded_metadata:
+        The result of _download_metadata() for 'metadata_role', if it was
+        already downloaded, e.g. concurrently with its sibling roles.  See
+        _update_metadata().
         
     <Exceptions>
       tuf.MetadataNotAvailableError:
@@ -780,39 +918,16 @@ class Repository(object):
         
     metadata_filename = metadata_role + '.txt'
 
-    # Need to ensure the referenced metadata has been loaded.
-    # The 'root' role may be updated without having 'release'
-    # available.  
-    if referenced_metadata not in self.metadata['current']:
-      if metadata_role == 'root':
-        new_fileinfo = None
-      else:
-        message = 'Cannot update '+repr(metadata_role)+' because ' \
-                  +referenced_metadata+' is missing.'
-        raise tuf.RepositoryError(message)
-    # The referenced metadata has been loaded.  Extract the new
-    # fileinfo for 'metadata_role' from it. 
-    else:
-      new_fileinfo = self.metadata['current'][referenced_metadata] \
-                                  ['meta'][metadata_filename]
-
-    # Simply return if the fileinfo has not changed according to the
-    # fileinfo provided by the referenced metadata.
-    if not self._fileinfo_has_changed(metadata_filename, new_fileinfo):
+    has_changed, compression = \
+      self._check_metadata_changed(metadata_role, referenced_metadata)
+    if not has_changed:
       return
 
     logger.info('Metadata '+repr(metadata_filename)+' has changed.')
 
-    # There might be a compressed version of the 'release' metadata
-    # that may be downloaded.  Check the 'meta' field of
-    # 'referenced_metadata' to see if it is listed. 
-    compression = None
-    if metadata_role == 'release':
-      gzip_path = metadata_filename + '.gz'
-      if gzip_path in self.metadata['current'][referenced_metadata]['meta']:
-        compression = 'gzip'
     try:
-      self._update_metadata(metadata_role, compression=compression)
+      self._update_metadata(metadata_role, compression=compression,
+                            downloaded_metadata=downloaded_metadata)
     except tuf.RepositoryError, e:
       # The current metadata we have is not current but we couldn't
       # get new metadata. We shouldn't use the old metadata anymore.
@@ -839,6 +954,74 @@ class Repository(object):
 
 
 
+  def _check_metadata_changed(self, metadata_role,
+                              referenced_metadata='release'):
+    """
+    <Purpose>
+      Determine whether 'metadata_role' has changed according to the file
+      information listed by 'referenced_metadata', and which compressed
+      version of it, if any, to download.
+
+    <Arguments>
+      metadata_role:
+        The name of the metadata. This is a role name and should not end
+        in '.txt'.  Examples: 'root', 'targets', 'targets/linux/x86'.
+
+      referenced_metadata:
+        This is the metadata that provides the role information for
+        'metadata_role'.  See _update_metadata_if_changed().
+
+    <Exceptions>
+      tuf.RepositoryError:
+        If the referenced metadata is missing.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      A (has_changed, compression) tuple, where 'compression' is the
+      compression argument to pass to _update_metadata().
+
+    """
+
+    metadata_filename = metadata_role + '.txt'
+
+    # Need to ensure the referenced metadata has been loaded.
+    # The 'root' role may be updated without having 'release'
+    # available.  
+    if referenced_metadata not in self.metadata['current']:
+      if metadata_role == 'root':
+        new_fileinfo = None
+      else:
+        message = 'Cannot update '+repr(metadata_role)+' because ' \
+                  +referenced_metadata+' is missing.'
+        raise tuf.RepositoryError(message)
+    # The referenced metadata has been loaded.  Extract the new
+    # fileinfo for 'metadata_role' from it. 
+    else:
+      new_fileinfo = self.metadata['current'][referenced_metadata] \
+                                  ['meta'][metadata_filename]
+
+    # The fileinfo has not changed according to the fileinfo provided by
+    # the referenced metadata.
+    if not self._fileinfo_has_changed(metadata_filename, new_fileinfo):
+      return False, None
+
+    # There might be compressed versions of the metadata that may be
+    # downloaded instead.  Check the 'meta' field of 'referenced_metadata'
+    # for them and pick the smallest.
+    compression = None
+    if new_fileinfo is not None:
+      compression = self._choose_compression(metadata_filename,
+                                             new_fileinfo['length'],
+                        self.metadata['current'][referenced_metadata]['meta'])
+
+    return True, compression
+
+
+
+
+
   def _ensure_all_targets_allowed(self, metadata_role, metadata_object):
     """
     <Purpose>
@@ -1103,6 +1286,7 @@ class Repository(object):
     # Remove knowledge of the role.
     if metadata_role in self.metadata['current']:
       del self.metadata['current'][metadata_role]
+    self.target_index.remove_role(metadata_role)
     tuf.roledb.remove_role(metadata_role)
 
 
@@ -1230,10 +1414,15 @@ class Repository(object):
         If the metadata file for the 'targets' role is missing
         from the 'release' metadata.
 
+      tuf.MetadataNotAvailableError:
+        If the metadata of a role could not be updated.  Its sibling roles
+        are still updated, but not the roles they delegate to.
+
     <Side Effects>
       The metadata for the delegated roles are loaded and updated if they
-      have changed.  Delegated metadata is removed from the role database if
-      it has expired.
+      have changed.  Sibling roles that changed are downloaded concurrently
+      (see tuf.conf.metadata_refresh_worker_count).  Delegated metadata is
+      removed from the role database if it has expired.
 
     <Returns>
       None.
@@ -1268,19 +1457,57 @@ class Repository(object):
     roles_to_update.sort()
     logger.debug('Roles to update: '+repr(roles_to_update)+'.')
 
-    # Iterate through 'roles_to_update', load its metadata
-    # file, and update it if it has changed.
+    # Refresh the roles one depth of delegation at a time, so that a parent
+    # role is always updated, and its delegations imported, before its
+    # delegated roles.  The roles of a level that changed are downloaded and
+    # verified concurrently, then installed one at a time in sorted order.
+    levels = {}
     for rolename in roles_to_update:
-      self._load_metadata_from_file('previous', rolename)
-      self._load_metadata_from_file('current', rolename)
+      levels.setdefault(rolename.count('/'), []).append(rolename)
+
+    for depth in sorted(levels.keys()):
+      level_roles = levels[depth]
+
+      # Load the metadata files of the level and find the roles that changed.
+      changed_roles = {}
+      for rolename in level_roles:
+        self._load_metadata_from_file('previous', rolename)
+        self._load_metadata_from_file('current', rolename)
+        has_changed, compression = self._check_metadata_changed(rolename)
+        if has_changed:
+          changed_roles[rolename] = compression
+
+      downloaded_metadata = self._download_metadata_concurrently(changed_roles)
+      # A role that cannot be updated does not stop its siblings from being
+      # installed; the first error is raised once the level is complete, and
+      # the delegations of the level are not refreshed.
+      error = None
+      try:
+        for rolename in level_roles:
+          role_metadata = downloaded_metadata.pop(rolename, None)
+          try:
+            self._update_metadata_if_changed(rolename,
+                                             downloaded_metadata=role_metadata)
+          except tuf.MetadataNotAvailableError, e:
+            if error is None:
+              error = e
+            continue
 
-      self._update_metadata_if_changed(rolename)
+          # Remove the role if it has expired.
+          try:
+            self._ensure_not_expired(rolename)
+          except tuf.ExpiredMetadataError:
+            tuf.roledb.remove_role(rolename)
 
-      # Remove the role if it has expired.
-      try:
-        self._ensure_not_expired(rolename)
-      except tuf.ExpiredMetadataError:
-        tuf.roledb.remove_role(rolename)
+      finally:
+        # Discard the metadata downloaded for roles that were not installed,
+        # e.g. if an unexpected error interrupted the level.
+        for result in downloaded_metadata.values():
+          if not isinstance(result, Exception):
+            result[0].close_temp_file()
+
+      if error is not None:
+        raise error
 
     return
 
@@ -1288,6 +1515,86 @@ class Repository(object):
 
 
 
+  def _download_metadata_concurrently(self, changed_roles, worker_count=None):
+    """
+    <Purpose>
+      Download and verify the metadata of several roles concurrently (see
+      _download_metadata()).  The roles must not delegate to one another,
+      since a role is verified with the keys its parent role delegated to it.
+      Only the downloads are concurrent; none of the metadata or role stores
+      is modified.
+
+    <Arguments>
+      changed_roles:
+        A dictionary that maps each role to download to its compression
+        argument (see _check_metadata_changed()).
+
+      worker_count:
+        The number of roles downloaded at the same time.  Defaults to
+        'tuf.conf.metadata_refresh_worker_count'.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      The metadata is downloaded to temporary files.
+
+    <Returns>
+      A dictionary that maps each role to the result of
+      _download_metadata(), or to the exception it raised.
+
+    """
+
+    if worker_count is None:
+      worker_count = tuf.conf.metadata_refresh_worker_count
+    worker_count = max(1, min(worker_count, len(changed_roles)))
+
+    pending_roles = Queue.Queue()
+    for rolename in sorted(changed_roles.keys()):
+      pending_roles.put(rolename)
+
+    results = {}
+    results_lock = threading.Lock()
+
+    def download_pending_roles():
+      while True:
+        try:
+          rolename = pending_roles.get_nowait()
+        except Queue.Empty:
+          return
+
+        try:
+          result = self._download_metadata(rolename, changed_roles[rolename])
+        except Exception, e:
+          result = e
+
+        results_lock.acquire()
+        try:
+          results[rolename] = result
+        finally:
+          results_lock.release()
+
+    # A single role is downloaded without starting a thread.
+    if worker_count == 1:
+      download_pending_roles()
+      return results
+
+    workers = []
+    for worker_number in range(worker_count):
+      worker = threading.Thread(target=download_pending_roles)
+      worker.daemon = True
+      worker.start()
+      workers.append(worker)
+
+    for worker in workers:
+      worker.join()
+
+    return results
+
+
+
+
+
   def _targets_of_role(self, rolename, targets=None, skip_refresh=False):
     """
     <Purpose>
@@ -1428,6 +1735,8 @@ class Repository(object):
    
     <Side Effects>
       The metadata for updated delegated roles are download and stored.
+      Only the delegated roles whose paths include 'target_filepath', and
+      their parent roles, are refreshed.
     
     <Returns>
       The target information for 'target_filepath', conformant to
@@ -1439,44 +1748,54 @@ class Repository(object):
     # Raise 'tuf.FormatError' if there is a mismatch.
     tuf.formats.RELPATH_SCHEMA.check_match(target_filepath)
 
-    # Refresh the target metadata for all the delegated roles. 
-    self._refresh_targets_metadata(include_delegations=True)
-    all_rolenames = tuf.roledb.get_rolenames()
-
-    # Iterate through all the target metadata.  Take precautions
-    # to avoid duplicate files.
+    # Walk the delegations from the 'targets' role, refreshing only the
+    # delegated roles whose paths include 'target_filepath'.  A role may only
+    # list the targets delegated to it by its parent role (see
+    # _ensure_all_targets_allowed()), so no other role can provide it.
+    # Parent roles are visited, and refreshed, before their delegated roles.
+    visited_roles = []
+    roles_to_visit = ['targets']
+    while roles_to_visit:
+      rolename = roles_to_visit.pop(0)
+      if rolename != 'targets':
+        self._refresh_targets_metadata(rolename)
+
+      # Skip the role if its metadata is not available or has expired.
+      if not tuf.roledb.role_exists(rolename) or \
+         rolename not in self.metadata['current']:
+        continue
+      visited_roles.append(rolename)
+
+      # Visit the roles delegated by 'rolename' that may list
+      # 'target_filepath'.
+      role_metadata = self.metadata['current'][rolename]
+      delegations = role_metadata.get('delegations', {}).get('roles', {})
+      for delegated_role in sorted(delegations.keys()):
+        if target_filepath in delegations[delegated_role].get('paths', []):
+          roles_to_visit.append(delegated_role)
+
+    # Look up the fileinfo listed by the visited roles in the target index.
+    # Take precautions to avoid duplicate files.
+    role_fileinfo = self.target_index.get(target_filepath)
     target = []
-    for rolename in all_rolenames:
-      if rolename == 'mirrorlist' or \
-         self.metadata['current'][rolename]['_type'] != 'Targets':
+    for rolename in visited_roles:
+      if rolename not in role_fileinfo:
         continue
-      # We have a target role.  Extract the filepath and fileinfo
-      # and compare it to 'target_filepath'.  Compare the fileinfo
-      # to avoid duplicates.
-      for filepath, fileinfo in self.metadata['current'][rolename] \
-                                             ['targets'].items():
-        if target_filepath == filepath:
-          # If 'target' is empty, we can just go ahead and add 'target_filepath'
-          # No need to check for duplicates in this case.
-          if len(target) == 0:
-            new_target = {}
-            new_target['filepath'] = filepath
-            new_target['fileinfo'] = fileinfo
-            target.append(new_target)
-            continue
-          # It appears we have a duplicate.  If the fileinfo match,
-          # do not add the duplicate.  Move on to the next target.
-          elif len(target) == 1:
-            if target[0]['fileinfo'] == fileinfo:
-              continue
-            # Okay, we have a matching filepath but a different fileinfo
-            # for the duplicate.  Which one is the client expecting?
-            # And why would the metadata list two different versions of the
-            # same file?  Raise an exception.
-            else:
-              message = 'Found multiple '+repr(target_filepath)+'.'
-              logger.error(message)
-              raise tuf.RespositoryError(message)
+      fileinfo = role_fileinfo[rolename]
+      # If 'target' is empty, we can just go ahead and add 'target_filepath'.
+      if len(target) == 0:
+        new_target = {}
+        new_target['filepath'] = target_filepath
+        new_target['fileinfo'] = fileinfo
+        target.append(new_target)
+      # Okay, we have a matching filepath but a different fileinfo
+      # for the duplicate.  Which one is the client expecting?
+      # And why would the metadata list two different versions of the
+      # same file?  Raise an exception.
+      elif target[0]['fileinfo'] != fileinfo:
+        message = 'Found multiple '+repr(target_filepath)+'.'
+        logger.error(message)
+        raise tuf.RepositoryError(message)
    
     # Riase an exception if the target information could not be retrieved.
     if len(target) == 0:
@@ -1490,6 +1809,68 @@ class Repository(object):
 
 
 
+  def matching_targets(self, prefix='', pattern=None):
+    """
+    <Purpose>
+      Return the target information for the targets whose paths start with
+      'prefix' and, if 'pattern' is given, match the glob 'pattern', e.g. to
+      list the targets of a directory.  The targets are found in the target
+      index rather than by scanning every role.  The returned information is
+      a list conformant to tuf.formats.TARGETFILES_SCHEMA, sorted by path,
+      with one entry for each role that lists a target.
+
+    <Arguments>
+      prefix:
+        The prefix of the target paths, e.g. 'packages/linux/'.
+
+      pattern:
+        A glob pattern the target paths must match (see 'fnmatch'), e.g.
+        'packages/*.tar.gz'.  Note that '*' also matches '/'.
+
+    <Exceptions>
+      tuf.FormatError:
+        If 'prefix' or 'pattern' is improperly formatted.
+
+      tuf.RepositoryError:
+        If the metadata for the 'targets' role is missing from
+        the 'release' metadata.
+
+    <Side Effects>
+      The metadata for target roles is updated and stored.
+
+    <Returns>
+      A list of targets, conformant to 'tuf.formats.TARGETFILES_SCHEMA'.
+
+    """
+
+    # Do the arguments have the correct format?
+    # Raise 'tuf.FormatError' if there is a mismatch.
+    tuf.formats.PATH_SCHEMA.check_match(prefix)
+    if pattern is not None:
+      tuf.formats.PATH_SCHEMA.check_match(pattern)
+
+    # Load the most up-to-date targets of the 'targets' role and all
+    # delegated roles.
+    self._refresh_targets_metadata(include_delegations=True)
+
+    targets = []
+    for filepath in self.target_index.list_filepaths(prefix, pattern):
+      role_fileinfo = self.target_index.get(filepath)
+      for rolename in sorted(role_fileinfo.keys()):
+        # Skip the roles that have expired.
+        if not tuf.roledb.role_exists(rolename):
+          continue
+        new_target = {}
+        new_target['filepath'] = filepath
+        new_target['fileinfo'] = role_fileinfo[rolename]
+        targets.append(new_target)
+
+    return targets
+
+
+
+
+
   def remove_obsolete_targets(self, destination_directory):
     """
     <Purpose>
@@ -1510,7 +1891,9 @@ class Repository(object):
         If an error occurred removing any files.
 
     <Side Effects>
-      Target files are removed from disk.
+      Target files are removed from disk.  With 'tuf.conf.use_target_store'
+      set, the unused targets are removed from the target store as well
+      (see tuf.client.targetstore).
 
     <Returns>
       None.
@@ -1525,6 +1908,10 @@ class Repository(object):
     # directory contains a target no longer found in 'current'.
     for role in tuf.roledb.get_rolenames():
       if role.startswith('targets'):
+        # There is nothing to compare for a role without both versions.
+        if role not in self.metadata['previous'] or \
+           role not in self.metadata['current']:
+          continue
         for target in self.metadata['previous'][role]['targets'].keys():
           if target not in self.metadata['current'][role]['targets'].keys():
             # 'target' is only in 'previous', so remove it.
@@ -1542,6 +1929,11 @@ class Repository(object):
             except Exception, e:
               logger.error(str(e))
 
+    # The stored targets that only the removed files linked to are no
+    # longer used.
+    if self.target_store is not None:
+      self.target_store.collect_garbage()
+
     return
 
 
@@ -1574,7 +1966,9 @@ class Repository(object):
         If the arguments are improperly formatted.
 
     <Side Effects>
-      The files in 'targets' are read and their hashes computed. 
+      The files in 'targets' are read and their hashes computed
+      concurrently, unless the hash cache has them (see tuf.hashcache).  The
+      hash cache is saved.
 
     <Returns>
       A list of targets, conformant to 'tuf.formats.TARGETFILES_SCHEMA'.
@@ -1588,27 +1982,39 @@ class Repository(object):
 
     updated_targets = []
 
+    # Hash the local targets that may be current all at once, each file in
+    # a single pass over it.
+    filename_algorithms = {}
     for target in targets:
       # Get the target's filepath located in 'destination_directory'.
       # We will compare targets against this file.
       target_filepath = os.path.join(destination_directory, target['filepath'])
-      
-      # Try one of the algorithm/digest combos for a mismatch.  We break
-      # as soon as we find a mismatch.
+
+      # A missing target, or one of a different length, has changed.
+      try:
+        if os.path.getsize(target_filepath) != target['fileinfo']['length']:
+          continue
+      except OSError:
+        continue
+      algorithms = filename_algorithms.setdefault(target_filepath, set())
+      algorithms.update(target['fileinfo']['hashes'].keys())
+
+    hexdigests = tuf.hashcache.get_hexdigests(filename_algorithms)
+    tuf.hashcache.save()
+
+    for target in targets:
+      target_filepath = os.path.join(destination_directory, target['filepath'])
+      local_hexdigests = hexdigests.get(target_filepath)
+      if local_hexdigests is None:
+        updated_targets.append(target)
+        continue
+
+      # Check the local target against all the trusted hashes.
       for algorithm, digest in target['fileinfo']['hashes'].items():
-        digest_object = None
-        try:
-          digest_object = tuf.hash.digest_filename(target_filepath,
-                                                   algorithm=algorithm)
-        # This exception would occur if the target does not exist locally. 
-        except IOError:
-          updated_targets.append(target)
-          break
-        # The file does exist locally, check if its hash differs. 
-        if digest_object.hexdigest() != digest:
+        if local_hexdigests[algorithm] != digest:
           updated_targets.append(target)
           break
-    
+
     return updated_targets
 
 
@@ -1622,6 +2028,17 @@ class Repository(object):
         
       This will only store the file at 'destination_directory' if the downloaded
       file matches the description of the file in the trusted metadata.
+      With 'tuf.conf.use_target_store' set, a target another destination
+      directory already has is linked from the target store instead.
+      If the file at the destination is an older version of the target for
+      which the repository published a delta, the delta is downloaded and
+      applied to it instead (see tuf.delta).
+      Targets the repository hashed in chunks are verified chunk by chunk
+      as they arrive (see tuf.chunks).
+      Targets of at least 'tuf.conf.segmented_download_threshold' bytes are
+      downloaded in segments from all their mirrors at once.  Otherwise, or
+      if that fails, the target is downloaded from one mirror at a time and
+      an interrupted download is resumed instead of being started over.
     
     <Arguments>
       target:
@@ -1657,39 +2074,420 @@ class Repository(object):
     # Reference to the 'get_list_of_mirrors' function.
     get_mirrors = tuf.mirrors.get_list_of_mirrors
 
+    # Reference to the 'download_url_segments_to_tempfileobj' function.
+    download_segments = tuf.download.download_url_segments_to_tempfileobj
+
+    # Extract the target file information.
+    target_filepath = target['filepath']
+    trusted_length = target['fileinfo']['length']
+    trusted_hashes = target['fileinfo']['hashes']
+
+    # The target is downloaded into a temporary file in its destination
+    # directory, so that it can be renamed into place once verified.
+    destination = os.path.join(destination_directory, target_filepath)
+    destination = os.path.abspath(destination)
+    target_dirpath = os.path.dirname(destination)
+    if target_dirpath:
+      try:
+        os.makedirs(target_dirpath)
+      except OSError, e:
+        pass
+    temp_directory = target_dirpath
+
+    # Another destination may have needed this target before.  If not, the
+    # download is renamed into the store and linked from there.
+    if self.target_store is not None:
+      if self.target_store.materialize(target['fileinfo'], destination):
+        logger.info('Installed '+repr(target_filepath)+' from the target '+
+                    'store.')
+        return
+      store_directory = self.target_store.get_temp_directory(target['fileinfo'])
+      if store_directory is not None:
+        temp_directory = store_directory
+
+    # If we have an older version of the target, and the repository
+    # published a delta from it, only the delta is downloaded.
+    target_file_object = self._download_target_delta(target, destination,
+                                                     temp_directory)
+
+    # A mirror that sends a bad chunk of the target is dropped right away.
+    chunk_hashes = None
+    if target_file_object is None:
+      chunk_hashes = self._download_target_chunk_hashes(target)
+
+    # A large target is downloaded in segments from all its mirrors at once.
+    # If that fails, it is downloaded from one mirror at a time below.
+    threshold = tuf.conf.segmented_download_threshold
+    if target_file_object is None and threshold is not None and \
+       trusted_length >= threshold:
+      mirror_urls = get_mirrors('target', target_filepath, self.mirrors)
+      if len(mirror_urls) > 1:
+        try:
+          target_file_object = download_segments(mirror_urls, trusted_hashes,
+                                                 trusted_length,
+                                                 temp_directory=temp_directory,
+                                                 chunk_hashes=chunk_hashes)
+        except tuf.DownloadError, e:
+          logger.warn('Segmented download of '+repr(target_filepath)+
+                      ' failed: '+str(e))
+
+    if target_file_object is None:
+      target_file_object = self._download_target_from_mirrors(target,
+                                                              temp_directory,
+                                                              chunk_hashes)
+   
+    # We acquired a target file object from a mirror.  Move the file into
+    # place (i.e., locally to 'destination_directory'.
+    if self.target_store is not None and \
+       self.target_store.add(target_file_object, target['fileinfo']):
+      self.target_store.materialize(target['fileinfo'], destination,
+                                    verify=False)
+    else:
+      target_file_object.move(destination)
+
+
+
+
+
+  def _download_target_delta(self, target, old_filepath, temp_directory=None):
+    """
+    <Purpose>
+      Rebuild 'target' from 'old_filepath', an older version of it, and the
+      delta the repository published for that version, if any.  The delta
+      is verified against its file information in the trusted metadata, and
+      the rebuilt file against the trusted length and hashes of the target.
+
+    <Arguments>
+      target:
+        The target to be rebuilt.  Conformant to
+        'tuf.formats.TARGETFILE_SCHEMA'.
+
+      old_filepath:
+        The local copy of an older version of the target.
+
+      temp_directory:
+        The directory to create the temporary file of the target in.
+
+    <Exceptions>
+      None.
+
+    <Returns>
+      The verified 'tuf.util.TempFile' of the target, or None if there is
+      no delta for 'old_filepath' or it could not be applied, in which case
+      the whole target has to be downloaded.
+
+    """
+
+    trusted_length = target['fileinfo']['length']
+    trusted_hashes = target['fileinfo']['hashes']
+
+    custom = target['fileinfo'].get('custom')
+    if not isinstance(custom, dict) or 'deltas' not in custom:
+      return None
+    if not os.path.isfile(old_filepath):
+      return None
+
+    deltas = custom['deltas']
+    if not tuf.formats.DELTADICT_SCHEMA.matches(deltas):
+      logger.warn('Ignoring the malformed deltas of '+
+                  repr(target['filepath'])+'.')
+      return None
+
+    try:
+      old_digest = tuf.hashcache.get_hexdigest(old_filepath,
+                                               tuf.delta.DELTA_HASH_ALGORITHM)
+    except IOError, e:
+      logger.warn('Unable to read '+repr(old_filepath)+': '+str(e))
+      return None
+    delta_fileinfo = deltas.get(old_digest)
+    if delta_fileinfo is None or delta_fileinfo['length'] >= trusted_length:
+      return None
+
+    delta_filepath = tuf.delta.get_delta_filepath(target['filepath'],
+                                                  old_digest)
+
+    delta_file_object = None
+    for mirror_url in tuf.mirrors.get_list_of_mirrors('target', delta_filepath,
+                                                      self.mirrors):
+      try:
+        delta_file_object = \
+          tuf.download.download_url_to_tempfileobj(mirror_url,
+                                                   delta_fileinfo['hashes'],
+                                                   delta_fileinfo['length'])
+        break
+      except (tuf.DownloadError, tuf.FormatError), e:
+        logger.warn('Download failed from '+mirror_url+'.')
+    if delta_file_object is None:
+      return None
+
+    # Rebuild the target, hashing it as it is written.
+    digest_objects = {}
+    for algorithm in trusted_hashes:
+      digest_objects[algorithm] = tuf.hash.digest(algorithm)
+
+    target_file_object = tuf.util.TempFile(directory=temp_directory)
+    try:
+      old_file_object = open(old_filepath, 'rb')
+      try:
+        delta_file_object.seek(0)
+        length = tuf.delta.apply_delta(old_file_object, delta_file_object,
+                                       target_file_object, trusted_length,
+                                       digest_objects.values())
+      finally:
+        old_file_object.close()
+
+      if length != trusted_length:
+        raise tuf.Error('The delta rebuilt '+str(length)+' bytes, expected '+
+                        str(trusted_length)+'.')
+
+      for algorithm, trusted_hash in trusted_hashes.items():
+        if digest_objects[algorithm].hexdigest() != trusted_hash:
+          raise tuf.BadHashError('The rebuilt target does not match its '+
+                                 algorithm+' hash.')
+
+    except (tuf.Error, IOError), e:
+      logger.warn('Unable to apply the delta of '+repr(target['filepath'])+
+                  ': '+str(e))
+      target_file_object.close_temp_file()
+      return None
+
+    finally:
+      delta_file_object.close_temp_file()
+
+    logger.info('Updated '+repr(target['filepath'])+' with a delta of '+
+                str(delta_fileinfo['length'])+' bytes.')
+    return target_file_object
+
+
+
+
+
+  def _download_target_from_mirrors(self, target, temp_directory=None,
+                                    chunk_hashes=None):
+    """
+    <Purpose>
+      Download 'target' from one mirror at a time, until one of them
+      serves it.  An interrupted download is resumed, from the same mirror
+      (see 'tuf.conf.download_resume_attempts') or the next one, instead
+      of being started over.  The download is stored in a temporary file
+      in 'temp_directory'.  With the 'chunk_hashes' of the target, a mirror
+      is dropped at its first bad chunk and the next one resumes after the
+      last good chunk.
+
+    <Exceptions>
+      tuf.DownloadError:
+        If the target could not be downloaded from any of the mirrors.
+
+    <Returns>
+      The verified 'tuf.util.TempFile' of the target.
+
+    """
+
+    # Reference to the 'get_list_of_mirrors' function.
+    get_mirrors = tuf.mirrors.get_list_of_mirrors
+
     # Reference to the 'download_url_to_tempfileobj' function.
     download_file = tuf.download.download_url_to_tempfileobj
 
-    # Extract the target file information.
     target_filepath = target['filepath']
     trusted_length = target['fileinfo']['length']
     trusted_hashes = target['fileinfo']['hashes']
 
+    # The data downloaded so far.  It is kept when a download is interrupted,
+    # so the next attempt, from the same or the next mirror, resumes it
+    # instead of starting over.
+    partial_file = tuf.util.TempFile(directory=temp_directory)
+
     target_file_object = None
     # Iterate through the repositority mirrors until we successfully
     # download a target.
     for mirror_url in get_mirrors('target', target_filepath, self.mirrors):
-      try: 
-        target_file_object = download_file(mirror_url, trusted_hashes,
-                                           trusted_length)
+      resume_attempts = 0
+      while target_file_object is None:
+        partial_file.seek(0, 2)
+        downloaded_length = partial_file.tell()
+        try: 
+          target_file_object = download_file(mirror_url, trusted_hashes,
+                                             trusted_length, partial_file,
+                                             chunk_hashes=chunk_hashes)
+        except (tuf.DownloadError, tuf.FormatError), e:
+          logger.warn('Download failed from '+mirror_url+'.')
+          # Retry this mirror only if the interrupted download got further,
+          # and never if it sent bad data.
+          partial_file.seek(0, 2)
+          if partial_file.tell() <= downloaded_length or \
+             (e.args and isinstance(e.args[0], tuf.BadHashError)) or \
+             resume_attempts >= tuf.conf.download_resume_attempts:
+            break
+          resume_attempts = resume_attempts + 1
+      if target_file_object is not None:
         break
-      except (tuf.DownloadError, tuf.FormatError), e:
-        logger.warn('Download failed from '+mirror_url+'.')
-        target_file_object = None
-        continue
     # We have gone through all the mirrors.  Did we get a target file object?
     if target_file_object == None: 
+      partial_file.close_temp_file()
       raise tuf.DownloadError('No download locations known.')
-   
-    # We acquired a target file object from a mirror.  Move the file into
-    # place (i.e., locally to 'destination_directory'.
-    destination = os.path.join(destination_directory, target_filepath)
-    destination = os.path.abspath(destination)
-    target_dirpath = os.path.dirname(destination)
-    if target_dirpath:
+
+    return target_file_object
+
+
+
+
+
+  def _download_target_chunk_hashes(self, target):
+    """
+    <Purpose>
+      Download the chunk hashes the repository published for 'target', if
+      any, and verify them against the Merkle root in the trusted metadata.
+
+    <Arguments>
+      target:
+        The target to be downloaded.  Conformant to
+        'tuf.formats.TARGETFILE_SCHEMA'.
+
+    <Exceptions>
+      None.
+
+    <Returns>
+      The verified 'tuf.chunks.ChunkHashes' of the target, or None if the
+      target is not chunked or its chunk hashes could not be downloaded, in
+      which case the target is only verified once it is complete.
+
+    """
+
+    trusted_length = target['fileinfo']['length']
+
+    custom = target['fileinfo'].get('custom')
+    if not isinstance(custom, dict) or 'chunks' not in custom:
+      return None
+
+    chunkinfo = custom['chunks']
+    if not tuf.formats.CHUNKINFO_SCHEMA.matches(chunkinfo) or \
+       chunkinfo['size'] == 0:
+      logger.warn('Ignoring the malformed chunk hashes of '+
+                  repr(target['filepath'])+'.')
+      return None
+    if trusted_length <= chunkinfo['size']:
+      return None
+
+    try:
+      chunk_hashes_length = \
+        tuf.chunks.get_chunk_hashes_length(trusted_length, chunkinfo['size'],
+                                           chunkinfo['algorithm'])
+    except tuf.UnsupportedAlgorithmError, e:
+      logger.warn('Ignoring the chunk hashes of '+repr(target['filepath'])+
+                  ': '+str(e))
+      return None
+
+    chunk_hashes_filepath = \
+      tuf.chunks.get_chunk_hashes_filepath(target['filepath'])
+    for mirror_url in tuf.mirrors.get_list_of_mirrors('target',
+                                                      chunk_hashes_filepath,
+                                                      self.mirrors):
       try:
-        os.makedirs(target_dirpath)
-      except OSError, e:
-        pass
+        # Mirrors need not host the chunk hashes, so one that does not is
+        # not ranked lower for it.
+        file_object = \
+          tuf.download.download_url_to_tempfileobj(mirror_url, None,
+                                                   chunk_hashes_length,
+                                                   optional=True)
+        try:
+          return tuf.chunks.load_chunk_hashes(file_object, chunkinfo,
+                                              trusted_length)
+        finally:
+          file_object.close_temp_file()
+      except (tuf.DownloadError, tuf.FormatError, tuf.BadHashError), e:
+        logger.warn('Unable to get the chunk hashes from '+mirror_url+': '+
+                    str(e))
+
+    return None
+
+
+
+
+
+  def download_targets(self, targets, destination_directory,
+                       worker_count=None):
+    """
+    <Purpose>
+      Download and verify many targets concurrently.  Each target is
+      downloaded with download_target() by a bounded pool of worker
+      threads.  The number of connections open to any single mirror at
+      once is bounded by 'tuf.conf.max_connections_per_host' (see
+      tuf.connectionpool).
+        
+      A target that fails to download does not stop the others.
     
-    target_file_object.move(destination)
+    <Arguments>
+      targets:
+        A list of targets to be downloaded.  Conformant to
+        'tuf.formats.TARGETFILES_SCHEMA'.
+
+      destination_directory:
+        The directory to save the downloaded target files.
+
+      worker_count:
+        The number of targets downloaded at the same time.  If None,
+        'tuf.conf.download_worker_count' is used.
+
+    <Exceptions>
+      tuf.FormatError:
+        If the arguments are improperly formatted.
+
+    <Side Effects>
+      The target files are saved to the local system.
+
+    <Returns>
+      A dictionary with the 'filepath' of every target as keys.  The value
+      is None if the target was downloaded and verified, or the exception
+      raised by download_target() otherwise.
+
+    """
+
+    # Do the arguments have the correct format?
+    # Raise 'tuf.FormatError' if there is a mismatch.
+    tuf.formats.TARGETFILES_SCHEMA.check_match(targets)
+    tuf.formats.PATH_SCHEMA.check_match(destination_directory)
+
+    if worker_count is None:
+      worker_count = tuf.conf.download_worker_count
+    worker_count = max(1, min(worker_count, len(targets)))
+
+    pending_targets = Queue.Queue()
+    for target in targets:
+      pending_targets.put(target)
+
+    results = {}
+    results_lock = threading.Lock()
+
+    def download_pending_targets():
+      while True:
+        try:
+          target = pending_targets.get_nowait()
+        except Queue.Empty:
+          return
+
+        try:
+          self.download_target(target, destination_directory)
+          error = None
+        except Exception, e:
+          logger.warn('Unable to download '+repr(target['filepath'])+': '+
+                      str(e))
+          error = e
+
+        results_lock.acquire()
+        try:
+          results[target['filepath']] = error
+        finally:
+          results_lock.release()
+
+    workers = []
+    for worker_number in range(worker_count):
+      worker = threading.Thread(target=download_pending_targets)
+      worker.daemon = True
+      worker.start()
+      workers.append(worker)
+
+    for worker in workers:
+      worker.join()
+
+    return results
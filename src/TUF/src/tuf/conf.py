@@ -23,6 +23,14 @@
 # unusable.
 temporary_directory = None
 
+# tuf.util.TempFile keeps files of up to this many bytes in memory instead
+# of writing them to a temporary file on disk.  0 to always use a file.
+temporary_file_spool_size = 65536
+
+# The size of the write buffer of the temporary files on disk, so that the
+# small chunks a download arrives in are written to the file in batches.
+temporary_file_buffer_size = 65536
+
 # The directory under which metadata for all repositories will be
 # stored. This is not a simple cache because each repository's root of
 # trust (root.txt) will need to already be stored below here and should
@@ -31,3 +39,63 @@ temporary_directory = None
 # which already exists and within that directory should have the file
 # 'cur/root.txt'.  This must be set!
 repository_directory = None
+
+# The file in which tuf.hashcache keeps the hashes of local files, keyed by
+# their path, size, modification time and inode, so that unchanged files
+# are not hashed again.  If None, 'hash_cache.txt' under
+# 'repository_directory' is used, or the cache is only kept in memory if
+# that is not set either.
+hash_cache_filename = None
+
+# If True, the hashes of local files are always computed again instead of
+# being looked up in the hash cache.
+hash_cache_strict = False
+
+# The number of files tuf.hash.digest_filenames() hashes at the same time.
+hash_worker_count = 4
+
+# The maximum number of connections tuf.download keeps open to a single
+# host at the same time.  Downloads from the same host wait for a
+# connection once this many are in use.
+max_connections_per_host = 4
+
+# The number of seconds an idle keep-alive connection is kept in the
+# connection pool before it is closed.
+connection_idle_timeout = 30
+
+# If True, every verified target is kept once in a content-addressed store
+# under 'repository_directory' and hard linked into the destination
+# directories that need it, instead of being downloaded for each of them
+# (see tuf.client.targetstore).
+use_target_store = False
+
+# The number of targets Repository.download_targets() downloads at the
+# same time.  Downloads from a single mirror are further limited by
+# 'max_connections_per_host'.
+download_worker_count = 8
+
+# The number of delegated targets roles, of the same depth of delegation,
+# whose metadata Repository downloads and verifies at the same time when it
+# refreshes them.  A parent role is always updated before its delegated
+# roles.  Set to 1 to refresh the roles one at a time.
+metadata_refresh_worker_count = 8
+
+# The number of times Repository.download_target() resumes an interrupted
+# target download from the same mirror, with a 'Range' request, before it
+# resumes it from the next mirror.
+download_resume_attempts = 2
+
+# Targets of at least this many bytes are downloaded in segments from all
+# the mirrors that serve them at once (see
+# tuf.download.download_url_segments_to_tempfileobj()).  None to always
+# download targets from a single mirror.
+segmented_download_threshold = 8388608
+
+# The number of bytes of a target requested at a time in a segmented
+# download.
+download_segment_size = 1048576
+
+# The fraction of downloads that try a mirror other than the best ranked
+# one first (see tuf.mirrors.MirrorScoreboard), so the scores of the
+# other mirrors stay current.
+mirror_exploration_rate = 0.05
@@ -0,0 +1,392 @@
+"""
+<Program Name>
+  connectionpool.py
+
+<Started>
+  October 18, 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Keep HTTP/1.1 connections to the mirrors open across downloads, so that
+  every metadata file and target downloaded from the same mirror does not
+  pay for a new TCP (and TLS) connection.  The number of connections open
+  to a host at once is bounded by 'tuf.conf.max_connections_per_host' and
+  idle connections are closed after 'tuf.conf.connection_idle_timeout'
+  seconds.
+
+  tuf.download uses the pool for all 'http' and 'https' urls:
+
+    response = tuf.connectionpool.urlopen(url)
+    data = response.read(8192)
+    response.close()
+
+"""
+
+import httplib
+import logging
+import socket
+import threading
+import time
+import urlparse
+
+import tuf
+import tuf.conf
+
+# See 'log.py' to learn how logging is handled in TUF.
+logger = logging.getLogger('tuf.connectionpool')
+
+# The number of redirects followed before a request fails.
+MAX_REDIRECTS = 5
+
+# The status codes of redirects that are followed.
+_REDIRECT_CODES = (301, 302, 303, 307)
+
+_CONNECTION_CLASSES = {'http': httplib.HTTPConnection,
+                       'https': httplib.HTTPSConnection}
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+
+
+
+class ConnectionPool(object):
+  """
+  <Purpose>
+    A pool of persistent connections, keyed by (scheme, host, port).
+
+  <Arguments>
+    max_connections_per_host:
+      The maximum number of connections in use to a host at the same time.
+      None to use 'tuf.conf.max_connections_per_host'.
+
+    idle_timeout:
+      The number of seconds an unused connection is kept.  None to use
+      'tuf.conf.connection_idle_timeout'.
+
+  """
+
+  def __init__(self, max_connections_per_host=None, idle_timeout=None):
+    self._max_connections_per_host = max_connections_per_host
+    self._idle_timeout = idle_timeout
+
+    self._condition = threading.Condition()
+
+    # (scheme, host, port) -> [(connection, time it became idle)]
+    self._idle_connections = {}
+
+    # (scheme, host, port) -> number of connections handed out
+    self._active_counts = {}
+
+
+
+  def _max_connections(self):
+    if self._max_connections_per_host is not None:
+      return self._max_connections_per_host
+    return tuf.conf.max_connections_per_host
+
+
+
+  def _timeout(self):
+    if self._idle_timeout is not None:
+      return self._idle_timeout
+    return tuf.conf.connection_idle_timeout
+
+
+
+  def acquire(self, host_key):
+    """
+    <Purpose>
+      Get a connection to a host, waiting while the host already has
+      the maximum number of connections in use.
+
+    <Arguments>
+      host_key:
+        A (scheme, host, port) tuple.
+
+    <Returns>
+      A tuple (connection, reused).  'reused' is True if the connection
+      was taken from the pool rather than created.
+
+    """
+
+    self._condition.acquire()
+    try:
+      while self._active_counts.get(host_key, 0) >= self._max_connections():
+        self._condition.wait()
+
+      self._active_counts[host_key] = self._active_counts.get(host_key, 0) + 1
+
+      # Take the most recently used idle connection that has not timed out.
+      idle_connections = self._idle_connections.get(host_key, [])
+      now = time.time()
+      while idle_connections:
+        connection, idle_since = idle_connections.pop()
+        if now - idle_since < self._timeout():
+          return connection, True
+        connection.close()
+    finally:
+      self._condition.release()
+
+    scheme, host, port = host_key
+    connection = _CONNECTION_CLASSES[scheme](host, port)
+    return connection, False
+
+
+
+  def release(self, host_key, connection, reusable=True):
+    """
+    <Purpose>
+      Return a connection obtained from acquire().  The connection is kept
+      for later requests if 'reusable' is True, closed otherwise.
+
+    <Arguments>
+      host_key:
+        The (scheme, host, port) tuple given to acquire().
+
+      connection:
+        The connection.
+
+      reusable:
+        Whether the last response was fully read and the server allows
+        the connection to be kept alive.
+
+    <Returns>
+      None.
+
+    """
+
+    self._condition.acquire()
+    try:
+      self._active_counts[host_key] -= 1
+
+      if reusable:
+        self._idle_connections.setdefault(host_key, []).append((connection,
+                                                                time.time()))
+      else:
+        connection.close()
+
+      self._condition.notify()
+    finally:
+      self._condition.release()
+
+
+
+  def close_idle_connections(self):
+    """
+    <Purpose>
+      Close all the connections that are not in use.
+
+    <Returns>
+      None.
+
+    """
+
+    self._condition.acquire()
+    try:
+      for idle_connections in self._idle_connections.values():
+        for connection, idle_since in idle_connections:
+          connection.close()
+      self._idle_connections = {}
+    finally:
+      self._condition.release()
+
+
+
+
+
+class PooledResponse(object):
+  """
+  <Purpose>
+    The response to a request made through a ConnectionPool.  It has the
+    part of the interface of the objects returned by urllib2.urlopen()
+    used by tuf.download.  Closing the response returns its connection to
+    the pool.
+
+  """
+
+  def __init__(self, pool, host_key, connection, response):
+    self.code = response.status
+    self._pool = pool
+    self._host_key = host_key
+    self._connection = connection
+    self._response = response
+
+
+
+  def info(self):
+    return self._response.msg
+
+
+
+  def read(self, amount=None):
+    """
+    <Purpose>
+      Read at most 'amount' bytes of the body, all of it if None.
+
+    <Exceptions>
+      tuf.DownloadError, if the connection fails while reading.
+
+    """
+
+    try:
+      return self._response.read(amount)
+    except (httplib.HTTPException, socket.error), e:
+      raise tuf.DownloadError('Unable to read the response from '+
+                              repr(self._host_key)+': '+str(e))
+
+
+
+  def close(self):
+    if self._connection is None:
+      return
+
+    # The connection can only be used again if the whole response was read.
+    reusable = self._response.isclosed() and not self._response.will_close
+    if not reusable:
+      self._response.close()
+
+    self._pool.release(self._host_key, self._connection, reusable)
+    self._connection = None
+
+
+
+
+
+def _request(pool, url, request_headers):
+  """
+  <Purpose>
+    Send a GET request for 'url' on a pooled connection.  A request on a
+    reused connection that the server has closed in the meantime is sent
+    again on a new connection.
+
+  <Exceptions>
+    httplib.HTTPException, socket.error if the request fails.
+
+    tuf.DownloadError, if 'url' is not an 'http' or 'https' url or its
+    port is invalid.
+
+  <Returns>
+    A PooledResponse.
+
+  """
+
+  parsed_url = urlparse.urlparse(url)
+  scheme = parsed_url.scheme.lower()
+  if scheme not in _CONNECTION_CLASSES:
+    raise tuf.DownloadError('Unsupported url scheme: '+repr(url))
+  try:
+    port = parsed_url.port or _DEFAULT_PORTS[scheme]
+  except ValueError, e:
+    raise tuf.DownloadError('Invalid port in '+repr(url)+': '+str(e))
+  host_key = (scheme, parsed_url.hostname, port)
+
+  path = parsed_url.path or '/'
+  if parsed_url.query:
+    path += '?' + parsed_url.query
+
+  headers = {'Connection': 'keep-alive'}
+  headers.update(request_headers)
+
+  while True:
+    connection, reused = pool.acquire(host_key)
+    try:
+      connection.request('GET', path, headers=headers)
+      response = connection.getresponse()
+    except (httplib.HTTPException, socket.error), e:
+      pool.release(host_key, connection, reusable=False)
+      if reused:
+        logger.debug('Kept alive connection to '+repr(host_key)+' was closed.')
+        continue
+      raise
+
+    return PooledResponse(pool, host_key, connection, response)
+
+
+
+
+
+def urlopen(url, request_headers=None, pool=None):
+  """
+  <Purpose>
+    Open 'url' with a GET request on a kept alive connection.  Redirects
+    are followed.
+
+  <Arguments>
+    url:
+      An 'http' or 'https' url.
+
+    request_headers:
+      A dictionary of extra headers to send.
+
+    pool:
+      The ConnectionPool to use, the module's default pool if None.
+
+  <Exceptions>
+    tuf.DownloadError, if the request fails or the response is an error.
+
+  <Returns>
+    A PooledResponse whose status is 200, 206 (the reply to a 'Range'
+    request) or 304.  The caller must close it.
+
+  """
+
+  if pool is None:
+    pool = default_pool
+  if request_headers is None:
+    request_headers = {}
+
+  for redirect in range(MAX_REDIRECTS + 1):
+    try:
+      response = _request(pool, url, request_headers)
+    except (httplib.HTTPException, socket.error), e:
+      raise tuf.DownloadError('Unable to open '+url+': '+str(e))
+
+    if response.code in (200, 206, 304):
+      return response
+
+    location = response.info().get('Location')
+
+    # Read the rest of the body so the connection can be reused.
+    response.read()
+    response.close()
+
+    if response.code not in _REDIRECT_CODES or location is None:
+      raise tuf.DownloadError('Unable to open '+url+': HTTP status '+
+                              str(response.code))
+
+    # The mirror controls the redirect; only follow it to a url the pool
+    # can open.
+    redirect_url = urlparse.urljoin(url, location)
+    if not is_pooled_url(redirect_url):
+      raise tuf.DownloadError('Unable to open '+url+': redirected to '+
+                              'unsupported url '+repr(redirect_url))
+    url = redirect_url
+    logger.debug('Redirected to '+url)
+
+  raise tuf.DownloadError('Too many redirects for '+url)
+
+
+
+
+
+def is_pooled_url(url):
+  """
+  <Purpose>
+    Check whether 'url' can be opened with urlopen().
+
+  <Returns>
+    True for 'http' and 'https' urls.
+
+  """
+
+  return urlparse.urlparse(url).scheme.lower() in _CONNECTION_CLASSES
+
+
+
+
+
+# The pool shared by all downloads.
+default_pool = ConnectionPool()
@@ -0,0 +1,378 @@
+"""
+<Program Name>
+  delta.py
+
+<Started>
+  October 18, 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Generate and apply binary deltas between two versions of a target file,
+  so that a client holding the previous version of a large target only
+  downloads the bytes that changed.
+
+  A delta is a list of operations that rebuild the new file: copy a range
+  of the old file, or insert bytes carried by the delta.  Deltas are
+  generated by the repository tools (see tuf.repo.signerlib) by matching
+  the blocks of the old file with a rolling checksum over the new one.
+
+  The repository lists the deltas of a target in the 'custom' field of its
+  file information, keyed by the sha256 hash of the old version:
+
+    'custom': {'deltas': {<old sha256>: <fileinfo of the delta>}}
+
+  The deltas themselves are stored under DELTAS_DIRECTORY in the targets
+  directory (see get_delta_filepath()).  Each delta starts with the sha256
+  hash of the version it rebuilds, so that the repository tools list only
+  the deltas to the current version of a target (see
+  get_delta_target_digest()).  The client verifies the delta against its
+  fileinfo and the rebuilt file against the trusted hashes of the target,
+  so a delta is never trusted on its own.
+
+"""
+
+import struct
+import zlib
+
+import tuf
+import tuf.hash
+
+
+# The directory, relative to the targets directory of the repository and
+# the 'targets_path' of the mirrors, under which the deltas are stored.
+DELTAS_DIRECTORY = '.deltas'
+
+# The first bytes of every delta file.  They are followed by the hexdigest
+# of the rebuilt file and a newline.
+DELTA_MAGIC = 'TUFDELTA2\n'
+
+# The size of the blocks of the old file that are matched.
+DEFAULT_BLOCK_SIZE = 1024
+
+# The hash algorithm that identifies the old and new versions of a target.
+DELTA_HASH_ALGORITHM = 'sha256'
+
+# The length of the hexdigests of DELTA_HASH_ALGORITHM.
+_HEXDIGEST_LENGTH = 64
+
+_COPY_OPERATION = struct.Struct('>cQI')
+_INSERT_OPERATION = struct.Struct('>cI')
+
+# Adler-32 is computed modulo this prime.
+_ADLER_MODULUS = 65521
+
+
+
+
+
+def get_delta_filepath(target_filepath, old_digest):
+  """
+  <Purpose>
+    Get the path of the delta that updates the version of 'target_filepath'
+    whose sha256 hash is 'old_digest'.
+
+  <Arguments>
+    target_filepath:
+      The path of the target, relative to the targets directory.
+
+    old_digest:
+      The sha256 hexdigest of the old version of the target.
+
+  <Returns>
+    The path of the delta, relative to the targets directory.
+
+  """
+
+  return '/'.join([DELTAS_DIRECTORY, target_filepath.lstrip('/'),
+                   old_digest + '.delta'])
+
+
+
+
+
+def generate_delta(old_filename, new_filename, delta_filename,
+                   block_size=DEFAULT_BLOCK_SIZE):
+  """
+  <Purpose>
+    Write the delta that rebuilds 'new_filename' from 'old_filename'.
+
+  <Arguments>
+    old_filename:
+      The previous version of the file.
+
+    new_filename:
+      The new version of the file.
+
+    delta_filename:
+      The file to write the delta to.  Its parent directory must exist.
+
+    block_size:
+      The size of the blocks of the old file that are matched.  Smaller
+      blocks find more matches but make generation slower.
+
+  <Exceptions>
+    IOError, if the files cannot be read or written.
+
+  <Side Effects>
+    The delta file is written.
+
+  <Returns>
+    None.
+
+  """
+
+  old_file = open(old_filename, 'rb')
+  try:
+    old_data = old_file.read()
+  finally:
+    old_file.close()
+
+  new_file = open(new_filename, 'rb')
+  try:
+    new_data = new_file.read()
+  finally:
+    new_file.close()
+
+  digest_object = tuf.hash.digest(DELTA_HASH_ALGORITHM)
+  digest_object.update(new_data)
+
+  delta_file = open(delta_filename, 'wb')
+  try:
+    delta_file.write(DELTA_MAGIC + digest_object.hexdigest() + '\n')
+    for operation in _make_operations(old_data, new_data, block_size):
+      if operation[0] == 'C':
+        delta_file.write(_COPY_OPERATION.pack(*operation))
+      else:
+        start, end = operation[1], operation[2]
+        delta_file.write(_INSERT_OPERATION.pack('I', end - start))
+        delta_file.write(new_data[start:end])
+  finally:
+    delta_file.close()
+
+
+
+
+
+def get_delta_target_digest(delta_filename):
+  """
+  <Purpose>
+    Get the sha256 hash of the file that a delta rebuilds, recorded in the
+    delta when it was generated.
+
+  <Arguments>
+    delta_filename:
+      The delta file.
+
+  <Exceptions>
+    IOError, if the delta cannot be read.
+
+    tuf.Error, if the file is not a delta.
+
+  <Returns>
+    The hexdigest of the rebuilt file.
+
+  """
+
+  delta_file = open(delta_filename, 'rb')
+  try:
+    return _read_header(delta_file)
+  finally:
+    delta_file.close()
+
+
+
+
+
+def _make_operations(old_data, new_data, block_size):
+  """
+  <Purpose>
+    Match the blocks of 'old_data' in 'new_data'.  Every position of
+    'new_data' is looked up by its Adler-32 checksum, which is rolled one
+    byte at a time, but after a match the next block of the old data is
+    tried first, so unchanged stretches cost one comparison per block.
+
+  <Returns>
+    A list of ('C', old offset, length) copy operations and ('I', start,
+    end) operations that insert new_data[start:end].
+
+  """
+
+  # The offsets of the blocks of the old data by their checksum.
+  block_offsets = {}
+  for offset in range(0, len(old_data) - block_size + 1, block_size):
+    checksum = zlib.adler32(old_data[offset:offset+block_size]) & 0xffffffff
+    block_offsets.setdefault(checksum, []).append(offset)
+
+  operations = []
+  new_bytes = bytearray(new_data)
+  new_length = len(new_data)
+
+  position = 0
+  literal_start = 0
+  # The old offset following the last copied block, tried first.
+  expected_offset = None
+  # The Adler-32 sums of new_data[position:position+block_size], if known.
+  checksum_a = None
+  checksum_b = None
+
+  while position + block_size <= new_length:
+    match = None
+
+    if expected_offset is not None and \
+       old_data[expected_offset:expected_offset+block_size] == \
+       new_data[position:position+block_size]:
+      match = expected_offset
+
+    else:
+      if checksum_a is None:
+        checksum = zlib.adler32(new_data[position:position+block_size]) & \
+                   0xffffffff
+        checksum_a = checksum & 0xffff
+        checksum_b = checksum >> 16
+
+      offsets = block_offsets.get(checksum_a | (checksum_b << 16))
+      if offsets is not None:
+        block = new_data[position:position+block_size]
+        for offset in offsets:
+          if old_data[offset:offset+block_size] == block:
+            match = offset
+            break
+
+    if match is not None:
+      if literal_start < position:
+        operations.append(('I', literal_start, position))
+
+      # Extend the previous copy if this block follows it in the old data.
+      if operations and operations[-1][0] == 'C' and \
+         operations[-1][1] + operations[-1][2] == match:
+        operations[-1] = ('C', operations[-1][1],
+                          operations[-1][2] + block_size)
+      else:
+        operations.append(('C', match, block_size))
+
+      position = position + block_size
+      literal_start = position
+      expected_offset = match + block_size
+      checksum_a = None
+      continue
+
+    # Roll the checksum one byte forward.
+    expected_offset = None
+    if position + block_size < new_length:
+      outgoing = new_bytes[position]
+      incoming = new_bytes[position + block_size]
+      checksum_a = (checksum_a - outgoing + incoming) % _ADLER_MODULUS
+      checksum_b = (checksum_b - block_size * outgoing + checksum_a - 1) % \
+                   _ADLER_MODULUS
+    position = position + 1
+
+  if literal_start < new_length:
+    operations.append(('I', literal_start, new_length))
+
+  return operations
+
+
+
+
+
+def apply_delta(old_file_object, delta_file_object, output_file_object,
+                max_length, digest_objects=()):
+  """
+  <Purpose>
+    Rebuild a file from its old version and a delta.
+
+  <Arguments>
+    old_file_object:
+      The old version of the file, opened for reading.
+
+    delta_file_object:
+      The delta, a file-like object positioned at its beginning.
+
+    output_file_object:
+      Where the rebuilt file is written, e.g. a tuf.util.TempFile.
+
+    max_length:
+      The length the rebuilt file may not exceed.
+
+    digest_objects:
+      Digest objects that are updated with the rebuilt file.
+
+  <Exceptions>
+    tuf.Error, if the delta is malformed or does not fit the old file.
+
+  <Side Effects>
+    The rebuilt file is written to 'output_file_object'.
+
+  <Returns>
+    The length of the rebuilt file.
+
+  """
+
+  _read_header(delta_file_object)
+
+  output_length = 0
+  while True:
+    operation = delta_file_object.read(1)
+    if not operation:
+      break
+
+    if operation == 'C':
+      header = operation + _read_exactly(delta_file_object,
+                                         _COPY_OPERATION.size - 1)
+      junk, offset, length = _COPY_OPERATION.unpack(header)
+      old_file_object.seek(offset)
+      source = old_file_object
+    elif operation == 'I':
+      header = operation + _read_exactly(delta_file_object,
+                                         _INSERT_OPERATION.size - 1)
+      junk, length = _INSERT_OPERATION.unpack(header)
+      source = delta_file_object
+    else:
+      raise tuf.Error('Unknown delta operation: '+repr(operation))
+
+    output_length = output_length + length
+    if output_length > max_length:
+      raise tuf.Error('The delta rebuilds more than '+str(max_length)+
+                      ' bytes.')
+
+    while length > 0:
+      data = _read_exactly(source, min(length, 65536))
+      output_file_object.write(data, auto_flush=False)
+      for digest_object in digest_objects:
+        digest_object.update(data)
+      length = length - len(data)
+
+  output_file_object.flush()
+  return output_length
+
+
+
+
+
+def _read_header(delta_file_object):
+  """
+  <Purpose>
+    Read the header of a delta and return the hexdigest it records.
+
+  <Exceptions>
+    tuf.Error, if the file is not a delta.
+  """
+
+  header = delta_file_object.read(len(DELTA_MAGIC) + _HEXDIGEST_LENGTH + 1)
+  if not header.startswith(DELTA_MAGIC) or not header.endswith('\n') or \
+     len(header) != len(DELTA_MAGIC) + _HEXDIGEST_LENGTH + 1:
+    raise tuf.Error('Not a delta file.')
+
+  return header[len(DELTA_MAGIC):-1]
+
+
+
+
+
+def _read_exactly(file_object, length):
+  data = file_object.read(length)
+  if len(data) != length:
+    raise tuf.Error('Truncated delta or old file.')
+  return data
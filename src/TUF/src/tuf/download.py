@@ -19,26 +19,48 @@
   file-like object that will automatically destroys itself once closed.  Note
   that the file-like object, 'tuf.util.TempFile', is returned by the
   'download_url_to_tempfileobj()' function.
+
+  An interrupted download can be resumed: the caller passes the same
+  'partial_file' to 'download_url_to_tempfileobj()' again, for the same or
+  another mirror, and only the missing bytes are requested with an HTTP
+  'Range' request.  The hashes are always checked over the whole file.
+
+  Large files can be downloaded in segments from several mirrors at once
+  with 'download_url_segments_to_tempfileobj()'.  The segments are
+  reassembled in a single temp file, whose length and hashes are checked as
+  a whole, so it does not matter which mirror served which segment.
+
+  If the repository hashed a target in chunks (see tuf.chunks), each chunk
+  is verified as soon as it arrives, so a mirror sending bad data is
+  dropped after the first bad chunk and only that chunk is downloaded again.
   
 """
 
+import time
+import Queue
 import urllib2
 import logging
+import threading
 
+import tuf.chunks
+import tuf.conf
 import tuf.hash
 import tuf.util
 import tuf.formats
+import tuf.connectionpool
+import tuf.mirrors
 
 # See 'log.py' to learn how logging is handled in TUF.
 logger = logging.getLogger('tuf.download')
 
 
-def _open_connection(url):
+def _open_connection(url, request_headers=None):
   """
   <Purpose>
-    Helper function that opens a connection to the url. urllib2 supports http, 
-    ftp, and file. In python (2.6+) where the ssl module is available, urllib2 
-    also supports https.
+    Helper function that opens a connection to the url. http and https urls
+    are opened on kept alive connections from 'tuf.connectionpool', so
+    successive downloads from a mirror reuse its connections.  Other urls
+    are opened with urllib2, which supports ftp and file.
     
     TODO: Do proper ssl cert/name checking. 
     TODO: Disallow SSLv2. 	
@@ -50,6 +72,10 @@ def _open_connection(url):
   <Arguments>
     url:
       URL string (e.g., 'http://...' or 'ftp://...' or 'file://...') 
+
+    request_headers:
+      A dictionary of extra headers to send with the request, e.g. the
+      'If-None-Match' header of a conditional request.
     
   <Exceptions>
     urllib2.URLError
@@ -58,9 +84,23 @@ def _open_connection(url):
     Opens a connection to a remote server.
     
   <Returns>
-    File-like object.
+    File-like object, or None if 'request_headers' made the request
+    conditional and the server replied that the file has not been modified.
     
   """
+
+  if tuf.connectionpool.is_pooled_url(url):
+    connection = tuf.connectionpool.urlopen(url, request_headers)
+
+    if connection.code == 304:
+      # Read the empty body so the connection goes back to the pool.
+      connection.read()
+      connection.close()
+      if request_headers is not None:
+        return None
+      raise tuf.DownloadError('Unexpected HTTP status 304 for '+url)
+
+    return connection
   
   try:
     # urllib2.Request produces a Request object that allows for a finer control 
@@ -71,7 +111,15 @@ def _open_connection(url):
     # servers do not recognize connections that originates from 
     # Python-urllib/x.y.
     request = urllib2.Request(url)
+    if request_headers is not None:
+      for header_name, header_value in request_headers.items():
+        request.add_header(header_name, header_value)
     connection = urllib2.urlopen(request)
+  except urllib2.HTTPError, e:
+    # A conditional request for a file that has not changed.
+    if e.code == 304 and request_headers is not None:
+      return None
+    raise tuf.DownloadError
   except Exception, e:
     raise tuf.DownloadError
   
@@ -84,27 +132,29 @@ def _open_connection(url):
 
 
 
-def _check_hashes(input_file, trusted_hashes):
+def _check_hashes(digest_objects, trusted_hashes):
   """
   <Purpose>
     Helper function that verifies multiple secure hashes of the downloaded file.
     If any of these fail it raises an exception.  This is to conform with the 
     TUF specs, which support clients with different hashing algorithms. The
-    'hash.py' module is used to compute the hashes of the 'input_file'. 
+    digest objects are fed as the file is downloaded, so the file is never
+    read back to compute them.
 
   <Arguments>
-    input_file:
-      A file or file-like object.
+    digest_objects:
+      A dictionary with hash-algorithm names as keys and the digest objects,
+      updated with the whole file, as dict values.
     
     trusted_hashes: 
       A dictionary with hash-algorithm names as keys and hashes as dict values.
       The hashes should be in the hexdigest format.
     
   <Exceptions>
-    tuf.BadHash, if the hashes don't match.
+    tuf.BadHashError, if the hashes don't match.
     
   <Side Effects>
-    Hash digest object is created using tfh 'tuf.hash' module.
+    None.
     
   <Returns>
     None.
@@ -113,22 +163,20 @@ def _check_hashes(input_file, trusted_hashes):
   # Verify each trusted hash of 'trusted_hashes'.  Raise exception if
   # any of the hashes are incorrect and return if all are correct.
   for algorithm, trusted_hash in trusted_hashes.items():
-    digest_object = tuf.hash.digest(algorithm)
-    digest_object.update(input_file.read())
-    computed_hash = digest_object.hexdigest()
+    computed_hash = digest_objects[algorithm].hexdigest()
     if trusted_hash != computed_hash:
       msg = 'Hashes do not match. Expected '+trusted_hash+' got '+computed_hash
-      raise tuf.BadHash(msg)
+      raise tuf.BadHashError(msg)
     else:
       logger.info('The file\'s '+algorithm+' hash is correct: '+trusted_hash)
   
   return
 
 
-
-
-
-def download_url_to_tempfileobj(url, required_hashes=None, required_length=None):
+def download_url_to_tempfileobj(url, required_hashes=None, required_length=None,
+                                partial_file=None, temp_directory=None,
+                                decompression=None, chunk_hashes=None,
+                                optional=False):
   """
   <Purpose>
     Given the url, hashes and length of the desired file, this function 
@@ -151,9 +199,42 @@ def download_url_to_tempfileobj(url, required_hashes=None, required_length=None)
   
     required_length:
       An integer value representing the length of the file.
+
+    partial_file:
+      A 'tuf.util.TempFile' holding the first bytes of the file from an
+      earlier, interrupted download, or an empty one, or None.  If given,
+      the download resumes after those bytes when the server supports
+      'Range' requests ('http' and 'https' urls only) and starts over
+      otherwise.  The file is not destroyed if the download fails, so the
+      caller can resume it again; it is emptied if its data turned out to
+      be wrong.  The caller closes it when it gives up.
+
+    temp_directory:
+      The directory to create the 'tuf.util.TempFile' in, preferably the
+      one the file is moved to once verified (see 'tuf.util.TempFile').
+      Ignored if 'partial_file' is given.
+
+    decompression:
+      The compression of the file at 'url', one of
+      'tuf.util.get_supported_compressions()', or None.  The file is
+      decompressed as it is downloaded and the returned TempFile holds the
+      decompressed data.  'required_hashes' and 'required_length' are those
+      of the compressed file.  Cannot be combined with 'partial_file'.
+
+    chunk_hashes:
+      The verified 'tuf.chunks.ChunkHashes' of the file, or None.  If
+      given, every chunk is checked as it arrives and the download stops at
+      the first bad one.  The verified chunks are kept in 'partial_file',
+      so another mirror can resume after them.  Cannot be combined with
+      'decompression'.
+
+    optional:
+      True if the mirror need not host the file, e.g. the chunk hashes of
+      a target.  A failed download is then not held against the mirror in
+      'tuf.mirrors.scoreboard'.
   
   <Side Effects>
-    'tuf.util.TempFile' object is created.
+    'tuf.util.TempFile' object is created, or 'partial_file' is extended.
  
   <Exceptions>
     tuf.DownloadError, if there was an error while downloading the file.
@@ -161,7 +242,7 @@ def download_url_to_tempfileobj(url, required_hashes=None, required_length=None)
     tuf.FormatError, if any of the arguments are improperly formatted. 
  
   <Returns>
-    'tuf.util.TempFile' instance.
+    'tuf.util.TempFile' instance, 'partial_file' if it was given.
   
   """
 
@@ -172,22 +253,497 @@ def download_url_to_tempfileobj(url, required_hashes=None, required_length=None)
     tuf.formats.HASHDICT_SCHEMA.check_match(required_hashes)
   if required_length is not None:
     tuf.formats.LENGTH_SCHEMA.check_match(required_length)
+  if decompression is not None:
+    if decompression not in tuf.util.get_supported_compressions():
+      raise tuf.FormatError('Unsupported compression: '+repr(decompression))
+    if partial_file is not None:
+      raise tuf.FormatError('A compressed download cannot be resumed.')
+    if chunk_hashes is not None:
+      raise tuf.FormatError('A compressed download cannot be verified in '+
+                            'chunks.')
 
   # 'url.replace()' is for compatibility with Windows-based systems because they 
   # might put back-slashes in place of forward-slashes.  This converts it to the
   # common format. 
   url = url.replace('\\','/')
   logger.info('Downloading '+url)
-  connection = _open_connection(url)
-  temp_file = tuf.util.TempFile()
+
+  # The number of bytes of the file we already have.
+  offset = 0
+  request_headers = None
+  if partial_file is not None:
+    partial_file.seek(0, 2)
+    offset = partial_file.tell()
+
+    # Only http servers can send us the rest of the file, and a partial
+    # file that is already complete failed its hash check before.
+    if offset > 0 and (not tuf.connectionpool.is_pooled_url(url) or
+        (required_length is not None and offset >= required_length)):
+      partial_file.truncate()
+      offset = 0
+
+    if offset > 0:
+      logger.info('Resuming the download of '+url+' at byte '+str(offset))
+      request_headers = {'Range': 'bytes='+str(offset)+'-'}
+
+  # Record how the mirror performed, so 'tuf.mirrors' can rank it.
+  start_time = time.time()
+  try:
+    connection = _open_connection(url, request_headers)
+    latency = time.time() - start_time
+
+    # A server that ignores the 'Range' header sends the whole file.
+    if offset > 0:
+      offset = _get_resume_offset(connection, url, offset)
+      if offset == 0:
+        partial_file.truncate()
+
+    temp_file, length = _download_connection_to_tempfileobj(connection, url,
+                                                            required_hashes,
+                                                            required_length,
+                                                            partial_file,
+                                                            offset,
+                                                            temp_directory,
+                                                            decompression,
+                                                            chunk_hashes)
+  except tuf.DownloadError:
+    if not optional:
+      tuf.mirrors.scoreboard.record_failure(url)
+    raise
+
+  tuf.mirrors.scoreboard.record_success(url, latency, length,
+                                        time.time() - start_time)
+
+  return temp_file
+
+
+
+
+
+def download_url_to_tempfileobj_if_modified(url, validators=None):
+  """
+  <Purpose>
+    Download the file at 'url' only if it changed since it was last
+    downloaded.  The request is made conditional with the 'ETag' and
+    'Last-Modified' validators the server returned for the previous
+    download, so an unchanged file costs a single small request.
+
+  <Arguments>
+    url:
+      A url string that represents the location of the file.
+
+    validators:
+      The validators returned by the previous call for this url, or None
+      to download the file unconditionally.
+
+  <Side Effects>
+    'tuf.util.TempFile' object is created if the file has changed.
+
+  <Exceptions>
+    tuf.DownloadError, if there was an error while downloading the file.
+
+    tuf.FormatError, if 'url' is improperly formatted.
+
+  <Returns>
+    A tuple ('tuf.util.TempFile' instance, validators).  The TempFile is
+    None if the file has not been modified, in which case 'validators' is
+    returned unchanged.
+
+  """
+
+  tuf.formats.URL_SCHEMA.check_match(url)
+
+  request_headers = {}
+  if validators is not None:
+    if validators.get('etag') is not None:
+      request_headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified') is not None:
+      request_headers['If-Modified-Since'] = validators['last_modified']
+
+  url = url.replace('\\','/')
+  logger.info('Downloading '+url+' if modified')
+  connection = _open_connection(url, request_headers)
+
+  if connection is None:
+    logger.info(url+' has not been modified.')
+    return None, validators
+
+  new_validators = {'etag': connection.info().get('ETag'),
+                    'last_modified': connection.info().get('Last-Modified')}
+  temp_file, length = _download_connection_to_tempfileobj(connection, url,
+                                                          None, None)
+
+  return temp_file, new_validators
+
+
+
+
+
+def download_url_segments_to_tempfileobj(urls, required_hashes,
+                                         required_length, segment_size=None,
+                                         temp_directory=None,
+                                         chunk_hashes=None):
+  """
+  <Purpose>
+    Download a file from several mirrors at once.  The file is split into
+    segments of 'segment_size' bytes, and one worker thread per url
+    downloads segments from its mirror with 'Range' requests until none
+    are left.  A segment that fails is handed to the remaining mirrors and
+    the mirror that failed it is not used again.  Once all the segments
+    are in place the length and hashes of the whole file are checked.
+
+  <Arguments>
+    urls:
+      A list of url strings of the same file on different mirrors.  Only
+      'http' and 'https' urls are used.
+
+    required_hashes:
+      A dictionary, where the keys represent the hashing algorithm used to
+      hash the file and the dict values the hexdigest.
+
+    required_length:
+      An integer value representing the length of the file.
+
+    segment_size:
+      The number of bytes requested at a time.  If None,
+      'tuf.conf.download_segment_size' is used.
+
+    temp_directory:
+      The directory to create the 'tuf.util.TempFile' in, preferably the
+      one the file is moved to once verified (see 'tuf.util.TempFile').
+
+    chunk_hashes:
+      The verified 'tuf.chunks.ChunkHashes' of the file, or None.  If
+      given, the segments are made of whole chunks and checked as they
+      arrive; a mirror that sends a bad segment is treated like one that
+      failed to send it.
+
+  <Side Effects>
+    'tuf.util.TempFile' object is created.
+
+  <Exceptions>
+    tuf.DownloadError, if a segment could not be downloaded from any of
+    the mirrors, or the file does not match its hashes.
+
+    tuf.FormatError, if any of the arguments are improperly formatted.
+
+  <Returns>
+    'tuf.util.TempFile' instance.
+
+  """
+
+  # Do all of the arguments have the appropriate format?
+  # Raise 'tuf.FormatError' if there is a mismatch.
+  for url in urls:
+    tuf.formats.URL_SCHEMA.check_match(url)
+  tuf.formats.HASHDICT_SCHEMA.check_match(required_hashes)
+  tuf.formats.LENGTH_SCHEMA.check_match(required_length)
+
+  if segment_size is None:
+    segment_size = tuf.conf.download_segment_size
+  if chunk_hashes is not None:
+    segment_size = max(1, segment_size // chunk_hashes.chunk_size) * \
+                   chunk_hashes.chunk_size
+
+  urls = [url.replace('\\','/') for url in urls]
+  urls = [url for url in urls if tuf.connectionpool.is_pooled_url(url)]
+  if not urls:
+    raise tuf.DownloadError('No mirror supports segmented downloads.')
+
+  pending_segments = Queue.Queue()
+  for first_byte in range(0, required_length, segment_size):
+    last_byte = min(first_byte + segment_size, required_length) - 1
+    pending_segments.put((first_byte, last_byte))
+  segment_count = pending_segments.qsize()
+
+  temp_file = tuf.util.TempFile(directory=temp_directory)
+  # Guards 'temp_file' and 'state'.  'busy' is the number of segments held
+  # by the workers.
+  lock = threading.Lock()
+  state = {'written': 0, 'workers': len(urls), 'busy': 0}
+  done = threading.Event()
+  if segment_count == 0:
+    done.set()
+
+  def download_pending_segments(url):
+    try:
+      while not done.is_set():
+        try:
+          segment = pending_segments.get(timeout=0.1)
+        except Queue.Empty:
+          # Stop once no segment is left to download or held by a worker.
+          lock.acquire()
+          try:
+            if state['busy'] == 0 and pending_segments.empty():
+              done.set()
+          finally:
+            lock.release()
+          continue
+
+        lock.acquire()
+        try:
+          state['busy'] = state['busy'] + 1
+        finally:
+          lock.release()
+
+        try:
+          first_byte, last_byte = segment
+          try:
+            data = _download_segment(url, first_byte, last_byte)
+            if chunk_hashes is not None:
+              try:
+                chunk_hashes.check_range(first_byte, data)
+              except tuf.BadHashError:
+                tuf.mirrors.scoreboard.record_failure(url)
+                raise
+          except Exception, e:
+            logger.warn('Segment '+str(first_byte)+'-'+str(last_byte)+
+                        ' failed from '+url+': '+str(e))
+            # Let the other mirrors have it and stop using this one.
+            pending_segments.put(segment)
+            return
+
+          lock.acquire()
+          try:
+            temp_file.seek(first_byte)
+            temp_file.write(data, auto_flush=False)
+            state['written'] = state['written'] + 1
+            if state['written'] == segment_count:
+              done.set()
+          finally:
+            lock.release()
+
+        finally:
+          lock.acquire()
+          try:
+            state['busy'] = state['busy'] - 1
+          finally:
+            lock.release()
+
+    finally:
+      # Retire the worker, whatever stopped it.
+      lock.acquire()
+      try:
+        state['workers'] = state['workers'] - 1
+        if state['workers'] == 0:
+          done.set()
+      finally:
+        lock.release()
+
+  logger.info('Downloading '+str(segment_count)+' segments from '+
+              str(len(urls))+' mirrors.')
+  workers = []
+  for url in urls:
+    worker = threading.Thread(target=download_pending_segments, args=(url,))
+    worker.daemon = True
+    worker.start()
+    workers.append(worker)
+
+  for worker in workers:
+    worker.join()
+
+  try:
+    if state['written'] != segment_count:
+      raise tuf.DownloadError('Unable to download all the segments.')
+
+    # The segments arrived out of order, so the file is hashed once it is
+    # complete.
+    temp_file.flush()
+    temp_file.seek(0)
+    digest_objects = {}
+    for algorithm in required_hashes:
+      digest_objects[algorithm] = tuf.hash.digest(algorithm)
+    total_length = 0
+    while True:
+      data = temp_file.read(8192)
+      if not data:
+        break
+      total_length = total_length + len(data)
+      for digest_object in digest_objects.values():
+        digest_object.update(data)
+
+    if total_length != required_length:
+      raise tuf.DownloadError('The user-required length of '+
+                              str(required_length)+' did not match the '+
+                              str(total_length)+' downloaded')
+    _check_hashes(digest_objects, required_hashes)
+
+  except Exception, e:
+    temp_file.close_temp_file()
+    logger.error(str(e))
+    raise tuf.DownloadError(e)
+
+  temp_file.seek(0)
+  return temp_file
+
+
+
+
+
+def _download_segment(url, first_byte, last_byte):
+  """
+  <Purpose>
+    Helper function that downloads the bytes 'first_byte' to 'last_byte',
+    inclusive, of the file at 'url'.  The mirror's score is updated.
+
+  <Exceptions>
+    tuf.DownloadError, if the server does not send exactly that range.
+
+  <Returns>
+    The data string.
+
+  """
+
+  segment_length = last_byte - first_byte + 1
+  request_headers = {'Range': 'bytes='+str(first_byte)+'-'+str(last_byte)}
+
+  start_time = time.time()
+  try:
+    connection = _open_connection(url, request_headers)
+    latency = time.time() - start_time
+
+    try:
+      if connection.code != 206 or \
+         _get_resume_offset(connection, url, first_byte) != first_byte:
+        raise tuf.DownloadError(url+' does not support Range requests.')
+
+      data_chunks = []
+      received_length = 0
+      while received_length < segment_length:
+        data = connection.read(min(8192, segment_length - received_length))
+        if not data:
+          raise tuf.DownloadError('Downloaded '+str(received_length)+
+                                  '.  Expected '+str(segment_length)+
+                                  ' for '+url)
+        data_chunks.append(data)
+        received_length = received_length + len(data)
+    finally:
+      connection.close()
+
+  except tuf.DownloadError:
+    tuf.mirrors.scoreboard.record_failure(url)
+    raise
+
+  tuf.mirrors.scoreboard.record_success(url, latency, segment_length,
+                                        time.time() - start_time)
+
+  return ''.join(data_chunks)
+
+
+
+
+
+def _get_resume_offset(connection, url, offset):
+  """
+  <Purpose>
+    Helper function that checks the reply to a 'Range' request for the
+    bytes of the file after 'offset'.
+
+  <Exceptions>
+    tuf.DownloadError, if the server sent a range other than the one
+    requested.
+
+  <Returns>
+    'offset' if the server sent the requested range, 0 if it ignored the
+    'Range' header and sent the whole file.
+
+  """
+
+  if connection.code != 206:
+    logger.info(url+' does not support resuming, downloading it again.')
+    return 0
+
+  # Content-Range: bytes first-last/length
+  content_range = connection.info().get('Content-Range', '')
+  first_byte = None
+  if content_range.lower().startswith('bytes '):
+    try:
+      first_byte = int(content_range[6:].split('-', 1)[0])
+    except ValueError:
+      pass
+
+  if first_byte != offset:
+    connection.close()
+    raise tuf.DownloadError('Unexpected Content-Range '+repr(content_range)+
+                            ' for '+url)
+
+  return offset
+
+
+
+
+
+def _download_connection_to_tempfileobj(connection, url, required_hashes,
+                                        required_length, partial_file=None,
+                                        offset=0, temp_directory=None,
+                                        decompression=None, chunk_hashes=None):
+  """
+  <Purpose>
+    Helper function that reads the file from an open connection into a
+    'tuf.util.TempFile' and checks its length and hashes.  If 'offset' is
+    not 0, the connection delivers the file after the first 'offset' bytes,
+    which are in 'partial_file'.  If 'decompression' is set, the data is
+    decompressed before it is stored; the length and hashes are checked on
+    the data as received.  If 'chunk_hashes' is set, every chunk is checked
+    as it arrives.
+
+  <Exceptions>
+    tuf.DownloadError, if there was an error while downloading the file.
+
+  <Returns>
+    A tuple ('tuf.util.TempFile' instance, number of bytes downloaded).
+
+  """
+
+  if partial_file is not None:
+    temp_file = partial_file
+  else:
+    temp_file = tuf.util.TempFile(directory=temp_directory)
   # Keep track of total bytes downloaded.
   total_downloaded = 0
+  chunk_verifier = None
   try:
-    # info().get('Content-Length') gets the length of the url file.
-    file_length = int(connection.info().get('Content-Length'))
+    # Create a digest object for every trusted hash.  They are updated as the
+    # data arrives, so the file is hashed in the same pass that stores it.
+    digest_objects = {}
+    if required_length is not None and required_hashes is not None:
+      for algorithm in required_hashes:
+        digest_objects[algorithm] = tuf.hash.digest(algorithm)
+
+    if chunk_hashes is not None:
+      chunk_verifier = tuf.chunks.ChunkVerifier(chunk_hashes)
+
+    # The hashes cover the whole file, so hash the bytes we already have.
+    if offset > 0 and (digest_objects or chunk_verifier is not None):
+      temp_file.seek(0)
+      while True:
+        data = temp_file.read(8192)
+        if not data:
+          break
+        for digest_object in digest_objects.values():
+          digest_object.update(data)
+        if chunk_verifier is not None:
+          chunk_verifier.update(data)
+    temp_file.seek(0, 2)
+
+    decompressor = None
+    if decompression is not None:
+      decompressor = tuf.util.StreamDecompressor(decompression)
+
+    # The length of the file the connection delivers.
+    if required_length is not None:
+      required_length = required_length - offset
+
+    # info().get('Content-Length') gets the length of the url file.  Not all
+    # connections provide it, in which case we read until the connection is
+    # closed, but never more than 'required_length'.
+    file_length = connection.info().get('Content-Length')
+    if file_length is not None:
+      file_length = int(file_length)
     
     # Does the url's 'file_length' match 'required_length'?
-    if required_length is not None and file_length != required_length:
+    if required_length is not None and file_length is not None and \
+       file_length != required_length:
       message = 'Incorrect length for '+url+'. Expected '+str(required_length)+ \
                 ', got '+str(file_length)+'.'
       raise tuf.DownloadError(message)
@@ -195,38 +751,76 @@ def download_url_to_tempfileobj(url, required_hashes=None, required_length=None)
     # While-block reads data from connection 8192-bytes at a time, or less,
     # until 'file_length' is reached.
     while True:
-      data = connection.read(min(8192, file_length - total_downloaded))
+      if file_length is not None:
+        data = connection.read(min(8192, file_length - total_downloaded))
+      else:
+        data = connection.read(8192)
       # We might have no more data to read.  Let us check bytes downloaded. 
       if not data:
         message = 'Downloaded '+str(total_downloaded)+'/' \
                   +str(file_length)+' bytes'
         logger.debug(message)
         # Did we download the correct amount indicated by 'Content-Length'? 
-        if total_downloaded != file_length:
+        if file_length is not None and total_downloaded != file_length:
           message = 'Downloaded '+str(total_downloaded)+'.  Expected '+ \
                     str(file_length)+' for '+url
           raise tuf.DownloadError(message)
         # Did we download the correct amount indicated by the user? 
         if required_length is not None and total_downloaded != required_length:
           message = 'The user-required length of '+str(required_length)+ \
-                    'did not match the '+str(len(total_downloaded))+' downloaded'
+                    ' did not match the '+str(total_downloaded)+' downloaded'
           raise tuf.DownloadError(message)
         break
-      # Data successfully read from the connection.  Store it. 
-      temp_file.write(data)
       total_downloaded = total_downloaded + len(data)
+      # Stop as soon as the server sends more than we asked for.
+      if required_length is not None and total_downloaded > required_length:
+        message = 'Downloaded more than the user-required length of '+ \
+                  str(required_length)+' for '+url
+        raise tuf.DownloadError(message)
+      # Data successfully read from the connection.  Store and hash it. 
+      for digest_object in digest_objects.values():
+        digest_object.update(data)
+      if decompressor is not None:
+        data = decompressor.decompress(data)
+      temp_file.write(data, auto_flush=False)
+      # The data is stored before its chunks are checked, so every chunk the
+      # verifier counts as verified is in 'temp_file'.  Chunked downloads
+      # are never decompressed.
+      if chunk_verifier is not None:
+        chunk_verifier.update(data)
  
     # We appear to have downloaded the correct amount.  Check the hashes.
     connection.close()
-    if required_length is not None and required_hashes is not None: 
-      _check_hashes(temp_file, required_hashes)
+    if decompressor is not None:
+      temp_file.write(decompressor.flush(), auto_flush=False)
+    temp_file.flush()
+    if chunk_verifier is not None:
+      chunk_verifier.finish()
+    if digest_objects: 
+      _check_hashes(digest_objects, required_hashes)
 
   # Exception is a base class for all non-exiting exceptions.
   except Exception, e:
-    # Closing 'temp_file'.  The 'temp_file' data is destroyed.
-    temp_file.close_temp_file()
+    if partial_file is None:
+      # Closing 'temp_file'.  The 'temp_file' data is destroyed.
+      temp_file.close_temp_file()
+    elif isinstance(e, tuf.BadHashError):
+      # Some of the data is wrong.  Keep the chunks that were verified, if
+      # any, otherwise we cannot tell which data is wrong.
+      if chunk_verifier is not None:
+        temp_file.seek(0, 2)
+        temp_file.truncate(min(chunk_verifier.verified_length,
+                               temp_file.tell()))
+      else:
+        temp_file.truncate()
+    else:
+      # Keep what we received, the download can be resumed.
+      temp_file.flush()
+    # Release the connection, a pooled connection is not kept since the
+    # response was not read completely.
+    connection.close()
     logger.error(str(e))
     raise tuf.DownloadError(e)
    
 
-  return temp_file
+  return temp_file, total_downloaded
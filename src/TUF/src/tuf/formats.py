@@ -174,6 +174,21 @@ FILEDICT_SCHEMA = SCHEMA.DictOf(
   key_schema=RELPATH_SCHEMA,
   value_schema=FILEINFO_SCHEMA)
 
+# The deltas of a target, listed in the 'custom' field of its file
+# information.  The keys are the sha256 hashes of the old versions the
+# deltas apply to (see tuf.delta).
+DELTADICT_SCHEMA = SCHEMA.DictOf(
+  key_schema=HASH_SCHEMA,
+  value_schema=FILEINFO_SCHEMA)
+
+# The chunk hashes of a target, listed in the 'custom' field of its file
+# information (see tuf.chunks).
+CHUNKINFO_SCHEMA = SCHEMA.Object(
+  object_name='chunkinfo',
+  size=LENGTH_SCHEMA,
+  algorithm=NAME_SCHEMA,
+  root=HASH_SCHEMA)
+
 # A dict holding a target file.
 TARGETFILE_SCHEMA = SCHEMA.Object(
   object_name='targetfile',
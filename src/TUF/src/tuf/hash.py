@@ -24,8 +24,13 @@
 """
 
 
+import mmap
+import os
+import threading
+
 # Import tuf Exceptions.
 import tuf
+import tuf.conf
 
 # Import tuf logger to log warning messages.
 import logging
@@ -74,6 +79,10 @@ if not _supported_libraries:
 _DEFAULT_HASH_ALGORITHM = 'sha256'
 _DEFAULT_HASH_LIBRARY = 'hashlib'
 
+# The number of bytes files are hashed in at a time.  hashlib releases the
+# GIL while it hashes large chunks, so files can be hashed in threads.
+_CHUNK_SIZE = 1048576
+
 
 
 
@@ -103,6 +112,9 @@ def digest(algorithm=_DEFAULT_HASH_ALGORITHM,
     # Added hash routines by this module.
     digest_object = tuf.hash.digest_fileobject(file_object)
     digest_object = tuf.hash.digest_filename(filename)
+    digest_objects = tuf.hash.multi_digest_filename(filename, ['sha256',
+                                                               'sha512'])
+    hexdigests = tuf.hash.digest_filenames(filenames, ['sha256'])
   
   <Arguments>
     algorithm:
@@ -195,26 +207,12 @@ def digest_fileobject(file_object, algorithm=_DEFAULT_HASH_ALGORITHM,
 
   """
 
-  # Digest object returned whose hash will be updated using 'file_object'.
-  # digest() raises:
+  # multi_digest_fileobject() raises:
   # tuf.UnsupportedAlgorithmError
   # tuf.Error
-  digest_object = digest(algorithm, hash_library)
-
-  # Defensively seek to beginning, as there's no case where we don't
-  # intend to start from the beginning of the file.
-  file_object.seek(0)
-
-  # Read the contents of the file object in at most 4096-byte chunks.
-  # Update the hash with the data read from each chunk and return after
-  # the entire file is processed. 
-  while True:
-    chunksize = 4096
-    data = file_object.read(chunksize)
-    if not data:
-      break
-    digest_object.update(data_to_string(data))
-  return digest_object
+  digest_objects = multi_digest_fileobject(file_object, [algorithm],
+                                           hash_library)
+  return digest_objects[algorithm]
 
 
 
@@ -243,7 +241,7 @@ def digest_filename(filename, algorithm=_DEFAULT_HASH_ALGORITHM,
     tuf.Error 
 
   <Side Effects>
-    Calls tuf.hash.digest_fileobject() after opening 'filename'.
+    Calls tuf.hash.multi_digest_filename(), which opens 'filename'.
     File closed before returning.
 
   <Returns>
@@ -252,17 +250,219 @@ def digest_filename(filename, algorithm=_DEFAULT_HASH_ALGORITHM,
 
   """
 
-  # Open 'filename' in read+binary mode.
-  file_object = open(filename, 'rb')
-  
-  # Create digest_object and update its hash data from file_object.
-  # digest_fileobject() raises:
+  # Create digest_object and update its hash data from the file.
+  # multi_digest_filename() raises:
   # tuf.UnsupportedAlgorithmError
   # tuf.Error
-  digest_object = digest_fileobject(file_object, algorithm, hash_library)
-  
-  file_object.close()
-  return digest_object
+  digest_objects = multi_digest_filename(filename, [algorithm], hash_library)
+  return digest_objects[algorithm]
+
+
+
+
+
+def multi_digest_fileobject(file_object, algorithms=[_DEFAULT_HASH_ALGORITHM],
+                            hash_library=_DEFAULT_HASH_LIBRARY):
+  """
+  <Purpose>
+    Generate a digest object for each of 'algorithms', updated with the
+    contents of 'file_object' in a single pass over it.
+
+  <Arguments>
+    file_object:
+      File object whose contents will be hashed, from its beginning.
+
+    algorithms:
+      A list of hash algorithms (e.g., ['sha256', 'sha512']).
+
+    hash_library:
+      The library providing the hash algorithms 
+      (e.g., pycrypto, hashlib).
+
+  <Exceptions>
+    tuf.UnsupportedAlgorithmError
+    tuf.Error
+
+  <Side Effects>
+    Calls tuf.hash.digest() to create the digest objects.
+
+  <Returns>
+    A dictionary of the digest objects by algorithm.
+
+  """
+
+  # digest() raises:
+  # tuf.UnsupportedAlgorithmError
+  # tuf.Error
+  digest_objects = {}
+  for algorithm in algorithms:
+    digest_objects[algorithm] = digest(algorithm, hash_library)
+
+  # Defensively seek to beginning, as there's no case where we don't
+  # intend to start from the beginning of the file.
+  file_object.seek(0)
+
+  while True:
+    data = file_object.read(_CHUNK_SIZE)
+    if not data:
+      break
+    if not isinstance(data, str):
+      data = data_to_string(data)
+    for digest_object in digest_objects.values():
+      digest_object.update(data)
+
+  return digest_objects
+
+
+
+
+
+def multi_digest_filename(filename, algorithms=[_DEFAULT_HASH_ALGORITHM],
+                          hash_library=_DEFAULT_HASH_LIBRARY):
+  """
+  <Purpose>
+    Generate a digest object for each of 'algorithms', updated with the
+    contents of 'filename' in a single pass over it.  The file is memory
+    mapped, so it is hashed without being copied through file buffers.
+
+  <Arguments>
+    filename:
+      The file to hash.
+
+    algorithms:
+      A list of hash algorithms (e.g., ['sha256', 'sha512']).
+
+    hash_library:
+      The library providing the hash algorithms 
+      (e.g., pycrypto, hashlib).
+
+  <Exceptions>
+    tuf.UnsupportedAlgorithmError
+    tuf.Error
+    IOError, if the file cannot be read.
+
+  <Side Effects>
+    The file is read.
+
+  <Returns>
+    A dictionary of the digest objects by algorithm.
+
+  """
+
+  file_object = open(filename, 'rb')
+  try:
+    # Empty files cannot be mapped, and some files (e.g., on special
+    # filesystems) cannot be mapped at all.
+    try:
+      mapped_file = mmap.mmap(file_object.fileno(), 0,
+                              access=mmap.ACCESS_READ)
+    except (mmap.error, ValueError, EnvironmentError):
+      return multi_digest_fileobject(file_object, algorithms, hash_library)
+
+    try:
+      digest_objects = {}
+      for algorithm in algorithms:
+        digest_objects[algorithm] = digest(algorithm, hash_library)
+
+      for offset in xrange(0, len(mapped_file), _CHUNK_SIZE):
+        data = mapped_file[offset:offset+_CHUNK_SIZE]
+        for digest_object in digest_objects.values():
+          digest_object.update(data)
+    finally:
+      mapped_file.close()
+  finally:
+    file_object.close()
+
+  return digest_objects
+
+
+
+
+
+def digest_filenames(filenames, algorithms=[_DEFAULT_HASH_ALGORITHM],
+                     hash_library=_DEFAULT_HASH_LIBRARY, worker_count=None):
+  """
+  <Purpose>
+    Hash many files at once.  The files are hashed by a pool of threads
+    with multi_digest_filename(), each file in a single pass.
+
+  <Arguments>
+    filenames:
+      A list of the files to hash.
+
+    algorithms:
+      A list of hash algorithms (e.g., ['sha256', 'sha512']).
+
+    hash_library:
+      The library providing the hash algorithms 
+      (e.g., pycrypto, hashlib).
+
+    worker_count:
+      The number of files hashed at the same time.  Defaults to
+      'tuf.conf.hash_worker_count'.
+
+  <Exceptions>
+    tuf.UnsupportedAlgorithmError
+    tuf.Error
+
+  <Side Effects>
+    The files are read.
+
+  <Returns>
+    A dictionary that maps each filename to a dictionary of its hexdigests
+    by algorithm, or to None if the file cannot be read.
+
+  """
+
+  # Raise 'tuf.UnsupportedAlgorithmError' here, not in the threads.
+  for algorithm in algorithms:
+    digest(algorithm, hash_library)
+
+  if worker_count is None:
+    worker_count = tuf.conf.hash_worker_count
+
+  hexdigests = {}
+  pending_filenames = list(filenames)
+  lock = threading.Lock()
+
+  def hash_files():
+    while True:
+      lock.acquire()
+      try:
+        if not pending_filenames:
+          return
+        filename = pending_filenames.pop()
+      finally:
+        lock.release()
+
+      try:
+        digest_objects = multi_digest_filename(filename, algorithms,
+                                               hash_library)
+      except EnvironmentError, e:
+        logger.debug('Unable to hash '+repr(filename)+': '+str(e))
+        hexdigests[filename] = None
+        continue
+
+      file_hexdigests = {}
+      for algorithm, digest_object in digest_objects.items():
+        file_hexdigests[algorithm] = digest_object.hexdigest()
+      hexdigests[filename] = file_hexdigests
+
+  worker_count = max(1, min(worker_count, len(pending_filenames)))
+  if worker_count == 1:
+    hash_files()
+    return hexdigests
+
+  workers = []
+  for index in range(worker_count):
+    worker = threading.Thread(target=hash_files)
+    worker.setDaemon(True)
+    worker.start()
+    workers.append(worker)
+  for worker in workers:
+    worker.join()
+
+  return hexdigests
 
 
 
@@ -0,0 +1,308 @@
+"""
+<Program Name>
+  hashcache.py
+
+<Started>
+  October 18, 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Remember the hashes of local files, so that checking whether a large
+  target changed does not read it again.  A hash is reused as long as the
+  path, size, modification time and inode of the file are the ones it was
+  computed for.
+
+  The cache is kept in the file 'tuf.conf.hash_cache_filename' and written
+  by save().  Setting 'tuf.conf.hash_cache_strict' forces the hashes to be
+  computed again, e.g. when the modification times of the files cannot be
+  trusted.
+
+"""
+
+import os
+import time
+import threading
+import logging
+
+import tuf
+import tuf.conf
+import tuf.hash
+import tuf.util
+
+# See 'log.py' to learn how logging is handled in TUF.
+logger = logging.getLogger('tuf.hashcache')
+
+# The name of the cache file under 'tuf.conf.repository_directory', if
+# 'tuf.conf.hash_cache_filename' is not set.
+DEFAULT_CACHE_FILENAME = 'hash_cache.txt'
+
+# Files modified less than this many seconds ago are not cached, since they
+# can be modified again without changing their modification time on
+# filesystems with a coarse timestamp resolution.
+_RACY_INTERVAL = 2
+
+_CACHE_VERSION = 1
+
+# The cached files by absolute path, each a dictionary of their 'size',
+# 'mtime', 'inode' and 'hashes' by algorithm.
+_cache = {}
+_cache_filename = None
+_modified = False
+_lock = threading.Lock()
+
+
+
+
+
+def get_hexdigest(filename, algorithm='sha256', strict=None):
+  """
+  <Purpose>
+    Get the hash of a file, from the cache if the file did not change since
+    the hash was computed.
+
+  <Arguments>
+    filename:
+      The file to hash.
+
+    algorithm:
+      The hash algorithm (e.g., md5, sha1, sha256).
+
+    strict:
+      If True, the hash is computed again regardless of the cache.  Defaults
+      to 'tuf.conf.hash_cache_strict'.
+
+  <Exceptions>
+    IOError, if the file cannot be read.
+
+    tuf.UnsupportedAlgorithmError, if 'algorithm' is not supported.
+
+  <Side Effects>
+    The file may be read, and the cache updated in memory.
+
+  <Returns>
+    The hexdigest of the file.
+
+  """
+
+  hexdigests = get_hexdigests({filename: [algorithm]}, strict)[filename]
+  if hexdigests is None:
+    raise IOError('Unable to read '+repr(filename)+'.')
+
+  return hexdigests[algorithm]
+
+
+
+
+
+def get_hexdigests(filename_algorithms, strict=None):
+  """
+  <Purpose>
+    Get the hashes of many files, from the cache for the files that did not
+    change since their hashes were computed.  The other files are hashed
+    concurrently, each in a single pass (see tuf.hash.digest_filenames()).
+
+  <Arguments>
+    filename_algorithms:
+      A dictionary that maps each file to hash to the list of its hash
+      algorithms needed (e.g., {'targets/file1.txt': ['sha256']}).
+
+    strict:
+      If True, the hashes are computed again regardless of the cache.
+      Defaults to 'tuf.conf.hash_cache_strict'.
+
+  <Exceptions>
+    tuf.UnsupportedAlgorithmError, if an algorithm is not supported.
+
+  <Side Effects>
+    The files may be read, and the cache updated in memory.
+
+  <Returns>
+    A dictionary that maps each file to a dictionary of its hexdigests by
+    algorithm, or to None if the file cannot be read.
+
+  """
+
+  if strict is None:
+    strict = tuf.conf.hash_cache_strict
+
+  hexdigests = {}
+  # The files to hash, grouped by the algorithms needed.
+  uncached_files = {}
+
+  _lock.acquire()
+  try:
+    _load()
+    for filename, algorithms in filename_algorithms.items():
+      filepath = os.path.abspath(filename)
+      try:
+        file_stat = os.stat(filepath)
+      except OSError:
+        hexdigests[filename] = None
+        continue
+
+      entry = _cache.get(filepath)
+      if not strict and entry is not None and _matches(entry, file_stat):
+        cached_hexdigests = {}
+        for algorithm in algorithms:
+          if algorithm not in entry['hashes']:
+            break
+          cached_hexdigests[algorithm] = entry['hashes'][algorithm]
+        else:
+          hexdigests[filename] = cached_hexdigests
+          continue
+
+      algorithms = tuple(sorted(set(algorithms)))
+      uncached_files.setdefault(algorithms, []).append((filename, filepath,
+                                                        file_stat))
+  finally:
+    _lock.release()
+
+  for algorithms, files in uncached_files.items():
+    filepaths = [filepath for filename, filepath, file_stat in files]
+    computed_hexdigests = tuf.hash.digest_filenames(filepaths,
+                                                    list(algorithms))
+    for filename, filepath, file_stat in files:
+      hexdigests[filename] = computed_hexdigests[filepath]
+      if hexdigests[filename] is not None:
+        _add(filepath, file_stat, hexdigests[filename])
+
+  return hexdigests
+
+
+
+
+
+def save():
+  """
+  <Purpose>
+    Write the cache to its file, if it changed.  Files that no longer exist
+    are dropped from it.
+
+  <Side Effects>
+    The cache file is replaced.
+
+  <Returns>
+    None.
+
+  """
+
+  global _modified
+
+  _lock.acquire()
+  try:
+    if not _modified or _cache_filename is None:
+      return
+
+    for filepath in _cache.keys():
+      if not os.path.exists(filepath):
+        del _cache[filepath]
+
+    json = tuf.util.import_json()
+    temp_filename = _cache_filename+'.'+str(os.getpid())+'.tmp'
+    try:
+      file_object = open(temp_filename, 'w')
+      try:
+        json.dump({'version': _CACHE_VERSION, 'files': _cache}, file_object)
+      finally:
+        file_object.close()
+      if os.path.exists(_cache_filename) and os.name == 'nt':
+        os.remove(_cache_filename)
+      os.rename(temp_filename, _cache_filename)
+      _modified = False
+    except (IOError, OSError), e:
+      logger.warn('Unable to save the hash cache to '+repr(_cache_filename)+
+                  ': '+str(e))
+  finally:
+    _lock.release()
+
+
+
+
+
+def _get_cache_filename():
+  if tuf.conf.hash_cache_filename is not None:
+    return tuf.conf.hash_cache_filename
+  if tuf.conf.repository_directory is not None:
+    return os.path.join(tuf.conf.repository_directory, DEFAULT_CACHE_FILENAME)
+  return None
+
+
+
+
+
+def _load():
+  """
+  <Purpose>
+    (Re)load the cache if the configured cache file changed.  The caller
+    holds '_lock'.
+  """
+
+  global _cache, _cache_filename, _modified
+
+  cache_filename = _get_cache_filename()
+  if cache_filename == _cache_filename:
+    return
+
+  _cache = {}
+  _cache_filename = cache_filename
+  _modified = False
+  if cache_filename is None or not os.path.exists(cache_filename):
+    return
+
+  try:
+    cache = tuf.util.load_json_file(cache_filename)
+    if cache.get('version') == _CACHE_VERSION:
+      _cache = cache['files']
+  except (tuf.Error, IOError, ValueError, AttributeError, KeyError), e:
+    logger.warn('Ignoring the hash cache '+repr(cache_filename)+': '+str(e))
+
+
+
+
+
+def _add(filepath, file_stat, hexdigests):
+  """
+  <Purpose>
+    Cache the hashes of a file computed after it was stat'ed as 'file_stat',
+    unless the file changed while it was read or was modified too recently.
+  """
+
+  global _modified
+
+  try:
+    current_stat = os.stat(filepath)
+  except OSError:
+    return
+  if time.time() - file_stat.st_mtime < _RACY_INTERVAL or \
+     not _matches(_make_entry(current_stat), file_stat):
+    return
+
+  _lock.acquire()
+  try:
+    entry = _cache.get(filepath)
+    if entry is None or not _matches(entry, file_stat):
+      entry = _make_entry(file_stat)
+      _cache[filepath] = entry
+    entry['hashes'].update(hexdigests)
+    _modified = True
+  finally:
+    _lock.release()
+
+
+
+
+
+def _make_entry(file_stat):
+  return {'size': file_stat.st_size, 'mtime': file_stat.st_mtime,
+          'inode': file_stat.st_ino, 'hashes': {}}
+
+
+
+
+
+def _matches(entry, file_stat):
+  return entry['size'] == file_stat.st_size and \
+         entry['mtime'] == file_stat.st_mtime and \
+         entry['inode'] == file_stat.st_ino
@@ -34,7 +34,6 @@
 """
 
 import os
-import shutil
 import logging
 
 
@@ -42,6 +41,8 @@ import tuf.repo.signerlib
 import tuf.repo.keystore
 import tuf.download
 import tuf.formats
+import tuf.hash
+import tuf.keydb
 import tuf.roledb
 import tuf.util
 import tuf.sig
@@ -53,6 +54,14 @@ logger = logging.getLogger('tuf')
 MAX_ATTEMPTS = 3
 mirrorlist_dict = {}
 
+# The 'ETag' and 'Last-Modified' validators of the last mirrorlist
+# downloaded from each url, used to make the next download conditional.
+_mirrorlist_validators = {}
+
+# The digest of the root.txt the key and role databases were last built
+# from by update_mirrorlist().
+_loaded_root_digest = None
+
 
 def _prompt(message, result_type=str):
   """
@@ -345,7 +354,11 @@ def update_mirrorlist(url, metadata_directory):
   """
   <Purpose>
     Download and install a fresh mirrorlist metadata file from
-    the server.
+    the server.  The download is conditional: if the server reports
+    that the mirrorlist has not been modified since the last update, or
+    the downloaded file is identical to the installed one, nothing else
+    is done.  The key and role databases are only rebuilt if root.txt
+    changed since they were last built.
 
   <Arguments>
     url:
@@ -358,10 +371,18 @@ def update_mirrorlist(url, metadata_directory):
     tuf.FormatError
       If 'url' has an improper format.
 
-    tuf.DownloadError
-      If downloading mirrorlist metadata fails.
+    tuf.RepositoryError
+      If the signature of the downloaded mirrorlist cannot be verified.
+
+  <Side Effects>
+    The key and role databases may be rebuilt from root.txt.
+
+  <Returns>
+    True if a new mirrorlist was installed, False otherwise.
 
   """
+  
+  global _loaded_root_digest
 
   # Verify correct format of 'url'.
   tuf.formats.URL_SCHEMA.check_match(url)
@@ -370,33 +391,63 @@ def update_mirrorlist(url, metadata_directory):
   tuf.formats.PATH_SCHEMA.check_match(metadata_directory)
 
   current_dir = os.path.join(metadata_directory, 'current')
-  previous_dir = os.path.join(metadata_directory, 'previous')
   root_filepath = os.path.join(current_dir, 'root.txt')
   mirrorlist_current_filepath = os.path.join(current_dir, 'mirrorlist.txt')
-  mirrorlist_previous_filepath = os.path.join(current_dir, 'mirrorlist.txt')
-  shutil.move(mirrorlist_current_filepath, mirrorlist_previous_filepath)
 
-  # Reference to tuf.download.download_url_to_tempfileobj function.
-  download_mirrorlist = tuf.download.download_url_to_tempfileobj
+  # Only make the request conditional if we still have the mirrorlist the
+  # validators belong to.
+  validators = None
+  if os.path.exists(mirrorlist_current_filepath):
+    validators = _mirrorlist_validators.get(url)
+
+  # Reference to tuf.download.download_url_to_tempfileobj_if_modified function.
+  download_mirrorlist = tuf.download.download_url_to_tempfileobj_if_modified
 
   try:
-    mirrorlist_tempfileobj = download_mirrorlist(url)
+    mirrorlist_tempfileobj, validators = download_mirrorlist(url, validators)
   except tuf.DownloadError, e:
     logger.warn('Mirrorlist metadata file download failed.')
-    return
-
-  mirrorlist_signable = tuf.util.load_json_string(mirrorlist_tempfileobj.read()) 
+    return False
+
+  if mirrorlist_tempfileobj is None:
+    logger.debug('Mirrorlist metadata file has not been modified.')
+    return False
+
+  mirrorlist_data = mirrorlist_tempfileobj.read()
+
+  # Servers that do not send validators send the whole file every time.
+  # There is nothing to do if it did not change.
+  if os.path.exists(mirrorlist_current_filepath):
+    current_mirrorlist = open(mirrorlist_current_filepath, 'rb')
+    try:
+      unchanged = current_mirrorlist.read() == mirrorlist_data
+    finally:
+      current_mirrorlist.close()
+
+    if unchanged:
+      logger.debug('Mirrorlist metadata file has not changed.')
+      mirrorlist_tempfileobj.close_temp_file()
+      _mirrorlist_validators[url] = validators
+      return False
+
+  mirrorlist_signable = tuf.util.load_json_string(mirrorlist_data) 
   tuf.formats.check_signable_object_format(mirrorlist_signable)
 
   # In order to verify 'mirrorlist_signable' signature, the roledb
   # dictionary 'roledb_dict' has to have mirrorlist role info loaded.
   # All this, is done to retrieve mirrorlist threshold.
   # Get mirrorlist.txt file info and generate mirrorlist.
-  
-  root_signable = tuf.util.load_json_file(root_filepath)
+  # Rebuilding the databases throws away any delegated roles loaded
+  # since, so it is only done if root.txt changed.
+  root_digest = tuf.hash.digest_filename(root_filepath).hexdigest()
+
+  if root_digest != _loaded_root_digest or \
+     not tuf.roledb.role_exists('mirrorlist'):
+    root_signable = tuf.util.load_json_file(root_filepath)
 
-  tuf.keydb.create_keydb_from_root_metadata(root_signable['signed'])
-  tuf.roledb.create_roledb_from_root_metadata(root_signable['signed'])
+    tuf.keydb.create_keydb_from_root_metadata(root_signable['signed'])
+    tuf.roledb.create_roledb_from_root_metadata(root_signable['signed'])
+    _loaded_root_digest = root_digest
 
   keyid = mirrorlist_signable['signatures'][0]['keyid']
   mirrorlist_roleinfo = {}
@@ -404,6 +455,7 @@ def update_mirrorlist(url, metadata_directory):
   mirrorlist_roleinfo['threshold'] = 1
 
   # Verify 'mirrorlist_signable' signature.
+  sig_verify = False
   try:
     sig_verify = tuf.sig.verify(mirrorlist_signable, 'mirrorlist')
   except (tuf.UnknownRoleError, tuf.FormatError, tuf.Error), e:
@@ -419,7 +471,11 @@ def update_mirrorlist(url, metadata_directory):
   # Raise an exception if a valid metadata signable could not be downloaded
   # from any of the mirrors.
   if mirrorlist_signable is None:
+    mirrorlist_tempfileobj.close_temp_file()
     raise tuf.RepositoryError('Unable to update \'mirrorlist.txt\'.')
 
 
   mirrorlist_tempfileobj.move(mirrorlist_current_filepath)
+  _mirrorlist_validators[url] = validators
+
+  return True
@@ -14,17 +14,271 @@
 
 <Purpose>
   This module extracts a list of mirror urls corresponding to the file type and
-  the location of the file with respect to the base url.
+  the location of the file with respect to the base url.  The urls are ordered
+  by the scores 'tuf.download' records for the mirrors in 'scoreboard', so the
+  fastest and most reliable mirror is tried first.
 
 """
 
 import os
+import random
+import threading
 import urllib
+import urlparse
 
+import tuf.conf
 import tuf.util
 import tuf.formats
 
 
+# The weight of a new sample in the moving averages of the scoreboard.
+SMOOTHING_FACTOR = 0.3
+
+# Downloads smaller than this many bytes are too short to measure the
+# throughput of a mirror.
+MIN_THROUGHPUT_SAMPLE = 16384
+
+# The size of the download a score estimates the time of.
+REFERENCE_DOWNLOAD_SIZE = 262144
+
+# How much an error rate of 1 multiplies the score of a mirror.
+ERROR_PENALTY = 10.0
+
+
+
+
+
+class MirrorScoreboard(object):
+  """
+  <Purpose>
+    Keep moving averages of the latency, throughput and error rate of every
+    mirror and rank mirrors by them.  Mirrors are identified by the scheme,
+    host and port of their urls, so the metadata and target downloads of a
+    mirror count towards the same score.
+
+    A score estimates the seconds needed to download
+    REFERENCE_DOWNLOAD_SIZE bytes from the mirror, inflated by its error
+    rate.  Lower is better.  Mirrors without any recorded download have a
+    score of 0, so they are tried first until they have one.
+
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    # mirror key -> {'latency':, 'throughput':, 'error_rate':}
+    self._stats = {}
+
+
+
+  def record_success(self, url, latency, length, duration):
+    """
+    <Purpose>
+      Record a successful download.
+
+    <Arguments>
+      url:
+        The url the file was downloaded from.
+
+      latency:
+        The seconds until the response headers were received.
+
+      length:
+        The number of bytes downloaded.
+
+      duration:
+        The seconds the whole download took.
+
+    <Returns>
+      None.
+
+    """
+
+    throughput = None
+    if length >= MIN_THROUGHPUT_SAMPLE and duration > 0:
+      throughput = length / duration
+
+    self._record(url, latency, throughput, 0.0)
+
+
+
+  def record_failure(self, url):
+    """
+    <Purpose>
+      Record a download that failed, e.g. because the mirror could not be
+      reached or served a file with a bad hash.
+
+    <Arguments>
+      url:
+        The url of the failed download.
+
+    <Returns>
+      None.
+
+    """
+
+    self._record(url, None, None, 1.0)
+
+
+
+  def _record(self, url, latency, throughput, error):
+    key = mirror_key(url)
+
+    self._lock.acquire()
+    try:
+      stats = self._stats.setdefault(key, {'latency': None, 'throughput': None,
+                                           'error_rate': None})
+      for name, sample in (('latency', latency), ('throughput', throughput),
+                           ('error_rate', error)):
+        if sample is None:
+          continue
+        if stats[name] is None:
+          stats[name] = sample
+        else:
+          stats[name] += SMOOTHING_FACTOR * (sample - stats[name])
+    finally:
+      self._lock.release()
+
+
+
+  def score(self, url, weight=1.0):
+    """
+    <Purpose>
+      Get the score of the mirror of 'url'.
+
+    <Arguments>
+      url:
+        A url of the mirror.
+
+      weight:
+        A positive weight, the score is divided by it.
+
+    <Returns>
+      The score, lower is better.
+
+    """
+
+    self._lock.acquire()
+    try:
+      stats = self._stats.get(mirror_key(url))
+      if stats is None:
+        return 0.0
+      stats = dict(stats)
+    finally:
+      self._lock.release()
+
+    seconds = stats['latency'] or 0.0
+    if stats['throughput']:
+      seconds += REFERENCE_DOWNLOAD_SIZE / stats['throughput']
+
+    score = seconds * (1.0 + ERROR_PENALTY * (stats['error_rate'] or 0.0))
+
+    # A mirror that only ever failed has no latency; rank it by its
+    # error rate alone.
+    if seconds == 0.0:
+      score = ERROR_PENALTY * (stats['error_rate'] or 0.0)
+
+    return score / weight
+
+
+
+  def rank(self, urls_and_weights):
+    """
+    <Purpose>
+      Order urls by the score of their mirrors, best first.  Mirrors with
+      the same score keep their order.  Every so often (see
+      'tuf.conf.mirror_exploration_rate') one of the other mirrors is
+      moved to the front so its score stays current.
+
+    <Arguments>
+      urls_and_weights:
+        A list of (url, weight) tuples.
+
+    <Returns>
+      The list of urls.
+
+    """
+
+    scored_urls = []
+    for index, (url, weight) in enumerate(urls_and_weights):
+      scored_urls.append((self.score(url, weight), index, url))
+    scored_urls.sort()
+
+    urls = [url for score, index, url in scored_urls]
+
+    if len(urls) > 1 and random.random() < tuf.conf.mirror_exploration_rate:
+      urls.insert(0, urls.pop(random.randint(1, len(urls) - 1)))
+
+    return urls
+
+
+
+  def clear(self):
+    """
+    <Purpose>
+      Forget all the recorded downloads.
+
+    <Returns>
+      None.
+
+    """
+
+    self._lock.acquire()
+    try:
+      self._stats = {}
+    finally:
+      self._lock.release()
+
+
+
+
+
+def mirror_key(url):
+  """
+  <Purpose>
+    Get the part of a url that identifies the mirror it belongs to.
+
+  <Returns>
+    The 'scheme://host:port' string of the url.
+
+  """
+
+  parsed_url = urlparse.urlparse(url)
+  return parsed_url.scheme.lower()+'://'+parsed_url.netloc.lower()
+
+
+
+
+
+def _mirror_weight(mirror_info):
+  """
+  <Purpose>
+    Get the weight of a mirror from the optional 'custom' field of its
+    MIRROR_SCHEMA, e.g. {'custom': {'weight': 2}}.  Mirrors with a higher
+    weight are preferred.
+
+  <Returns>
+    The weight, 1.0 if none or an invalid one is given.
+
+  """
+
+  try:
+    weight = float(mirror_info.get('custom', {}).get('weight', 1.0))
+  except (TypeError, ValueError, AttributeError):
+    return 1.0
+
+  if weight <= 0:
+    return 1.0
+  return weight
+
+
+
+
+
+# The scoreboard shared by all downloads.
+scoreboard = MirrorScoreboard()
+
+
+
 def get_list_of_mirrors(file_type, file_path, mirrors_dict):
   """
   <Purpose>
@@ -54,15 +308,16 @@ def get_list_of_mirrors(file_type, file_path, mirrors_dict):
      'confined_target_paths': ['targets/release1', ...]
      'custom': {...}}
 
-    The 'custom' field is optional.
+    The 'custom' field is optional.  A 'weight' in it scales the mirror's
+    score, e.g. 'custom': {'weight': 2} prefers the mirror twice as much.
 
   <Exceptions>
     tuf.Error on unknown file type.
     tuf.FormatError on bad argument.
 
   <Return>
-    List of mirror urls corresponding to the file_type and file_path.  If no
-    match is found, empty list is returned.
+    List of mirror urls corresponding to the file_type and file_path, best
+    ranked mirror first.  If no match is found, empty list is returned.
 
   """
 
@@ -92,6 +347,6 @@ def get_list_of_mirrors(file_type, file_path, mirrors_dict):
     # side.
     file_path = urllib.quote(file_path)
     url = base+'/'+file_path
-    list_of_mirrors.append(url)
+    list_of_mirrors.append((url, _mirror_weight(mirror_info)))
 
-  return list_of_mirrors
+  return scoreboard.rank(list_of_mirrors)
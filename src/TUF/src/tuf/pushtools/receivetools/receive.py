@@ -336,6 +336,18 @@ def _process_copied_push(pushpath):
     logger.info("Number of targets specified: %s" %
                 len(targets_json['signed']['targets'].keys()))
 
+    # Hash all the pushed targets at once, each file in a single pass with
+    # all the algorithms its metadata lists.
+    targets_by_algorithms = {}
+    for targetrelpath, targetinfo in targets_json['signed']['targets'].items():
+        targetpath = os.path.join(pushpath, 'targets', targetrelpath)
+        algorithms = tuple(sorted(targetinfo['hashes'].keys()))
+        targets_by_algorithms.setdefault(algorithms, []).append(targetpath)
+    actualhashes = {}
+    for algorithms, targetpaths in targets_by_algorithms.items():
+        actualhashes.update(tuf.hash.digest_filenames(targetpaths,
+                                                      list(algorithms)))
+
     for targetrelpath, targetinfo in targets_json['signed']['targets'].items():
         targetpath = os.path.join(pushpath, 'targets', targetrelpath)
 
@@ -360,12 +372,14 @@ def _process_copied_push(pushpath):
             raise tuf.Error('Empty hashes dictionary.')
         else:
             logger.debug('%s hashes to check.' % hashcount)
+        if actualhashes[targetpath] is None:
+            raise tuf.Error('The target file %s could not be read.' %
+                            targetrelpath)
         for hashalg, hashval in targetinfo['hashes'].items():
-            d_obj = tuf.hash.Digest(hashalg)
-            d_obj.update_filename(targetpath)
-            if d_obj.format() != hashval:
+            actualhash = actualhashes[targetpath][hashalg]
+            if actualhash != hashval:
                 raise tuf.Error('%s hash does not match: was %s, expected %s' %
-                                (hashalg, d_obj.format(), hashval))
+                                (hashalg, actualhash, hashval))
             else:
                 logger.debug('%s hash of target %s is correct (%s).' %
                              (hashalg, targetpath, hashval))
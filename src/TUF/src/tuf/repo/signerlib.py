@@ -23,7 +23,11 @@ import os
 import ConfigParser
 import logging
 
+import tuf.chunks
+import tuf.delta
 import tuf.formats
+import tuf.hash
+import tuf.hashcache
 import tuf.rsa_key
 import tuf.repo.keystore
 import tuf.sig
@@ -314,7 +318,8 @@ def generate_root_metadata(config_filepath):
 
 
 
-def generate_targets_metadata(repository_directory, target_files):
+def generate_targets_metadata(repository_directory, target_files,
+                              chunk_size=None):
   """
   <Purpose>
     Generate the targets metadata object. The targets must exist at the same
@@ -335,6 +340,12 @@ def generate_targets_metadata(repository_directory, target_files):
       The directory (absolute path) containing the metadata and target
       directories.
 
+    chunk_size:
+      If set, targets larger than 'chunk_size' bytes are also hashed in
+      chunks of that size, so clients can verify them as they download them
+      (see tuf.chunks), e.g. tuf.chunks.DEFAULT_CHUNK_SIZE.  Chunking reads
+      each large target again on every call, so it is off by default.
+
   <Exceptions>
     tuf.FormatError, if an error occurred trying to generate the targets
     metadata object.
@@ -343,6 +354,8 @@ def generate_targets_metadata(repository_directory, target_files):
 
   <Side Effects>
     The target files are read and file information generated about them.
+    If 'chunk_size' is set, the chunk hashes of the large targets are
+    written under the chunks directory of their targets directory.
 
   <Returns>
     A targets 'signable' object, conformant to 'tuf.formats.SIGNABLE_SCHEMA'.
@@ -353,22 +366,84 @@ def generate_targets_metadata(repository_directory, target_files):
   # Raise 'tuf.FormatError' if there is a mismatch.
   tuf.formats.PATHS_SCHEMA.check_match(target_files)
   tuf.formats.PATH_SCHEMA.check_match(repository_directory)
+  if chunk_size is not None:
+    tuf.formats.LENGTH_SCHEMA.check_match(chunk_size)
 
   filedict = {}
 
   repository_directory = check_directory(repository_directory)
 
+  # Hash all the target files at once.
+  target_paths = []
+  for target in target_files:
+    target_path = os.path.join(repository_directory, target)
+    if not os.path.isfile(target_path):
+      message = repr(target_path)+' could not be read.  Unable to generate '+\
+        'targets metadata.'
+      raise tuf.Error(message)
+    target_paths.append(target_path)
+  files_details = tuf.util.get_files_details(target_paths)
+
   # Generate the file info for all the target files listed in 'target_files'.
   for target in target_files:
     relative_targetpath = os.path.sep.join(target.split(os.path.sep)[1:])
     # Ex: 'targets/more_targets/somefile.txt' -> 'more_targets/somefile.txt'
     # i.e. 'targets/' is removed from 'target'.
     target_path = os.path.join(repository_directory, target)
-    if not os.path.exists(target_path):
-      message = repr(target_path)+' could not be read.  Unable to generate '+\
-        'targets metadata.'
-      raise tuf.Error(message)
-    filedict[relative_targetpath] = get_metadata_file_info(target_path)
+    filesize, filehashes = files_details[target_path]
+    fileinfo = tuf.formats.make_fileinfo(filesize, filehashes, None)
+    custom = {}
+
+    # List the deltas generated for older versions of the target, see
+    # generate_target_delta().  Deltas to an earlier version of the target
+    # can never be used again and are removed.
+    deltas_directory = os.path.join(repository_directory,
+                                    target.split(os.path.sep)[0],
+                                    tuf.delta.DELTAS_DIRECTORY,
+                                    relative_targetpath)
+    if os.path.isdir(deltas_directory):
+      deltas = {}
+      for delta_filename in os.listdir(deltas_directory):
+        if not delta_filename.endswith('.delta'):
+          continue
+        old_digest = delta_filename[:-len('.delta')]
+        delta_filepath = os.path.join(deltas_directory, delta_filename)
+        try:
+          target_digest = tuf.delta.get_delta_target_digest(delta_filepath)
+        except (IOError, tuf.Error), e:
+          logger.warn('Ignoring the delta '+repr(delta_filepath)+': '+str(e))
+          continue
+        if target_digest != filehashes.get(tuf.delta.DELTA_HASH_ALGORITHM):
+          logger.info('Removing the stale delta '+repr(delta_filepath)+'.')
+          os.remove(delta_filepath)
+          continue
+        deltas[old_digest] = get_metadata_file_info(delta_filepath)
+      if deltas:
+        tuf.formats.DELTADICT_SCHEMA.check_match(deltas)
+        custom['deltas'] = deltas
+
+    # Hash large targets in chunks, so that clients can drop a mirror that
+    # sends bad data as soon as they receive it.
+    if chunk_size and filesize > chunk_size:
+      chunk_hashes_relative_path = \
+        tuf.chunks.get_chunk_hashes_filepath(relative_targetpath)
+      chunk_hashes_filepath = os.path.join(repository_directory,
+                                           target.split(os.path.sep)[0],
+                                           *chunk_hashes_relative_path.split('/'))
+      chunk_hashes_directory = os.path.dirname(chunk_hashes_filepath)
+      if not os.path.isdir(chunk_hashes_directory):
+        os.makedirs(chunk_hashes_directory)
+      custom['chunks'] = tuf.chunks.generate_chunk_hashes(target_path,
+                                                          chunk_hashes_filepath,
+                                                          chunk_size)
+
+    if custom:
+      fileinfo['custom'] = custom
+
+    filedict[relative_targetpath] = fileinfo
+
+  # The targets are hashed again only if they changed since the last time.
+  tuf.hashcache.save()
 
   # Generate the targets metadata object.
   targets_metadata = tuf.formats.TargetsFile.make_metadata(filedict)
@@ -379,6 +454,85 @@ def generate_targets_metadata(repository_directory, target_files):
 
 
 
+def generate_target_delta(previous_target_filename, target_filename,
+                          targets_directory):
+  """
+  <Purpose>
+    Generate the binary delta that updates a previous version of a target
+    to its current version (see tuf.delta).  The delta is saved under the
+    deltas directory of 'targets_directory', where generate_targets_metadata()
+    finds it and lists it in the 'custom' field of the target's file
+    information.  Clients holding the previous version then download the
+    delta instead of the whole target.  The delta records the hash of the
+    version it rebuilds; generate_targets_metadata() removes it once the
+    target changes.
+
+  <Arguments>
+    previous_target_filename:
+      The previous version of the target, e.g. a copy kept before the
+      target was replaced.
+
+    target_filename:
+      The current version of the target, located in 'targets_directory'.
+
+    targets_directory:
+      The directory (absolute path) containing all the target files.
+
+  <Exceptions>
+    tuf.FormatError, if any of the arguments are improperly formatted.
+
+    tuf.Error, if the target is not in 'targets_directory' or a file does
+    not exist.
+
+  <Side Effects>
+    The delta file is written.
+
+  <Returns>
+    The path of the written delta file.
+
+  """
+
+  # Do the arguments have the correct format?
+  # Raise 'tuf.FormatError' if there is a mismatch.
+  tuf.formats.PATH_SCHEMA.check_match(previous_target_filename)
+  tuf.formats.PATH_SCHEMA.check_match(target_filename)
+  tuf.formats.PATH_SCHEMA.check_match(targets_directory)
+
+  targets_directory = check_directory(targets_directory)
+  target_filename = os.path.abspath(target_filename)
+
+  for filename in (previous_target_filename, target_filename):
+    if not os.path.isfile(filename):
+      raise tuf.Error(repr(filename)+' is not a file.')
+
+  if not target_filename.startswith(targets_directory + os.sep):
+    message = repr(target_filename)+' is not in '+repr(targets_directory)+'.'
+    raise tuf.Error(message)
+
+  relative_targetpath = target_filename[len(targets_directory)+1:]
+  relative_targetpath = relative_targetpath.replace(os.sep, '/')
+
+  digest_object = tuf.hash.digest_filename(previous_target_filename,
+                                  algorithm=tuf.delta.DELTA_HASH_ALGORITHM)
+  delta_relative_path = tuf.delta.get_delta_filepath(relative_targetpath,
+                                                digest_object.hexdigest())
+  delta_filename = os.path.join(targets_directory,
+                                *delta_relative_path.split('/'))
+
+  delta_directory = os.path.dirname(delta_filename)
+  if not os.path.isdir(delta_directory):
+    os.makedirs(delta_directory)
+
+  tuf.delta.generate_delta(previous_target_filename, target_filename,
+                           delta_filename)
+  logger.info('Generated delta '+repr(delta_filename)+'.')
+
+  return delta_filename
+
+
+
+
+
 def generate_release_metadata(metadata_directory):
   """
   <Purpose>
@@ -453,7 +607,7 @@ def generate_timestamp_metadata(release_filename, compressions=()):
       The required filename of the release metadata file.
 
     compressions:
-      Compression extensions (e.g., 'gz' and 'tgz').  If 'release.txt' is also
+      Compression extensions (e.g., 'gz', 'bz2' and 'xz').  If 'release.txt' is
       saved in compressed form, these compression extensions should be stored
       in 'compressions' so the compressed timestamp files can be added to the
       timestamp metadata object.
@@ -988,13 +1142,14 @@ def build_root_file(config_filepath, root_keyids, metadata_directory):
 
 
 
-def build_targets_file(targets_directory, targets_keyids, metadata_directory):
+def build_targets_file(targets_directory, targets_keyids, metadata_directory,
+                       chunk_size=None):
   """
   <Purpose>
     Build the targets metadata file using the signing keys in 'targets_keyids'.
     The generated metadata file is saved to 'metadata_directory'.  The target
     files located in 'targets_directory' will be tracked by the built targets
-    metadata.
+    metadata, along with the deltas generate_target_delta() saved for them.
 
   <Arguments>
     targets_directory:
@@ -1006,6 +1161,10 @@ def build_targets_file(targets_directory, targets_keyids, metadata_directory):
     metadata_directory:
       The metadata directory (absolute path) containing all the metadata files.
 
+    chunk_size:
+      The size of the chunks large targets are hashed in, or None to not
+      chunk them.  See generate_targets_metadata().
+
   <Exceptions>
     tuf.FormatError, if any of the arguments are improperly formatted.
 
@@ -1032,16 +1191,23 @@ def build_targets_file(targets_directory, targets_keyids, metadata_directory):
   repository_directory, junk = os.path.split(metadata_directory)
   repository_directory_length = len(repository_directory)
 
-  # Get the list of targets.
+  # Get the list of targets.  The deltas and chunk hashes are not targets of
+  # their own.
   targets = []
   for root, directories, files in os.walk(targets_directory):
+    if root == targets_directory:
+      for directory in [tuf.delta.DELTAS_DIRECTORY,
+                        tuf.chunks.CHUNKS_DIRECTORY]:
+        if directory in directories:
+          directories.remove(directory)
     for target_file in files:
       # Note: '+1' in the line below is there to remove '/'.
       filename = os.path.join(root, target_file)[repository_directory_length+1:]
       targets.append(filename)
 
   # Create the targets metadata object.
-  targets_metadata = generate_targets_metadata(repository_directory, targets)
+  targets_metadata = generate_targets_metadata(repository_directory, targets,
+                                               chunk_size)
 
   # Sign it.
   targets_filepath = os.path.join(metadata_directory, TARGETS_FILENAME)
@@ -0,0 +1,156 @@
+"""
+<Program>
+  test_chunks.py
+
+<Started>
+  October 18, 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Test chunks.py module.
+
+"""
+
+import tuf
+import tuf.chunks
+import tuf.download
+import tuf.util
+
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+
+class StubConnection(object):
+  """A connection that delivers 'data', like tuf.download's connections."""
+
+  def __init__(self, data):
+    self.data = data
+    self.position = 0
+
+  def info(self):
+    return {'Content-Length': str(len(self.data))}
+
+  def read(self, amount):
+    data = self.data[self.position:self.position+amount]
+    self.position = self.position + len(data)
+    return data
+
+  def close(self):
+    pass
+
+
+
+# Unit tests
+class TestChunks(unittest.TestCase):
+  def setUp(self):
+    self.temporary_directory = tempfile.mkdtemp()
+    randomizer = random.Random(0)
+    self.data = ''.join([chr(randomizer.randint(0, 255))
+                         for index in range(10000)])
+    self.chunk_size = 1024
+
+    self.target_filename = os.path.join(self.temporary_directory, 'target')
+    target_file = open(self.target_filename, 'wb')
+    target_file.write(self.data)
+    target_file.close()
+
+    self.chunk_hashes_filename = os.path.join(self.temporary_directory,
+                                              'target.chunks')
+    self.chunkinfo = tuf.chunks.generate_chunk_hashes(self.target_filename,
+                                                      self.chunk_hashes_filename,
+                                                      self.chunk_size)
+
+
+  def tearDown(self):
+    shutil.rmtree(self.temporary_directory)
+
+
+  def _load(self):
+    file_object = open(self.chunk_hashes_filename, 'rb')
+    try:
+      return tuf.chunks.load_chunk_hashes(file_object, self.chunkinfo,
+                                          len(self.data))
+    finally:
+      file_object.close()
+
+
+  def testGenerateChunkHashes(self):
+    self.assertEqual(os.path.getsize(self.chunk_hashes_filename),
+                     tuf.chunks.get_chunk_hashes_length(len(self.data),
+                                                        self.chunk_size))
+    chunk_hashes = self._load()
+    self.assertEqual(len(chunk_hashes.chunk_hashes), 10)
+    self.assertEqual(chunk_hashes.chunk_hashes[0],
+                     hashlib.sha256(self.data[:1024]).hexdigest())
+
+
+  def testMerkleRoot(self):
+    leaves = [hashlib.sha256(str(index)).hexdigest() for index in range(3)]
+    node = hashlib.sha256('\x01' + hashlib.sha256('0').digest() +
+                          hashlib.sha256('1').digest()).digest()
+    root = hashlib.sha256('\x01' + node + hashlib.sha256('2').digest())
+    self.assertEqual(tuf.chunks.get_merkle_root(leaves), root.hexdigest())
+    self.assertEqual(tuf.chunks.get_merkle_root(leaves[:1]), leaves[0])
+
+
+  def testBadChunkHashes(self):
+    self.chunkinfo['root'] = hashlib.sha256('other').hexdigest()
+    self.assertRaises(tuf.BadHashError, self._load)
+
+    self.chunkinfo['size'] = 2048
+    self.assertRaises(tuf.FormatError, self._load)
+
+
+  def testChunkVerifier(self):
+    chunk_hashes = self._load()
+
+    chunk_verifier = tuf.chunks.ChunkVerifier(chunk_hashes)
+    for offset in range(0, len(self.data), 1000):
+      chunk_verifier.update(self.data[offset:offset+1000])
+    chunk_verifier.finish()
+    self.assertEqual(chunk_verifier.verified_length, len(self.data))
+
+    # The verifier stops at the first bad chunk.
+    bad_data = self.data[:3000] + 'x' + self.data[3001:]
+    chunk_verifier = tuf.chunks.ChunkVerifier(chunk_hashes)
+    self.assertRaises(tuf.BadHashError, chunk_verifier.update, bad_data)
+    self.assertEqual(chunk_verifier.verified_length, 2048)
+
+
+  def testDownloadKeepsVerifiedChunks(self):
+    # A single read of the download covers several chunks, good ones
+    # followed by a bad one.  Only the good chunks are kept to resume from.
+    chunk_hashes = self._load()
+    bad_data = self.data[:3000] + 'x' + self.data[3001:]
+    partial_file = tuf.util.TempFile()
+    self.assertRaises(tuf.DownloadError,
+                      tuf.download._download_connection_to_tempfileobj,
+                      StubConnection(bad_data), 'http://localhost/target',
+                      None, len(self.data), partial_file,
+                      chunk_hashes=chunk_hashes)
+
+    partial_file.seek(0)
+    self.assertEqual(partial_file.read(), self.data[:2048])
+    partial_file.close_temp_file()
+
+
+  def testCheckRange(self):
+    chunk_hashes = self._load()
+    chunk_hashes.check_range(2048, self.data[2048:4096])
+    chunk_hashes.check_range(8192, self.data[8192:])
+    self.assertRaises(tuf.BadHashError, chunk_hashes.check_range, 1024,
+                      self.data[2048:3072])
+    self.assertRaises(tuf.Error, chunk_hashes.check_range, 1000,
+                      self.data[1000:2024])
+
+
+
+# Run the unittests.
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,149 @@
+"""
+<Program>
+  test_connectionpool.py
+
+<Started>
+  October 18, 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Test connectionpool.py module.  A keep-alive HTTP server is started in
+  a thread, so no other server is needed.
+"""
+
+import tuf
+import tuf.connectionpool
+
+import BaseHTTPServer
+import SocketServer
+import threading
+import unittest
+
+
+PORT = 8090
+DATA = 'file containing data'
+
+
+class KeepAliveHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+  connection_count = 0
+
+  def setup(self):
+    BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+    KeepAliveHandler.connection_count += 1
+
+  def do_GET(self):
+    if self.path == '/redirect':
+      self.send_response(302)
+      self.send_header('Location', '/target')
+      self.send_header('Content-Length', '0')
+      self.end_headers()
+    elif self.path == '/redirect_ftp':
+      self.send_response(302)
+      self.send_header('Location', 'ftp://localhost/target')
+      self.send_header('Content-Length', '0')
+      self.end_headers()
+    elif self.path == '/truncated':
+      # Promise more than is sent, then drop the connection.
+      self.send_response(200)
+      self.send_header('Content-Length', str(len(DATA) * 2))
+      self.end_headers()
+      self.wfile.write(DATA)
+      self.close_connection = 1
+    elif self.path == '/target':
+      self.send_response(200)
+      self.send_header('Content-Length', str(len(DATA)))
+      self.end_headers()
+      self.wfile.write(DATA)
+    else:
+      self.send_response(404)
+      self.send_header('Content-Length', '0')
+      self.end_headers()
+
+  def log_message(self, *args):
+    pass
+
+
+class ThreadingServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+  daemon_threads = True
+  allow_reuse_address = True
+
+
+server = ThreadingServer(('localhost', PORT), KeepAliveHandler)
+server_thread = threading.Thread(target=server.serve_forever)
+server_thread.daemon = True
+server_thread.start()
+
+
+
+# Unit tests
+class TestConnectionPool(unittest.TestCase):
+  def setUp(self):
+    self.pool = tuf.connectionpool.ConnectionPool(max_connections_per_host=2,
+                                                  idle_timeout=30)
+    self.url = 'http://localhost:'+str(PORT)
+    KeepAliveHandler.connection_count = 0
+
+
+  def tearDown(self):
+    self.pool.close_idle_connections()
+
+
+  def _get(self, path):
+    response = tuf.connectionpool.urlopen(self.url+path, pool=self.pool)
+    data = response.read()
+    response.close()
+    return data
+
+
+  def testKeepAlive(self):
+    for attempt in range(5):
+      self.assertEqual(self._get('/target'), DATA)
+    self.assertEqual(KeepAliveHandler.connection_count, 1)
+
+
+  def testRedirect(self):
+    self.assertEqual(self._get('/redirect'), DATA)
+    self.assertEqual(KeepAliveHandler.connection_count, 1)
+
+
+  def testNotFound(self):
+    self.assertRaises(tuf.DownloadError, self._get, '/missing')
+
+
+  def testUnsupportedRedirect(self):
+    self.assertRaises(tuf.DownloadError, self._get, '/redirect_ftp')
+
+
+  def testTruncatedResponse(self):
+    self.assertRaises(tuf.DownloadError, self._get, '/truncated')
+
+
+  def testMaxConnectionsPerHost(self):
+    def download():
+      self._get('/target')
+
+    threads = [threading.Thread(target=download) for count in range(10)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    self.assertTrue(KeepAliveHandler.connection_count <= 2)
+
+
+  def testUnreadResponseIsNotReused(self):
+    response = tuf.connectionpool.urlopen(self.url+'/target', pool=self.pool)
+    response.close()
+    self.assertEqual(self._get('/target'), DATA)
+    self.assertEqual(KeepAliveHandler.connection_count, 2)
+
+
+
+# Run the unittests.
+if __name__ == '__main__':
+  unittest.main(exit=False)
+  server.shutdown()
+  server.server_close()
@@ -0,0 +1,122 @@
+"""
+<Program>
+  test_delta.py
+
+<Started>
+  October 18, 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Test delta.py module.
+
+"""
+
+import tuf
+import tuf.delta
+import tuf.util
+
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+
+# Unit tests
+class TestDelta(unittest.TestCase):
+  def setUp(self):
+    self.temporary_directory = tempfile.mkdtemp()
+    randomizer = random.Random(0)
+    self.old_data = ''.join([chr(randomizer.randint(0, 255))
+                             for index in range(100000)])
+
+
+  def tearDown(self):
+    shutil.rmtree(self.temporary_directory)
+
+
+  def _write(self, name, data):
+    filename = os.path.join(self.temporary_directory, name)
+    file_object = open(filename, 'wb')
+    file_object.write(data)
+    file_object.close()
+    return filename
+
+
+  def _roundtrip(self, new_data, max_length=None):
+    old_filename = self._write('old', self.old_data)
+    new_filename = self._write('new', new_data)
+    delta_filename = os.path.join(self.temporary_directory, 'delta')
+    tuf.delta.generate_delta(old_filename, new_filename, delta_filename)
+
+    if max_length is None:
+      max_length = len(new_data)
+    digest_object = hashlib.sha256()
+    output = tuf.util.TempFile()
+    old_file_object = open(old_filename, 'rb')
+    delta_file_object = open(delta_filename, 'rb')
+    try:
+      length = tuf.delta.apply_delta(old_file_object, delta_file_object,
+                                     output, max_length, [digest_object])
+    finally:
+      old_file_object.close()
+      delta_file_object.close()
+
+    self.assertEqual(length, len(new_data))
+    self.assertEqual(output.read(), new_data)
+    self.assertEqual(digest_object.hexdigest(),
+                     hashlib.sha256(new_data).hexdigest())
+    output.close_temp_file()
+
+    return os.path.getsize(delta_filename)
+
+
+  def testSmallChange(self):
+    new_data = self.old_data[:5000] + 'inserted' + self.old_data[5000:60000] + \
+               self.old_data[60100:]
+    delta_length = self._roundtrip(new_data)
+    self.assertTrue(delta_length < 5000)
+
+
+  def testUnrelatedFiles(self):
+    self._roundtrip('a completely different file')
+    self._roundtrip('')
+
+
+  def testMaxLength(self):
+    self.assertRaises(tuf.Error, self._roundtrip, self.old_data, 100)
+
+
+  def testNotADelta(self):
+    output = tuf.util.TempFile()
+    delta_file_object = tuf.util.TempFile()
+    delta_file_object.write('garbage')
+    delta_file_object.seek(0)
+    self.assertRaises(tuf.Error, tuf.delta.apply_delta, None,
+                      delta_file_object, output, 100)
+
+
+  def testTargetDigest(self):
+    new_data = self.old_data[:50000]
+    self._roundtrip(new_data)
+    delta_filename = os.path.join(self.temporary_directory, 'delta')
+    self.assertEqual(tuf.delta.get_delta_target_digest(delta_filename),
+                     hashlib.sha256(new_data).hexdigest())
+
+    not_a_delta = self._write('not_a_delta', 'garbage')
+    self.assertRaises(tuf.Error, tuf.delta.get_delta_target_digest,
+                      not_a_delta)
+
+
+  def testGetDeltaFilepath(self):
+    self.assertEqual(tuf.delta.get_delta_filepath('/linux/app.bin', 'ab12'),
+                     '.deltas/linux/app.bin/ab12.delta')
+
+
+
+# Run the unittests.
+if __name__ == '__main__':
+  unittest.main()
@@ -19,6 +19,7 @@ NOTE: launch test_download_server.py before running.
 
 import tuf
 import tuf.download
+import tuf.util
 
 import os
 import time
@@ -101,6 +102,21 @@ class TestDownload_url_to_tempfileobj(unittest.TestCase):
     self.assertEqual(data, self.target_file)
 
 
+  def testPartialFile(self):
+    # The server ignores 'Range' requests, so the wrong partial data must be
+    # replaced by the whole file.
+    partial_file = tuf.util.TempFile()
+    partial_file.write('wrong')
+    _temp_file = tuf.download.download_url_to_tempfileobj(self.url,
+                                                          self.target_hash,
+                                                          self.target_length,
+                                                          partial_file)
+    self.assertTrue(_temp_file is partial_file)
+    data = _temp_file.read()
+    _temp_file.close_temp_file()
+    self.assertEqual(data, self.target_file)
+
+
   def testWrongLength_lessthenactual(self):
     wronglength = self.target_length - 1
     self.assertRaises(tuf.DownloadError, 
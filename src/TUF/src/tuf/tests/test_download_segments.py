@@ -0,0 +1,194 @@
+"""
+<Program>
+  test_download_segments.py
+
+<Started>
+  October 18, 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Test the segmented downloads of download.py, from several mirrors at
+  once.  A keep-alive HTTP server that supports 'Range' requests is started
+  in a thread, and its paths act as mirrors that behave differently, so no
+  other server is needed.
+"""
+
+import tuf
+import tuf.connectionpool
+import tuf.download
+
+import BaseHTTPServer
+import SocketServer
+import hashlib
+import random
+import socket
+import threading
+import unittest
+
+
+PORT = 8091
+randomizer = random.Random(0)
+DATA = ''.join([chr(randomizer.randint(0, 255)) for index in range(10000)])
+SEGMENT_SIZE = 1000
+
+
+class RangeHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """
+  Serves DATA at '/<mirror>/target' for these mirrors:
+    good, other:  the file, for any range.
+    flaky:        half of every range, then it drops the connection.
+    corrupt:      the file with one byte changed.
+    missing:      404.
+  """
+
+  protocol_version = 'HTTP/1.1'
+  # The number of requests by mirror.
+  request_counts = {}
+  lock = threading.Lock()
+
+  def do_GET(self):
+    mirror = self.path.split('/')[1]
+    RangeHandler.lock.acquire()
+    try:
+      request_count = RangeHandler.request_counts.get(mirror, 0) + 1
+      RangeHandler.request_counts[mirror] = request_count
+    finally:
+      RangeHandler.lock.release()
+
+    if mirror not in ('good', 'other', 'flaky', 'corrupt'):
+      self.send_response(404)
+      self.send_header('Content-Length', '0')
+      self.end_headers()
+      return
+
+    data = DATA
+    if mirror == 'corrupt':
+      data = DATA[:5500] + chr((ord(DATA[5500]) + 1) % 256) + DATA[5501:]
+
+    first_byte, last_byte = self.headers['Range'][len('bytes='):].split('-')
+    first_byte, last_byte = int(first_byte), int(last_byte)
+    segment = data[first_byte:last_byte+1]
+
+    self.send_response(206)
+    self.send_header('Content-Range', 'bytes '+str(first_byte)+'-'+
+                     str(last_byte)+'/'+str(len(data)))
+    self.send_header('Content-Length', str(len(segment)))
+    self.end_headers()
+    if mirror == 'flaky':
+      # Fail partway through the segment.
+      self.wfile.write(segment[:len(segment) // 2])
+      self.close_connection = 1
+      return
+    self.wfile.write(segment)
+
+  def log_message(self, *args):
+    pass
+
+
+class ThreadingServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+  daemon_threads = True
+  allow_reuse_address = True
+
+
+server = ThreadingServer(('localhost', PORT), RangeHandler)
+server_thread = threading.Thread(target=server.serve_forever)
+server_thread.daemon = True
+server_thread.start()
+
+
+
+# Unit tests
+class TestDownloadSegments(unittest.TestCase):
+  def setUp(self):
+    RangeHandler.request_counts = {}
+    self.hashes = {'sha256': hashlib.sha256(DATA).hexdigest()}
+
+
+  def tearDown(self):
+    tuf.connectionpool.default_pool.close_idle_connections()
+
+
+  def _url(self, mirror):
+    return 'http://localhost:'+str(PORT)+'/'+mirror+'/target'
+
+
+  def _download(self, mirrors):
+    # Download in a thread, so a download that hangs fails the test.
+    result = {}
+    def download():
+      try:
+        result['file'] = tuf.download.download_url_segments_to_tempfileobj(
+          [self._url(mirror) for mirror in mirrors], self.hashes, len(DATA),
+          segment_size=SEGMENT_SIZE)
+      except Exception, e:
+        result['error'] = e
+
+    thread = threading.Thread(target=download)
+    thread.daemon = True
+    thread.start()
+    thread.join(30)
+    self.assertFalse(thread.isAlive(), 'The download hangs.')
+
+    if 'error' in result:
+      raise result['error']
+    data = result['file'].read()
+    result['file'].close_temp_file()
+    return data
+
+
+  def testSegmentsAssembled(self):
+    self.assertEqual(self._download(['good', 'other']), DATA)
+    self.assertEqual(RangeHandler.request_counts['good'] +
+                     RangeHandler.request_counts['other'],
+                     len(DATA) // SEGMENT_SIZE)
+
+
+  def testFailingMirror(self):
+    # The segment the flaky mirror fails partway is re-queued and downloaded
+    # from the good one.
+    self.assertEqual(self._download(['flaky', 'good']), DATA)
+    self.assertTrue(RangeHandler.request_counts['flaky'] >= 1)
+
+
+  def testUnexpectedError(self):
+    # A mirror whose connection fails with an error other than
+    # tuf.DownloadError does not keep its segment, or the download, hanging.
+    download_segment = tuf.download._download_segment
+    def failing_download_segment(url, first_byte, last_byte):
+      if '/flaky/' in url:
+        raise socket.error('Connection reset by peer')
+      return download_segment(url, first_byte, last_byte)
+
+    tuf.download._download_segment = failing_download_segment
+    try:
+      self.assertEqual(self._download(['flaky', 'good']), DATA)
+      self.assertRaises(tuf.DownloadError, self._download, ['flaky'])
+    finally:
+      tuf.download._download_segment = download_segment
+
+
+  def testAllMirrorsFail(self):
+    self.assertRaises(tuf.DownloadError, self._download, ['missing', 'flaky'])
+
+
+  def testWholeFileHash(self):
+    self.assertRaises(tuf.DownloadError, self._download, ['corrupt'])
+
+    self.hashes = {'sha256': hashlib.sha256('other data').hexdigest()}
+    self.assertRaises(tuf.DownloadError, self._download, ['good'])
+
+
+  def testNoPooledMirror(self):
+    self.assertRaises(tuf.DownloadError,
+                      tuf.download.download_url_segments_to_tempfileobj,
+                      ['ftp://localhost/target'], self.hashes, len(DATA))
+
+
+
+# Run the unittests.
+if __name__ == '__main__':
+  unittest.main(exit=False)
+  server.shutdown()
+  server.server_close()
@@ -215,5 +215,56 @@ class Test(unittest.TestCase):
       self.assertEqual(digest_object_truth.digest(), digest_object.digest())
 
 
+
+  def test_multi_digest_filename(self):
+    self._run_with_all_hash_libraries(self._do_multi_digest_filename)
+
+
+  def _do_multi_digest_filename(self, library):
+    algorithms = ['md5', 'sha1', 'sha224', 'sha256', 'sha384', 'sha512']
+    for data in ['', 'abcdefgh' * 300000]:
+      fd, filename = tempfile.mkstemp()
+      try:
+        os.write(fd, data)
+        os.close(fd)
+        digest_objects = tuf.hash.multi_digest_filename(filename, algorithms,
+                                                        library)
+        self.assertEqual(sorted(digest_objects.keys()), sorted(algorithms))
+        for algorithm in algorithms:
+          digest_object_truth = tuf.hash.digest(algorithm, library)
+          digest_object_truth.update(data)
+          self.assertEqual(digest_object_truth.digest(),
+                           digest_objects[algorithm].digest())
+      finally:
+        os.remove(filename)
+
+
+  def test_digest_filenames(self):
+    filenames = []
+    try:
+      for index in range(10):
+        fd, filename = tempfile.mkstemp()
+        os.write(fd, str(index) * index)
+        os.close(fd)
+        filenames.append(filename)
+      missing_filename = filenames[-1] + '.missing'
+
+      hexdigests = tuf.hash.digest_filenames(filenames + [missing_filename],
+                                             ['md5', 'sha256'],
+                                             worker_count=3)
+      self.assertEqual(hexdigests[missing_filename], None)
+      for index, filename in enumerate(filenames):
+        digest_object = tuf.hash.digest('sha256')
+        digest_object.update(str(index) * index)
+        self.assertEqual(hexdigests[filename]['sha256'],
+                         digest_object.hexdigest())
+        self.assertTrue('md5' in hexdigests[filename])
+
+      self.assertRaises(tuf.UnsupportedAlgorithmError,
+                        tuf.hash.digest_filenames, filenames, ['sha0'])
+    finally:
+      for filename in filenames:
+        os.remove(filename)
+
 if __name__ == "__main__":
     unittest.main()
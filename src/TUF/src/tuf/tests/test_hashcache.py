@@ -0,0 +1,131 @@
+"""
+<Program>
+  test_hashcache.py
+
+<Started>
+  October 18, 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Test hashcache.py module.
+
+"""
+
+import tuf
+import tuf.conf
+import tuf.hash
+import tuf.hashcache
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+
+# Unit tests
+class TestHashCache(unittest.TestCase):
+  def setUp(self):
+    self.temporary_directory = tempfile.mkdtemp()
+    self.cache_filename = os.path.join(self.temporary_directory, 'cache.txt')
+    tuf.conf.hash_cache_filename = self.cache_filename
+
+    self.filename = os.path.join(self.temporary_directory, 'target')
+    self._write('target data')
+
+    # Count the files actually hashed.
+    self.hashed_files = []
+    self.multi_digest_filename = tuf.hash.multi_digest_filename
+    def multi_digest_filename(filename, *args, **kwargs):
+      self.hashed_files.append(filename)
+      return self.multi_digest_filename(filename, *args, **kwargs)
+    tuf.hash.multi_digest_filename = multi_digest_filename
+
+
+  def tearDown(self):
+    tuf.hash.multi_digest_filename = self.multi_digest_filename
+    tuf.conf.hash_cache_filename = None
+    tuf.conf.hash_cache_strict = False
+    shutil.rmtree(self.temporary_directory)
+
+
+  def _write(self, data, mtime=None):
+    file_object = open(self.filename, 'wb')
+    file_object.write(data)
+    file_object.close()
+    # Files modified very recently are not cached.
+    if mtime is None:
+      mtime = time.time() - 60
+    os.utime(self.filename, (mtime, mtime))
+
+
+  def testCachedHash(self):
+    expected = hashlib.sha256('target data').hexdigest()
+    self.assertEqual(tuf.hashcache.get_hexdigest(self.filename), expected)
+    self.assertEqual(tuf.hashcache.get_hexdigest(self.filename), expected)
+    self.assertEqual(len(self.hashed_files), 1)
+
+    # Another algorithm is hashed once too.
+    tuf.hashcache.get_hexdigest(self.filename, 'md5')
+    tuf.hashcache.get_hexdigest(self.filename, 'md5')
+    self.assertEqual(len(self.hashed_files), 2)
+
+    tuf.hashcache.get_hexdigest(self.filename, strict=True)
+    self.assertEqual(len(self.hashed_files), 3)
+
+
+  def testModifiedFile(self):
+    tuf.hashcache.get_hexdigest(self.filename)
+    self._write('other data', mtime=time.time() - 30)
+    self.assertEqual(tuf.hashcache.get_hexdigest(self.filename),
+                     hashlib.sha256('other data').hexdigest())
+    self.assertEqual(len(self.hashed_files), 2)
+
+
+  def testRecentlyModifiedFile(self):
+    self._write('target data', mtime=time.time())
+    tuf.hashcache.get_hexdigest(self.filename)
+    tuf.hashcache.get_hexdigest(self.filename)
+    self.assertEqual(len(self.hashed_files), 2)
+
+
+  def testManyFiles(self):
+    filename = os.path.join(self.temporary_directory, 'other')
+    missing_filename = os.path.join(self.temporary_directory, 'missing')
+    shutil.copy(self.filename, filename)
+    os.utime(filename, (time.time() - 60, time.time() - 60))
+
+    filename_algorithms = {self.filename: ['sha256', 'md5'],
+                           filename: ['sha256'], missing_filename: ['sha256']}
+    hexdigests = tuf.hashcache.get_hexdigests(filename_algorithms)
+    self.assertEqual(hexdigests[missing_filename], None)
+    self.assertEqual(hexdigests[self.filename]['md5'],
+                     hashlib.md5('target data').hexdigest())
+    self.assertEqual(hexdigests[filename]['sha256'],
+                     hashlib.sha256('target data').hexdigest())
+    self.assertEqual(len(self.hashed_files), 2)
+
+    tuf.hashcache.get_hexdigests(filename_algorithms)
+    self.assertEqual(len(self.hashed_files), 2)
+
+
+  def testSave(self):
+    tuf.hashcache.get_hexdigest(self.filename)
+    tuf.hashcache.save()
+    self.assertTrue(os.path.exists(self.cache_filename))
+
+    # Load the cache again from its file.
+    tuf.conf.hash_cache_filename = None
+    tuf.hashcache.get_hexdigest(self.filename)
+    tuf.conf.hash_cache_filename = self.cache_filename
+    tuf.hashcache.get_hexdigest(self.filename)
+    self.assertEqual(len(self.hashed_files), 2)
+
+
+
+# Run the unittests.
+if __name__ == '__main__':
+  unittest.main()
@@ -17,6 +17,7 @@
 """
 
 import tuf
+import tuf.conf
 import tuf.formats as formats
 import tuf.mirrors as mirrors
 import copy
@@ -121,6 +122,49 @@ class TestMirrors(unittest.TestCase):
 
 
 
+class TestMirrorScoreboard(unittest.TestCase):
+  def setUp(self):
+    self.scoreboard = mirrors.MirrorScoreboard()
+    self.exploration_rate = tuf.conf.mirror_exploration_rate
+    tuf.conf.mirror_exploration_rate = 0
+
+
+  def tearDown(self):
+    tuf.conf.mirror_exploration_rate = self.exploration_rate
+
+
+  def testRankByLatencyAndThroughput(self):
+    self.scoreboard.record_success('http://slow.com/targets/a.py', 0.5,
+                                   1000000, 10.0)
+    self.scoreboard.record_success('http://fast.com:8080/metadata/root.txt',
+                                   0.1, 1000000, 1.0)
+    result = self.scoreboard.rank([('http://slow.com/targets/b.py', 1.0),
+                                   ('http://fast.com:8080/targets/b.py', 1.0)])
+    self.assertEqual(['http://fast.com:8080/targets/b.py',
+                      'http://slow.com/targets/b.py'], result)
+
+
+  def testFailuresRankLast(self):
+    self.scoreboard.record_success('http://mirror1.com/a', 0.1, 100, 0.1)
+    self.scoreboard.record_failure('http://mirror2.com/a')
+    result = self.scoreboard.rank([('http://mirror2.com/b', 1.0),
+                                   ('http://mirror1.com/b', 1.0),
+                                   ('http://mirror3.com/b', 1.0)])
+    self.assertEqual(['http://mirror3.com/b', 'http://mirror1.com/b',
+                      'http://mirror2.com/b'], result)
+
+
+  def testWeights(self):
+    self.scoreboard.record_success('http://mirror1.com/a', 0.1, 100, 0.1)
+    self.scoreboard.record_success('http://mirror2.com/a', 0.1, 100, 0.1)
+    result = self.scoreboard.rank([('http://mirror1.com/b', 1.0),
+                                   ('http://mirror2.com/b', 2.0)])
+    self.assertEqual(['http://mirror2.com/b', 'http://mirror1.com/b'], result)
+
+
+
 # Run the unittests
 suite = unittest.TestLoader().loadTestsFromTestCase(TestMirrors)
 unittest.TextTestRunner(verbosity=2).run(suite)
+suite = unittest.TestLoader().loadTestsFromTestCase(TestMirrorScoreboard)
+unittest.TextTestRunner(verbosity=2).run(suite)
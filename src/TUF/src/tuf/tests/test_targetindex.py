@@ -0,0 +1,77 @@
+"""
+<Program>
+  test_targetindex.py
+
+<Started>
+  October 18, 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Test targetindex.py module.
+
+"""
+
+import tuf
+import tuf.client.targetindex
+
+import unittest
+
+
+# Unit tests
+class TestTargetIndex(unittest.TestCase):
+  def setUp(self):
+    self.target_index = tuf.client.targetindex.TargetIndex()
+    self.fileinfo = {'length': 11, 'hashes': {'sha256': 'aa'}}
+    self.other_fileinfo = {'length': 12, 'hashes': {'sha256': 'bb'}}
+
+    self.target_index.add_role('targets', {'README': self.fileinfo,
+                                           'a/b/c.tar.gz': self.fileinfo})
+    self.target_index.add_role('targets/a', {'a/b/c.tar.gz': self.fileinfo,
+                                             'a/b/d.txt': self.other_fileinfo,
+                                             'a/e/f.tar.gz': self.fileinfo})
+
+
+  def testGet(self):
+    self.assertEqual(self.target_index.get('README'),
+                     {'targets': self.fileinfo})
+    self.assertEqual(self.target_index.get('a/b/c.tar.gz'),
+                     {'targets': self.fileinfo, 'targets/a': self.fileinfo})
+    self.assertEqual(self.target_index.get('missing'), {})
+
+
+  def testReplaceAndRemoveRole(self):
+    self.target_index.add_role('targets/a', {'a/b/d.txt': self.fileinfo})
+    self.assertEqual(self.target_index.get('a/b/d.txt'),
+                     {'targets/a': self.fileinfo})
+    self.assertEqual(self.target_index.get('a/e/f.tar.gz'), {})
+
+    self.target_index.remove_role('targets/a')
+    self.target_index.remove_role('targets/unknown')
+    self.assertEqual(self.target_index.get('a/b/d.txt'), {})
+    self.assertEqual(self.target_index.get('a/b/c.tar.gz'),
+                     {'targets': self.fileinfo})
+
+
+  def testListFilepaths(self):
+    self.assertEqual(self.target_index.list_filepaths('a/b/'),
+                     ['a/b/c.tar.gz', 'a/b/d.txt'])
+    self.assertEqual(self.target_index.list_filepaths(pattern='a/*.tar.gz'),
+                     ['a/b/c.tar.gz', 'a/e/f.tar.gz'])
+    self.assertEqual(self.target_index.list_filepaths('a/e/', '*.tar.gz'),
+                     ['a/e/f.tar.gz'])
+    self.assertEqual(self.target_index.list_filepaths('a/', 'R*'), [])
+    self.assertEqual(len(self.target_index.list_filepaths()), 4)
+
+    # The listing follows the changes to the index.
+    self.target_index.remove_role('targets')
+    self.assertEqual(self.target_index.list_filepaths(), ['a/b/c.tar.gz',
+                                                          'a/b/d.txt',
+                                                          'a/e/f.tar.gz'])
+
+
+
+# Run the unittests.
+if __name__ == '__main__':
+  unittest.main()
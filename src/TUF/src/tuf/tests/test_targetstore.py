@@ -0,0 +1,111 @@
+"""
+<Program>
+  test_targetstore.py
+
+<Started>
+  October 18, 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Test targetstore.py module.
+
+"""
+
+import tuf
+import tuf.client.targetstore
+import tuf.util
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+
+# Unit tests
+class TestTargetStore(unittest.TestCase):
+  def setUp(self):
+    self.temporary_directory = tempfile.mkdtemp()
+    store_directory = os.path.join(self.temporary_directory, 'store')
+    self.target_store = tuf.client.targetstore.TargetStore(store_directory)
+
+    self.data = 'target data' * 1000
+    self.fileinfo = {'length': len(self.data),
+                     'hashes': {'sha256': hashlib.sha256(self.data).hexdigest(),
+                                'md5': hashlib.md5(self.data).hexdigest()}}
+
+
+  def tearDown(self):
+    shutil.rmtree(self.temporary_directory)
+
+
+  def _add(self):
+    temp_directory = self.target_store.get_temp_directory(self.fileinfo)
+    temp_file = tuf.util.TempFile(directory=temp_directory)
+    temp_file.write(self.data)
+    self.assertTrue(self.target_store.add(temp_file, self.fileinfo))
+
+
+  def _read(self, filepath):
+    file_object = open(filepath, 'rb')
+    try:
+      return file_object.read()
+    finally:
+      file_object.close()
+
+
+  def testMaterialize(self):
+    destination = os.path.join(self.temporary_directory, 'first')
+    self.assertFalse(self.target_store.materialize(self.fileinfo, destination))
+
+    self._add()
+    other_destination = os.path.join(self.temporary_directory, 'second')
+    self.assertTrue(self.target_store.materialize(self.fileinfo, destination))
+    self.assertTrue(self.target_store.materialize(self.fileinfo,
+                                                  other_destination))
+    self.assertEqual(self._read(destination), self.data)
+    self.assertEqual(self._read(other_destination), self.data)
+
+    # Both destinations share the stored copy.
+    target_path = self.target_store.get_target_path(self.fileinfo)
+    self.assertEqual(os.stat(target_path).st_nlink, 3)
+
+
+  def testModifiedTarget(self):
+    self._add()
+    target_path = self.target_store.get_target_path(self.fileinfo)
+    file_object = open(target_path, 'ab')
+    file_object.write('tampered')
+    file_object.close()
+
+    destination = os.path.join(self.temporary_directory, 'first')
+    self.assertFalse(self.target_store.materialize(self.fileinfo, destination))
+    self.assertFalse(os.path.exists(target_path))
+    self.assertFalse(os.path.exists(destination))
+
+
+  def testNoSha256(self):
+    fileinfo = {'length': len(self.data),
+                'hashes': {'md5': self.fileinfo['hashes']['md5']}}
+    self.assertEqual(self.target_store.get_temp_directory(fileinfo), None)
+    self.assertFalse(self.target_store.add(tuf.util.TempFile(), fileinfo))
+
+
+  def testCollectGarbage(self):
+    self._add()
+    destination = os.path.join(self.temporary_directory, 'first')
+    self.target_store.materialize(self.fileinfo, destination)
+    self.assertEqual(self.target_store.collect_garbage(), 0)
+
+    os.remove(destination)
+    self.assertEqual(self.target_store.collect_garbage(), 1)
+    target_path = self.target_store.get_target_path(self.fileinfo)
+    self.assertFalse(os.path.exists(target_path))
+
+
+
+# Run the unittests.
+if __name__ == '__main__':
+  unittest.main()
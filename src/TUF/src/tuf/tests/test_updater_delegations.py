@@ -0,0 +1,183 @@
+"""
+<Program>
+  test_updater_delegations.py
+
+<Started>
+  October 18, 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Test how updater.py walks a tree of delegated targets roles.  The
+  metadata of the roles is made up in memory and the steps that download,
+  verify and store it are replaced, so that only the order in which the
+  roles are refreshed is tested.
+
+"""
+
+import tuf
+import tuf.conf
+import tuf.roledb
+import tuf.client.targetindex
+import tuf.client.updater as updater
+
+import threading
+import time
+import unittest
+
+
+# The delegation tree: 'targets' delegates to 'targets/a' and 'targets/b',
+# which delegate to 'targets/a/x' and 'targets/b/y'.
+DELEGATED_ROLES = ['targets/a', 'targets/b', 'targets/a/x', 'targets/b/y']
+
+
+class StubTempFile(object):
+  def __init__(self, rolename, closed_files):
+    self.rolename = rolename
+    self.closed_files = closed_files
+
+  def close_temp_file(self):
+    self.closed_files.append(self.rolename)
+
+
+
+def make_repository():
+  # A Repository whose metadata is set up by the test instead of being
+  # read from disk.
+  repository = updater.Repository.__new__(updater.Repository)
+  repository.metadata = {'current': {}, 'previous': {}}
+  repository.target_index = tuf.client.targetindex.TargetIndex()
+  return repository
+
+
+
+# Unit tests
+class TestRefreshDelegations(unittest.TestCase):
+  def setUp(self):
+    self.worker_count = tuf.conf.metadata_refresh_worker_count
+    tuf.conf.metadata_refresh_worker_count = 4
+
+    self.repository = make_repository()
+    meta = {'targets.txt': {}}
+    for rolename in DELEGATED_ROLES:
+      meta[rolename+'.txt'] = {}
+    self.repository.metadata['current']['release'] = {'meta': meta}
+
+    self.events = []
+    self.events_lock = threading.Lock()
+    self.closed_files = []
+    self.failing_roles = []
+    self.downloading_count = 0
+    self.max_downloading_count = 0
+
+    self.repository._load_metadata_from_file = self._load_metadata_from_file
+    self.repository._check_metadata_changed = self._check_metadata_changed
+    self.repository._download_metadata = self._download_metadata
+    self.repository._update_metadata_if_changed = \
+      self._update_metadata_if_changed
+    self.repository._ensure_not_expired = lambda rolename: None
+
+
+  def tearDown(self):
+    tuf.conf.metadata_refresh_worker_count = self.worker_count
+
+
+  def _record(self, *event):
+    self.events_lock.acquire()
+    try:
+      self.events.append(event)
+    finally:
+      self.events_lock.release()
+
+
+  def _load_metadata_from_file(self, metadata_set, rolename):
+    self._record('load', metadata_set, rolename)
+
+
+  def _check_metadata_changed(self, rolename, referenced_metadata='release'):
+    return True, None
+
+
+  def _download_metadata(self, rolename, compression=None):
+    self.events_lock.acquire()
+    try:
+      self.downloading_count = self.downloading_count + 1
+      self.max_downloading_count = max(self.max_downloading_count,
+                                       self.downloading_count)
+    finally:
+      self.events_lock.release()
+
+    self._record('download', rolename)
+    # Give the sibling roles time to start downloading too.
+    time.sleep(0.2)
+
+    self.events_lock.acquire()
+    try:
+      self.downloading_count = self.downloading_count - 1
+    finally:
+      self.events_lock.release()
+
+    if rolename in self.failing_roles:
+      raise tuf.RepositoryError('No mirror has '+repr(rolename)+'.')
+    return StubTempFile(rolename, self.closed_files), {}
+
+
+  def _update_metadata_if_changed(self, rolename, referenced_metadata='release',
+                                  downloaded_metadata=None):
+    if isinstance(downloaded_metadata, Exception):
+      raise tuf.MetadataNotAvailableError(str(downloaded_metadata))
+    self._record('install', rolename)
+    self.repository.metadata['current'][rolename] = {'targets': {}}
+
+
+  def _index(self, *event):
+    return self.events.index(event)
+
+
+  def testSiblingsRefreshedConcurrently(self):
+    self.repository._refresh_targets_metadata(include_delegations=True)
+
+    installed_roles = [event[1] for event in self.events
+                       if event[0] == 'install']
+    self.assertEqual(sorted(installed_roles), sorted(DELEGATED_ROLES))
+    self.assertEqual(self.max_downloading_count, 2)
+
+    # A role is only loaded and downloaded once its parent is installed.
+    for parent_role, child_role in [('targets/a', 'targets/a/x'),
+                                    ('targets/b', 'targets/b/y')]:
+      self.assertTrue(self._index('install', parent_role) <
+                      self._index('load', 'current', child_role))
+      self.assertTrue(self._index('install', parent_role) <
+                      self._index('download', child_role))
+
+
+  def testSerialRefresh(self):
+    tuf.conf.metadata_refresh_worker_count = 1
+    self.repository._refresh_targets_metadata(include_delegations=True)
+    self.assertEqual(self.max_downloading_count, 1)
+    self.assertEqual(len([event for event in self.events
+                          if event[0] == 'install']), 4)
+
+
+  def testFailingSibling(self):
+    self.failing_roles.append('targets/a')
+    self.assertRaises(tuf.MetadataNotAvailableError,
+                      self.repository._refresh_targets_metadata,
+                      include_delegations=True)
+
+    # The sibling is installed in full, and nothing is left downloaded but
+    # not installed.
+    self.assertTrue(('install', 'targets/b') in self.events)
+    self.assertFalse(('install', 'targets/a') in self.events)
+    self.assertEqual(self.closed_files, [])
+
+    # The delegations of the level are not refreshed.
+    self.assertFalse(('download', 'targets/a/x') in self.events)
+    self.assertFalse(('download', 'targets/b/y') in self.events)
+
+
+
+# Run the unittests.
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,122 @@
+"""
+<Program>
+  test_updater_target.py
+
+<Started>
+  October 18, 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Test how the target() method of updater.py walks the delegations to find
+  a target.  The metadata of the roles is made up in memory, and refreshing
+  a delegated role just records it and loads its made-up metadata.
+
+"""
+
+import tuf
+import tuf.roledb
+import tuf.client.targetindex
+import tuf.client.updater as updater
+
+import copy
+import unittest
+
+
+FILEINFO = {'length': 11, 'hashes': {'sha256': 'aa'}}
+OTHER_FILEINFO = {'length': 12, 'hashes': {'sha256': 'bb'}}
+
+
+def delegations(paths_by_role):
+  roles = {}
+  for rolename, paths in paths_by_role.items():
+    roles[rolename] = {'keyids': [], 'threshold': 1, 'paths': paths}
+  return {'keys': {}, 'roles': roles}
+
+
+# The metadata of the roles: 'targets' delegates 'a/*' to 'targets/a', which
+# delegates 'a/x/file.txt' to 'targets/a/x' only.
+ROLES_METADATA = {
+  'targets': {'targets': {'README': FILEINFO},
+              'delegations': delegations({
+                'targets/a': ['a/file.txt', 'a/x/file.txt'],
+                'targets/b': ['b/file.txt']})},
+  'targets/a': {'targets': {'a/file.txt': FILEINFO},
+                'delegations': delegations({
+                  'targets/a/x': ['a/x/file.txt'],
+                  'targets/a/y': ['a/y/file.txt']})},
+  'targets/b': {'targets': {'b/file.txt': FILEINFO}},
+  'targets/a/x': {'targets': {'a/x/file.txt': FILEINFO}},
+  'targets/a/y': {'targets': {'a/y/file.txt': FILEINFO}}}
+
+
+
+# Unit tests
+class TestTarget(unittest.TestCase):
+  def setUp(self):
+    tuf.roledb.roledb_dict.clear()
+    tuf.roledb.add_role('targets', {'keyids': [], 'threshold': 1})
+    self.roles_metadata = copy.deepcopy(ROLES_METADATA)
+
+    self.repository = updater.Repository.__new__(updater.Repository)
+    self.repository.metadata = {'current': {}, 'previous': {}}
+    self.repository.target_index = tuf.client.targetindex.TargetIndex()
+    self._load_role('targets')
+
+    self.refreshed_roles = []
+    self.repository._refresh_targets_metadata = self._refresh_targets_metadata
+
+
+  def tearDown(self):
+    tuf.roledb.roledb_dict.clear()
+
+
+  def _load_role(self, rolename):
+    role_metadata = self.roles_metadata[rolename]
+    self.repository.metadata['current'][rolename] = role_metadata
+    self.repository.target_index.add_role(rolename, role_metadata['targets'])
+    for delegated_role, roleinfo in \
+        role_metadata.get('delegations', {}).get('roles', {}).items():
+      tuf.roledb.add_role(delegated_role, roleinfo)
+
+
+  def _refresh_targets_metadata(self, rolename='targets',
+                                include_delegations=False):
+    self.refreshed_roles.append(rolename)
+    self._load_role(rolename)
+
+
+  def testNestedDelegation(self):
+    self.assertEqual(self.repository.target('a/x/file.txt'),
+                     {'filepath': 'a/x/file.txt', 'fileinfo': FILEINFO})
+
+    # Only the roles delegated the path are downloaded, parents first.
+    self.assertEqual(self.refreshed_roles, ['targets/a', 'targets/a/x'])
+
+
+  def testTopLevelTarget(self):
+    self.assertEqual(self.repository.target('README'),
+                     {'filepath': 'README', 'fileinfo': FILEINFO})
+    self.assertEqual(self.refreshed_roles, [])
+
+
+  def testTargetNotDelegated(self):
+    # A role that was not delegated the path cannot provide it.
+    self.assertRaises(tuf.RepositoryError, self.repository.target,
+                      'a/y/file.txt')
+    self.assertEqual(self.refreshed_roles, [])
+    self.assertRaises(tuf.RepositoryError, self.repository.target, 'missing')
+
+
+  def testMultipleFileinfo(self):
+    targets = self.roles_metadata['targets/a']['targets']
+    targets['a/x/file.txt'] = OTHER_FILEINFO
+    self.assertRaises(tuf.RepositoryError, self.repository.target,
+                      'a/x/file.txt')
+
+
+
+# Run the unittests.
+if __name__ == '__main__':
+  unittest.main()
@@ -16,21 +16,36 @@
   Provides utility services.  This module supplies utility functions such as:
   get_file_details that computes length and hash of a file, import_json that
   tries to import a working json module, load_json functions, TempFile class -
-  generates a file-like object temporary starage, etc.
+  generates a file-like object temporary starage, StreamDecompressor class -
+  decompresses a file as it is downloaded, etc.
 
 """
 
 
+import bz2
+import cStringIO
 import gzip
 import os
 import shutil
 import sys
 import re
 import tempfile
+import threading
 import logging
+import zlib
+
+# xz compression is optional, Python 2 has no lzma module of its own.
+try:
+  import lzma
+except ImportError:
+  try:
+    from backports import lzma
+  except ImportError:
+    lzma = None
 
 import tuf.formats
 import tuf.hash
+import tuf.hashcache
 import tuf.log
 import tuf.conf
 
@@ -38,6 +53,49 @@ import tuf.conf
 # See 'log.py' to learn how logging is handled in TUF
 logger = logging.getLogger('tuf.util')
 
+# The permissions of the files TempFile.move() installs by renaming, like
+# those of files created with open().  Found on the first move, see
+# _get_new_file_mode().
+_new_file_mode = None
+_new_file_mode_lock = threading.Lock()
+
+# The file name extensions of the compressed versions of a metadata file,
+# by compression.  'xz' is only supported if an lzma module is installed.
+COMPRESSION_EXTENSIONS = {'gzip': 'gz', 'bz2': 'bz2', 'xz': 'xz'}
+
+
+
+
+
+def _get_new_file_mode(directory):
+  """
+  <Purpose>
+    Get the permissions open() gives new files, 0666 less the umask.  The
+    umask cannot be read without setting it, which would briefly change it
+    for the other threads, so a file is created in 'directory' once instead
+    and its permissions are remembered.
+  """
+
+  global _new_file_mode
+
+  _new_file_mode_lock.acquire()
+  try:
+    if _new_file_mode is None:
+      probe_path = os.path.join(directory, '.tuf-mode-'+str(os.getpid()))
+      # Left behind by an earlier process with the same id, if it exists.
+      if os.path.lexists(probe_path):
+        os.remove(probe_path)
+      file_descriptor = os.open(probe_path,
+                                os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0666)
+      try:
+        _new_file_mode = os.fstat(file_descriptor).st_mode & 0777
+      finally:
+        os.close(file_descriptor)
+        os.remove(probe_path)
+    return _new_file_mode
+  finally:
+    _new_file_mode_lock.release()
+
 
 
 
@@ -51,9 +109,17 @@ class TempFile(object):
     are additional functions that aren't part of file-like objects.  TempFile
     is used in download.py module.
 
+    A TempFile created in the directory it is going to be moved to (or any
+    directory on the same filesystem) is installed by move() with a single
+    atomic rename instead of being copied.
+
+    Small files are spooled: their data is kept in memory until it grows
+    beyond 'tuf.conf.temporary_file_spool_size' bytes, and only then
+    written to a file on disk.
+
   """
 
-  def __init__(self, prefix='tmp'):
+  def __init__(self, prefix='tmp', directory=None, spool_size=None):
     """
     <Purpose>
       Initializes TempFile.
@@ -62,6 +128,15 @@ class TempFile(object):
       prefix:
         A string argument to be used with tempfile.TemporaryFile function.
 
+      directory:
+        The directory to create a hidden, named temporary file in, so that
+        move() can rename it into place.  If None, or if the file cannot be
+        created there, an anonymous temporary file is used.
+
+      spool_size:
+        The number of bytes kept in memory before the data is written to
+        disk.  If None, 'tuf.conf.temporary_file_spool_size' is used.
+
     <Exceptions>
       OSError on failure to load temp dir.
       tuf.Error
@@ -76,23 +151,98 @@ class TempFile(object):
     # If compression is set then the original file is saved in 'self._orig_file'.
     self._orig_file = None
 
+    # The path of the named temporary file created in 'directory'.  None if
+    # the file is anonymous or was already moved or removed.
+    self._temp_path = None
+
+    self._prefix = prefix
+    self._directory = directory
+
+    if spool_size is None:
+      spool_size = tuf.conf.temporary_file_spool_size
+    self._spool_size = spool_size
+
+    # True while the data is held in memory by 'self.temporary_file'.
+    self._spooled = spool_size > 0
+    if self._spooled:
+      self.temporary_file = cStringIO.StringIO()
+    else:
+      self.temporary_file = self._create_file()
+
+
+  def _create_file(self):
+    """
+    <Purpose>
+      Create the file on disk that stores the data.
+
+    <Exceptions>
+      tuf.Error, if no temporary file can be created.
+
+    <Return>
+      A file object, opened for reading and writing.
+
+    """
+
+    buffer_size = tuf.conf.temporary_file_buffer_size
+    prefix = self._prefix
+
+    if self._directory is not None:
+      try:
+        descriptor, self._temp_path = tempfile.mkstemp(prefix='.'+prefix,
+                                                       dir=self._directory)
+        return os.fdopen(descriptor, 'w+b', buffer_size)
+      except OSError, err:
+        self._temp_path = None
+        logger.warn('Temp file in '+self._directory+' failed: '+str(err))
+        logger.warn('It will be copied into place when moved.')
+
     temp_dir = tuf.conf.temporary_directory
     if  temp_dir is not None:
       # We use TemporaryFile for the auto-delete aspects of it to ensure
       # we don't leave behind temp files.
       try:
-        self.temporary_file = tempfile.TemporaryFile(prefix=prefix, dir=temp_dir)
+        return tempfile.TemporaryFile(bufsize=buffer_size, prefix=prefix,
+                                      dir=temp_dir)
       except OSError, err:
-        logger.error('Temp file in '+temp_dir+' failed: '+err)
+        logger.error('Temp file in '+temp_dir+' failed: '+str(err))
         logger.error('Will attempt to use system default temp dir.')
 
     try:
-      self.temporary_file = tempfile.TemporaryFile(prefix=prefix)
+      return tempfile.TemporaryFile(bufsize=buffer_size, prefix=prefix)
     except OSError, err:
-      logger.critical('Temp file in '+temp_dir+'failed: '+err)
+      logger.critical('Temp file failed: '+str(err))
       raise tuf.Error(err)
 
 
+  def _rollover(self):
+    """
+    <Purpose>
+      Move the data spooled in memory to a file on disk.  The file's
+      current position is kept.
+
+    <Exceptions>
+      tuf.Error, if no temporary file can be created.
+
+    <Return>
+      None.
+
+    """
+
+    if not self._spooled:
+      return
+
+    memory_file = self.temporary_file
+    position = memory_file.tell()
+
+    disk_file = self._create_file()
+    disk_file.write(memory_file.getvalue())
+    disk_file.seek(position)
+
+    self.temporary_file = disk_file
+    self._spooled = False
+    memory_file.close()
+
+
   def flush(self):
     """
     <Purpose>
@@ -130,6 +280,11 @@ class TempFile(object):
     """
 
     if size is None:
+      # The data of a spooled file is already in memory, hand it out
+      # without reading it through the file interface.
+      if self._spooled:
+        self.temporary_file.seek(0)
+        return self.temporary_file.getvalue()
       self.temporary_file.seek(0)
       data = self.temporary_file.read()
       self.temporary_file.seek(0)
@@ -161,6 +316,14 @@ class TempFile(object):
 
     """
 
+    if self._spooled:
+      position = self.temporary_file.tell()
+      self.temporary_file.seek(0, 2)
+      size = max(self.temporary_file.tell(), position + len(data))
+      self.temporary_file.seek(position)
+      if size > self._spool_size:
+        self._rollover()
+
     self.temporary_file.write(data)
     if auto_flush:
       self.flush()
@@ -172,6 +335,11 @@ class TempFile(object):
       Copies 'self.temporary_file' to a non-temp file at 'destination_path' and
       closes 'self.temporary_file' so that it is removed.
 
+      If the TempFile was created with a 'directory' on the same filesystem
+      as 'destination_path' and was not decompressed, the file is synced to
+      disk and renamed to 'destination_path' instead, which replaces any
+      existing file atomically and does not write the data a second time.
+
     <Arguments>
       destination_path:
         Path to store the file in.
@@ -184,6 +352,28 @@ class TempFile(object):
 
     """
 
+    # Writing the spooled data to a file next to the destination and renaming
+    # it still writes the data only once.
+    if self._spooled and self._directory is not None and \
+       self._orig_file is None:
+      self._rollover()
+
+    if self._temp_path is not None and self._orig_file is None:
+      self.flush()
+      os.fsync(self.temporary_file.fileno())
+      try:
+        os.chmod(self._temp_path,
+                 _get_new_file_mode(os.path.dirname(self._temp_path)))
+        os.rename(self._temp_path, destination_path)
+      except OSError, err:
+        # E.g. another filesystem, or an existing file on Windows.
+        logger.debug('Unable to rename '+self._temp_path+' to '+
+                     destination_path+': '+str(err))
+      else:
+        self._temp_path = None
+        self.close_temp_file()
+        return
+
     self.flush()
     self.seek(0)
     destination_file = open(destination_path, 'wb')
@@ -216,6 +406,49 @@ class TempFile(object):
     self.temporary_file.seek(*args)
 
 
+  def tell(self):
+    """
+    <Purpose>
+      Get file's current position.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Return>
+      The position, in bytes from the beginning of the file.
+
+    """
+
+    return self.temporary_file.tell()
+
+
+  def truncate(self, size=0):
+    """
+    <Purpose>
+      Discard the data after the first 'size' bytes of the file and set the
+      file's current position to its new end.  Used to throw away a partial
+      download that cannot be resumed.
+
+    <Arguments>
+      size:
+        The number of bytes to keep.
+
+    <Exceptions>
+      None.
+
+    <Return>
+      None.
+
+    """
+
+    self.flush()
+    self.temporary_file.truncate(size)
+    self.temporary_file.seek(0, 2)
+
+
   def decompress_temp_file_object(self, compression):
     """
     <Purpose>
@@ -259,6 +492,9 @@ class TempFile(object):
     self._compression = compression
     self._orig_file = self.temporary_file
     self.temporary_file = gzip.GzipFile(fileobj=self.temporary_file, mode='rb')
+    # The decompressed data is read through the GzipFile, even if the
+    # compressed data is in memory.
+    self._spooled = False
 
 
   def close_temp_file(self):
@@ -268,7 +504,7 @@ class TempFile(object):
       file.close(), however temporary file destroys itself when
       'close_temp_file' is called. Further if compression is set, second
       temporary file instance 'self._orig_file' is also closed so that no open
-      temporary files are left open.
+      temporary files are left open.  A named temporary file is removed.
 
     <Arguments>
       None.
@@ -290,6 +526,139 @@ class TempFile(object):
     if self._orig_file is not None:
       self._orig_file.close()
 
+    # Unlike anonymous temporary files, a named one has to be removed.
+    if self._temp_path is not None:
+      try:
+        os.remove(self._temp_path)
+      except OSError, err:
+        logger.warn('Unable to remove '+self._temp_path+': '+str(err))
+      self._temp_path = None
+
+
+  def __del__(self):
+    # Do not leave a named temporary file behind if the TempFile was
+    # dropped without being moved or closed.
+    if getattr(self, '_temp_path', None) is not None:
+      self.close_temp_file()
+
+
+
+
+class StreamDecompressor(object):
+  """
+  <Purpose>
+    Decompress a compressed file one chunk at a time, as it arrives from
+    the network, so that it does not have to be stored compressed first.
+
+    decompressor = StreamDecompressor('bz2')
+    data = decompressor.decompress(chunk)
+    ...
+    data = decompressor.flush()
+
+  """
+
+  def __init__(self, compression):
+    """
+    <Purpose>
+      Initializes StreamDecompressor.
+
+    <Arguments>
+      compression:
+        One of the compressions returned by get_supported_compressions().
+
+    <Exceptions>
+      tuf.Error, if 'compression' is not supported.
+
+    <Return>
+      None.
+
+    """
+
+    if compression == 'gzip':
+      # The gzip header and trailer are handled by zlib.
+      self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif compression == 'bz2':
+      self._decompressor = bz2.BZ2Decompressor()
+    elif compression == 'xz' and lzma is not None:
+      self._decompressor = lzma.LZMADecompressor()
+    else:
+      raise tuf.Error('Unsupported compression: '+repr(compression))
+
+    self.compression = compression
+
+
+  def decompress(self, data):
+    """
+    <Purpose>
+      Decompress the next chunk of the file.
+
+    <Arguments>
+      data:
+        A string of compressed data.
+
+    <Exceptions>
+      tuf.Error, if the data is not valid.
+
+    <Return>
+      The decompressed data, possibly empty.
+
+    """
+
+    try:
+      return self._decompressor.decompress(data)
+    except (zlib.error, IOError, EOFError, ValueError), err:
+      raise tuf.Error('Unable to decompress '+self.compression+' data: '+
+                      str(err))
+
+
+  def flush(self):
+    """
+    <Purpose>
+      Get the data still buffered once all the compressed data was fed.
+
+    <Exceptions>
+      tuf.Error, if the compressed file was truncated.
+
+    <Return>
+      The rest of the decompressed data.
+
+    """
+
+    if self.compression == 'gzip':
+      # zlib does not tell whether the stream was complete.  A truncated
+      # file fails to load or to verify instead.
+      return self._decompressor.flush()
+
+    # bz2 and lzma decompressors refuse more input only once the end of
+    # the stream was reached.
+    try:
+      self._decompressor.decompress('')
+    except EOFError:
+      return ''
+
+    raise tuf.Error('Truncated '+self.compression+' data.')
+
+
+
+
+
+def get_supported_compressions():
+  """
+  <Purpose>
+    Get the compressions StreamDecompressor supports.
+
+  <Return>
+    A list of compression names, e.g. ['gzip', 'bz2'].
+
+  """
+
+  compressions = ['gzip', 'bz2']
+  if lzma is not None:
+    compressions.append('xz')
+
+  return compressions
+
+
 
 
 
@@ -301,8 +670,8 @@ def get_file_details(file_path, repository_directory=None):
   """
   <Purpose>
     To get file's length and hash information.  The hash is computed using
-    sha256 algorithm.  This function is used in signerlib.py and updater.py
-    modules.
+    sha256 algorithm, unless it is in the hash cache (see tuf.hashcache).
+    This function is used in signerlib.py and updater.py modules.
 
   <Arguments>
     file_path:
@@ -331,8 +700,7 @@ def get_file_details(file_path, repository_directory=None):
   file_length = os.path.getsize(file_path)
 
   # Obtaining hash of the file.
-  digest_object = tuf.hash.digest_filename(file_path, algorithm='sha256')
-  file_hash = {'sha256' : digest_object.hexdigest()}
+  file_hash = {'sha256' : tuf.hashcache.get_hexdigest(file_path, 'sha256')}
 
   # Performing a format check to ensure 'file_hash' corresponds HASHDICT_SCHEMA.
   # Raise 'tuf.FormatError' if there is a mismatch.
@@ -344,6 +712,49 @@ def get_file_details(file_path, repository_directory=None):
 
 
 
+def get_files_details(file_paths):
+  """
+  <Purpose>
+    To get the length and hash information of many files at once, as with
+    get_file_details().  The files are hashed concurrently (see
+    tuf.hash.digest_filenames()).
+
+  <Arguments>
+    file_paths:
+      A list of file paths, absolute or relative to the current working
+      directory.
+
+  <Exceptions>
+    tuf.FormatError: If 'file_paths' is improperly formatted.
+    tuf.Error: If one of the files does not exist or cannot be read.
+
+  <Returns>
+    A dictionary that maps each of 'file_paths' to a (length, hashes) tuple.
+
+  """
+
+  tuf.formats.RELPATHS_SCHEMA.check_match(file_paths)
+
+  filename_algorithms = {}
+  for file_path in file_paths:
+    filename_algorithms[file_path] = ['sha256']
+  hexdigests = tuf.hashcache.get_hexdigests(filename_algorithms)
+
+  files_details = {}
+  for file_path in file_paths:
+    if hexdigests[file_path] is None:
+      raise tuf.Error, 'Path '+repr(file_path)+' could not be read.'
+    file_length = os.path.getsize(file_path)
+    file_hash = {'sha256': hexdigests[file_path]['sha256']}
+    tuf.formats.HASHDICT_SCHEMA.check_match(file_hash)
+    files_details[file_path] = (file_length, file_hash)
+
+  return files_details
+
+
+
+
+
 def ensure_parent_dir(filename):
   """
   <Purpose>
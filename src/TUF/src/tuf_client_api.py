@@ -18,6 +18,8 @@
 """
 
 import os
+import threading
+import time
 #import logging
 import tuf.conf
 import tuf.mirrorlist
@@ -33,6 +35,123 @@ TARGETS_DESTINATION_DIR = 'targets'
 #modifying TARGETS_DESTINATION_DIR to include into clients subdir
 TARGETS_DESTINATION_DIR = os.path.join(tuf.conf.repository_directory,TARGETS_DESTINATION_DIR)
 
+# The number of seconds the top-level metadata of the repository session
+# is trusted before it is refreshed again.  If None, the metadata is only
+# refreshed once per update session (see start_update_session()).
+METADATA_REFRESH_INTERVAL = 60
+
+
+
+
+
+class RepositorySession:
+  """
+  <Purpose>
+    Keep a single tuf.client.updater.Repository alive across requests.
+    Constructing a Repository parses all the current and previous metadata
+    and refresh() downloads the top-level metadata, so both are done at
+    most once per freshness window instead of once per target.
+
+    The Repository is not thread safe; callers hold 'lock' while they
+    use it.
+  """
+
+  def __init__(self, refresh_interval=METADATA_REFRESH_INTERVAL):
+    self.refresh_interval = refresh_interval
+    self.lock = threading.RLock()
+    self._repository = None
+    self._last_refresh = None
+
+
+
+  def get_repository(self):
+    """
+    <Purpose>
+      Return the repository, creating it and refreshing its top-level
+      metadata if needed.  The caller must hold 'lock'.
+
+    <Exceptions>
+      tuf.RepositoryError, tuf.ExpiredMetadataError if the metadata cannot
+      be refreshed.
+
+    <Return>
+      A refreshed tuf.client.updater.Repository.
+    """
+
+    if self._repository is None:
+      repository_mirrors = get_mirrors()
+      self._repository = tuf.client.updater.Repository('repository',
+                                                       repository_mirrors)
+      self._last_refresh = None
+
+    now = time.time()
+    if self._last_refresh is None or (self.refresh_interval is not None and
+        now - self._last_refresh >= self.refresh_interval):
+      self._repository.refresh()
+      self._last_refresh = now
+
+    return self._repository
+
+
+
+  def expire(self):
+    """
+    <Purpose>
+      Force a metadata refresh the next time the repository is used.
+
+    <Return>
+      None.
+    """
+
+    self.lock.acquire()
+    try:
+      self._last_refresh = None
+    finally:
+      self.lock.release()
+
+
+
+  def reset(self):
+    """
+    <Purpose>
+      Drop the repository, it is constructed again the next time it is
+      used.  Needed when the mirrors or the key and role databases change.
+
+    <Return>
+      None.
+    """
+
+    self.lock.acquire()
+    try:
+      self._repository = None
+      self._last_refresh = None
+    finally:
+      self.lock.release()
+
+
+
+
+
+# The session shared by every caller of this module.
+repository_session = RepositorySession()
+
+
+
+
+
+def start_update_session():
+  """
+  <Purpose>
+    Mark the start of an update session, e.g. when the software updater
+    connects to its update server.  The metadata is refreshed on the next
+    request regardless of METADATA_REFRESH_INTERVAL.
+
+  <Return>
+    None.
+  """
+
+  repository_session.expire()
+
 def update_mirrorlist(url):
   """
   <Purpose>
@@ -52,10 +171,10 @@ def update_mirrorlist(url):
 
   <Side Effects>
     A new mirrorlist file is downloaded and stored at {...}/metadata/current/
-    directory.
+    directory, if it changed since the last update.
 
   <Return>
-    None.
+    True if a new mirrorlist was installed, False otherwise.
 
   """
   
@@ -63,7 +182,18 @@ def update_mirrorlist(url):
     url +="/metadata/mirrorlist.txt"
   
   metadata_dir = os.path.join(tuf.conf.repository_directory, 'metadata')
-  tuf.mirrorlist.update_mirrorlist(url, metadata_dir)
+
+  # Installing a new mirrorlist may rebuild the key and role databases and
+  # changes the mirrors, so the repository session has to start over.
+  repository_session.lock.acquire()
+  try:
+    mirrorlist_updated = tuf.mirrorlist.update_mirrorlist(url, metadata_dir)
+    if mirrorlist_updated:
+      repository_session.reset()
+  finally:
+    repository_session.lock.release()
+
+  return mirrorlist_updated
 
 
 
@@ -120,7 +250,7 @@ def perform_an_update(target_path=None,
       A directory where the target files are stored/saved.
 
   <Side Effects>
-    All metadata files are updated with previous versions of metadata saved
+    All metadata files are updated, if the repository session is stale, with previous versions of metadata saved
     at {...}/metadata/previous/ directory.  Target file(s) are downloaded and
     stored at the 'destination_directory'.
 
@@ -128,16 +258,27 @@ def perform_an_update(target_path=None,
     None.
 
   """
-  # Create the repository object using the repository name 'repository'
-  # and the repository mirrors.
-  repository_mirrors = get_mirrors()
-  repository = tuf.client.updater.Repository('repository', repository_mirrors)
-  targets = []
+  repository_session.lock.acquire()
+  try:
+    return _perform_an_update(target_path, destination_directory)
+  finally:
+    repository_session.lock.release()
+
+
 
-  # Refresh the repository's top-level roles, store the target information for
-  # all the targets tracked, and determine which of these targets have been
-  # updated.
-  repository.refresh()
+
+
+def _perform_an_update(target_path, destination_directory):
+  """
+  <Purpose>
+    Do the work of perform_an_update() with the session lock held.
+  """
+
+  # Get the repository of the session, its top-level roles are refreshed
+  # if they are stale.  Store the target information for all the targets
+  # tracked, and determine which of these targets have been updated.
+  repository = repository_session.get_repository()
+  targets = []
 
   if target_path is not None:
     target = repository.target(target_path)
@@ -154,10 +295,12 @@ def perform_an_update(target_path=None,
     return resp
     #resp = os.path.join(os.path.abspath(destination_directory), target_path)
  
-  # Download each of these updated targets and save them locally.
-  for target in updated_targets: 
-    resp = repository.download_target(target, destination_directory)
-    #11/21/2012. Return contents of update to TUFTranslator (simple approach)
+  # Download all of these updated targets concurrently and save them locally.
+  download_errors = repository.download_targets(updated_targets,
+                                                destination_directory)
+  for target in updated_targets:
+    if download_errors[target['filepath']] is not None:
+      raise download_errors[target['filepath']]
    
   if resp is not None:
     try:
@@ -168,3 +311,94 @@ def perform_an_update(target_path=None,
     except:
       pass #this should never be an issue
   return resp
+
+
+
+
+
+def update_target(target_path, destination_directory=TARGETS_DESTINATION_DIR,
+                  download=True):
+  """
+  <Purpose>
+    Make sure the metadata of the repository session is fresh and the
+    local copy of 'target_path' matches the trusted metadata, downloading
+    it if it is missing or out of date.  Unlike perform_an_update(), the
+    target is not read into memory; its location is returned so callers
+    can stream it.
+
+  <Arguments>
+    target_path:
+      The target file to update, relative to the 'targets_path' of the
+      mirrors.
+
+    destination_directory:
+      A directory where the target files are stored/saved.
+
+    download:
+      If False, only the trusted file information of the target is looked
+      up and the local copy is left as it is.
+
+  <Exceptions>
+    tuf.RepositoryError, if 'target_path' is not a known target.
+
+    tuf.DownloadError and the other tuf.Error subclasses if the metadata
+    or the target cannot be updated.
+
+  <Side Effects>
+    The metadata files are updated if the repository session is stale.
+    The target file is downloaded and
+    stored at the 'destination_directory' if it has changed.
+
+  <Return>
+    A tuple of the absolute path of the verified target file and its
+    trusted file information, conformant to 'tuf.formats.FILEINFO_SCHEMA'.
+
+  """
+
+  repository_session.lock.acquire()
+  try:
+    repository = repository_session.get_repository()
+    target = repository.target(target_path)
+
+    if download:
+      updated_targets = repository.updated_targets([target], destination_directory)
+
+      for updated_target in updated_targets:
+        repository.download_target(updated_target, destination_directory)
+  finally:
+    repository_session.lock.release()
+
+  target_filepath = os.path.join(destination_directory, target['filepath'])
+  return (os.path.abspath(target_filepath), target['fileinfo'])
+
+
+
+
+
+def remove_obsolete_targets(destination_directory=TARGETS_DESTINATION_DIR):
+  """
+  <Purpose>
+    Remove the target files that are no longer listed by the repository.
+    With 'tuf.conf.use_target_store' set, the targets no destination uses
+    any more are removed from the target store too.
+
+  <Arguments>
+    destination_directory:
+      A directory where the target files are stored/saved.
+
+  <Side Effects>
+    The metadata files are updated if the repository session is stale.
+    Target files are removed from 'destination_directory' and the target
+    store.
+
+  <Return>
+    None.
+
+  """
+
+  repository_session.lock.acquire()
+  try:
+    repository = repository_session.get_repository()
+    repository.remove_obsolete_targets(destination_directory)
+  finally:
+    repository_session.lock.release()
@@ -0,0 +1,277 @@
+"""
+<Program Name>
+  http_response.py
+
+<Date Started>
+  October 18th, 2026
+
+<Purpose>
+  Parse the HTTP requests a software updater sends on an intercepted
+  update socket and synthesize the status line and headers of the reply,
+  so that updaters built on httplib or urllib get a well formed HTTP/1.0
+  or HTTP/1.1 response for the targets TUF serves.
+
+  Requests without a version, or for HTTP/0.9, get no status line or
+  headers at all, just like an HTTP/0.9 server would reply.
+
+<Usage>
+  http_request = parse_request("GET /moo.txt HTTP/1.1\r\nHost: a\r\n\r\n")
+
+  header = make_response_header(http_request, 200,
+                                [('Content-Length', 13)])
+"""
+
+
+import email.utils
+
+
+# The version used for replies to requests that have no version.
+SIMPLE_REQUEST_VERSION = 'HTTP/0.9'
+
+STATUS_REASONS = {
+  200 : 'OK',
+  304 : 'Not Modified',
+  400 : 'Bad Request',
+  404 : 'Not Found',
+  501 : 'Not Implemented',
+  503 : 'Service Unavailable'
+}
+
+# The methods that can be answered for a TUF target.
+SUPPORTED_METHODS = ('GET', 'HEAD')
+
+
+
+
+
+class HttpRequest:
+  """
+  <Purpose>
+    A parsed HTTP request.
+
+  <Attributes>
+    method - the request method, e.g. 'GET'.
+
+    path - the requested path, without the leading '/'.
+
+    version - the HTTP version, e.g. 'HTTP/1.1'.
+
+    headers - a dict of the request headers, keyed by lower case name.
+  """
+
+  def __init__(self, method, path, version, headers):
+    self.method = method
+    self.path = path
+    self.version = version
+    self.headers = headers
+
+
+
+  def is_simple(self):
+    """
+    <Purpose>
+      Check whether the request expects a bare HTTP/0.9 reply.
+
+    <Return>
+      True if no status line or headers should be sent.
+    """
+
+    return self.version == SIMPLE_REQUEST_VERSION
+
+
+
+  def keep_alive(self):
+    """
+    <Purpose>
+      Check whether the connection stays open after the reply.
+      HTTP/1.1 connections are persistent unless the client asks to close
+      them, HTTP/1.0 connections only if the client asks to keep them.
+
+    <Return>
+      True if the connection is kept alive.
+    """
+
+    connection = self.headers.get('connection', '').lower()
+
+    if self.version == 'HTTP/1.1':
+      return connection != 'close'
+
+    return connection == 'keep-alive'
+
+
+
+  def etag_matches(self, etag):
+    """
+    <Purpose>
+      Check the 'If-None-Match' header of a conditional GET against the
+      entity tag of the target.
+
+    <Arguments>
+      etag - the quoted entity tag of the target.
+
+    <Return>
+      True if the client already has the target.
+    """
+
+    if_none_match = self.headers.get('if-none-match')
+    if if_none_match is None:
+      return False
+
+    for client_etag in if_none_match.split(','):
+      client_etag = client_etag.strip()
+
+      # Weak comparison, the content of a target never changes
+      # without its hash changing.
+      if client_etag.startswith('W/'):
+        client_etag = client_etag[2:]
+
+      if client_etag == '*' or client_etag == etag:
+        return True
+
+    return False
+
+
+
+
+
+def parse_request(msg):
+  """
+  <Purpose>
+    Parse the request line and headers of an HTTP request.
+
+  <Arguments>
+    msg - the data the software updater sent.
+
+  <Return>
+    An HttpRequest, or None if msg does not start with a request line.
+  """
+
+  head = msg.split('\r\n\r\n', 1)[0].split('\n\n', 1)[0]
+  lines = head.split('\n')
+
+  request_components = lines[0].split()
+  if len(request_components) < 2:
+    return None
+
+  method = request_components[0].upper()
+  path = request_components[1]
+  if len(request_components) > 2:
+    version = request_components[2].upper()
+  else:
+    version = SIMPLE_REQUEST_VERSION
+
+  # Remove the initial, unnecessary '/'.
+  if path.startswith('/'):
+    path = path[1:]
+
+  headers = {}
+  for line in lines[1:]:
+    if ':' not in line:
+      continue
+    name, value = line.split(':', 1)
+    headers[name.strip().lower()] = value.strip()
+
+  return HttpRequest(method, path, version, headers)
+
+
+
+
+
+def make_etag(fileinfo):
+  """
+  <Purpose>
+    Build the entity tag of a target from its trusted file information.
+    The sha256 hash is used if the metadata lists it.
+
+  <Arguments>
+    fileinfo - the target's file information, conformant to
+      'tuf.formats.FILEINFO_SCHEMA'.
+
+  <Return>
+    The quoted entity tag.
+  """
+
+  hashes = fileinfo['hashes']
+
+  if 'sha256' in hashes:
+    digest = hashes['sha256']
+  else:
+    algorithm = sorted(hashes)[0]
+    digest = algorithm + '-' + hashes[algorithm]
+
+  return '"' + digest + '"'
+
+
+
+
+
+def make_response_header(http_request, status, headers=()):
+  """
+  <Purpose>
+    Build the status line and headers of the reply to http_request.
+    The Date, Server and Connection headers are added.
+
+  <Arguments>
+    http_request - the HttpRequest being answered.
+
+    status - the status code.
+
+    headers - a list of (name, value) tuples.
+
+  <Return>
+    The header string, terminated by an empty line.  An empty string
+    for HTTP/0.9 requests.
+  """
+
+  if http_request.is_simple():
+    return ''
+
+  # We speak HTTP/1.1 to clients that do, HTTP/1.0 to everybody else.
+  if http_request.version == 'HTTP/1.1':
+    response_version = 'HTTP/1.1'
+  else:
+    response_version = 'HTTP/1.0'
+
+  if http_request.keep_alive():
+    connection = 'keep-alive'
+  else:
+    connection = 'close'
+
+  header_lines = ['%s %d %s' % (response_version, status, STATUS_REASONS[status])]
+  header_lines.append('Date: ' + email.utils.formatdate(usegmt=True))
+  header_lines.append('Server: TUF-Interposition')
+
+  for name, value in headers:
+    header_lines.append('%s: %s' % (name, value))
+
+  header_lines.append('Connection: ' + connection)
+
+  return '\r\n'.join(header_lines) + '\r\n\r\n'
+
+
+
+
+
+def make_error_response(http_request, status):
+  """
+  <Purpose>
+    Build a complete error reply with a short text body.
+
+  <Arguments>
+    http_request - the HttpRequest being answered.
+
+    status - the status code.
+
+  <Return>
+    The reply string.
+  """
+
+  body = '%d %s\n' % (status, STATUS_REASONS[status])
+  header = make_response_header(http_request, status,
+                                [('Content-Type', 'text/plain'),
+                                 ('Content-Length', len(body))])
+
+  if http_request.method == 'HEAD':
+    return header
+
+  return header + body
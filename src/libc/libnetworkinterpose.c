@@ -6,6 +6,7 @@
 #include <stdio.h>
 #include <stdarg.h>
 #include <stdlib.h>
+#include <stdint.h>
 #include <string.h>
 #include <unistd.h>
 #include <pthread.h>
@@ -46,6 +47,54 @@ typedef struct proxy_response
 } PROXY_REPLY;
 
 
+/* The framed protocol version this library speaks and the opcodes
+ * of the calls. These must match src/libnit_protocol.py.
+ */
+#define FRAME_VERSION 1
+
+#define OP_SOCKET 1
+#define OP_CONNECT 2
+#define OP_LISTEN 3
+#define OP_ACCEPT 4
+#define OP_BIND 5
+#define OP_SEND 6
+#define OP_RECV 7
+#define OP_SENDTO 8
+#define OP_RECVFROM 9
+#define OP_CLOSE 13
+
+
+/* Header of a framed request. It is followed by arg_count int64
+ * arguments and then the raw payload. body_len counts everything
+ * that follows the header.
+ */
+typedef struct frame_header
+{
+  uint32_t body_len;
+  uint8_t version;
+  uint8_t opcode;
+  uint16_t arg_count;
+  int32_t fd;
+} __attribute__((packed)) FRAME_HEADER;
+
+
+/* Header of a framed reply. It is followed by payload_len bytes. */
+typedef struct frame_reply_header
+{
+  uint32_t payload_len;
+  int32_t err_val;
+  int64_t ret_val;
+} __attribute__((packed)) FRAME_REPLY_HEADER;
+
+
+/* The framed protocol version negotiated on each proxy socket, 0 if
+ * the proxy only understands the legacy FUNCSTRUCT.
+ */
+int frame_version_dict[1024];
+
+#define FRAMED(sockfd) (frame_version_dict[(sockfd) % MAX_SOCK_FD] > 0)
+
+
 
 
 /* List of all the calls we are going to interpose on. */
@@ -105,6 +154,7 @@ ssize_t (*libc_recv)(int, void*, size_t, int);
 
 /* Define the serializing functions. */
 void serialize_sockaddr(struct sockaddr* address, char* result_buf);
+void sockaddr_to_args(const struct sockaddr* address, int64_t* args);
 void serialize_msghdr(struct msghdr* message, char* result_buf);
 void serialize_iovec(struct iovec* msg_iov, char* result_buf);
 
@@ -173,6 +223,7 @@ void forward_api_to_proxy(int sockfd, char* func_call, char* arg_list, char* res
  
   /* Receive the response back from the Repy proxy server. */
   char recv_buf[RECV_SIZE];
+  memset(recv_buf, 0, RECV_SIZE);
   (*libc_recv)(sockfd, recv_buf, RECV_SIZE, 0);
 
   /* Build the reply structure from the response. */
@@ -184,6 +235,123 @@ void forward_api_to_proxy(int sockfd, char* func_call, char* arg_list, char* res
 
 
 
+/* Send or receive exactly len bytes on sockfd. Returns 0 on success
+ * and -1 if the connection failed.
+ */
+int send_all(int sockfd, const void* buf, size_t len)
+{
+  size_t total = 0;
+
+  while (total < len) {
+    ssize_t sent = (*libc_send)(sockfd, (const char*) buf + total, len - total, 0);
+    if (sent <= 0)
+      return -1;
+    total += sent;
+  }
+
+  return 0;
+}
+
+
+int recv_all(int sockfd, void* buf, size_t len)
+{
+  size_t total = 0;
+
+  while (total < len) {
+    ssize_t received = (*libc_recv)(sockfd, (char*) buf + total, len - total, 0);
+    if (received <= 0)
+      return -1;
+    total += received;
+  }
+
+  return 0;
+}
+
+
+
+
+/* Forward a call to the proxy using the framed protocol. At most
+ * result_size bytes of the reply payload are copied into result_buffer
+ * (the rest is discarded) and the buffer is null terminated if there is
+ * room left. The integer return value and error of the call are placed
+ * in ret_val and error_value. Returns the number of bytes copied.
+ */
+size_t forward_frame_to_proxy(int sockfd, int opcode, int fd, int arg_count,
+                              const int64_t* args, const void* payload,
+                              size_t payload_len, char* result_buffer,
+                              size_t result_size, int64_t* ret_val,
+                              int* error_value)
+{
+  FRAME_HEADER header;
+  FRAME_REPLY_HEADER reply;
+  char discard[RECV_SIZE];
+  size_t copy_len, remaining, chunk;
+
+  header.body_len = arg_count * sizeof(int64_t) + payload_len;
+  header.version = frame_version_dict[sockfd % MAX_SOCK_FD];
+  header.opcode = opcode;
+  header.arg_count = arg_count;
+  header.fd = fd;
+
+  /* Report a reset connection unless we get a full reply. */
+  *ret_val = -1;
+  *error_value = ECONNRESET;
+
+  if (send_all(sockfd, &header, sizeof(header)) < 0 ||
+      send_all(sockfd, args, arg_count * sizeof(int64_t)) < 0 ||
+      send_all(sockfd, payload, payload_len) < 0)
+    return 0;
+
+  if (recv_all(sockfd, &reply, sizeof(reply)) < 0)
+    return 0;
+
+  copy_len = reply.payload_len < result_size ? reply.payload_len : result_size;
+  if (recv_all(sockfd, result_buffer, copy_len) < 0)
+    return 0;
+
+  /* Throw away whatever does not fit in the result buffer. */
+  remaining = reply.payload_len - copy_len;
+  while (remaining > 0) {
+    chunk = remaining < sizeof(discard) ? remaining : sizeof(discard);
+    if (recv_all(sockfd, discard, chunk) < 0)
+      return 0;
+    remaining -= chunk;
+  }
+
+  if (copy_len < result_size)
+    result_buffer[copy_len] = '\0';
+
+  *ret_val = reply.ret_val;
+  *error_value = reply.err_val;
+
+  return copy_len;
+}
+
+
+
+
+/* Ask the proxy, using the legacy format, whether it understands the
+ * framed protocol. Returns the negotiated version, or 0 if the proxy
+ * only understands the legacy format.
+ */
+int negotiate_frame_version(int sockfd)
+{
+  char arg_list[20] = "";
+  char recv_buf[RECV_SIZE];
+  int err_val;
+
+  my_itoa(FRAME_VERSION, arg_list, 10);
+  forward_api_to_proxy(sockfd, "hello", arg_list, recv_buf, &err_val);
+
+  if (err_val < 0)
+    return atoi(recv_buf);
+  else
+    return 0;
+}
+
+
+
+
 // ######################## CREATE MASTER SOCKET ###############################
 
 int init_master_sock() 
@@ -234,6 +402,9 @@ int init_master_sock()
     perror("Unable to connect to the Repy proxy.");
   }
 
+  /* Find out whether the proxy understands the framed protocol. */
+  frame_version_dict[mastersockfd % MAX_SOCK_FD] = negotiate_frame_version(mastersockfd);
+
 
   return mastersockfd;
 }
@@ -249,6 +420,23 @@ int socket(int domain, int type, int protocol)
   /* Initialize everything and create the master socket */
   int sockfd = init_master_sock();
 
+  if (FRAMED(sockfd)) {
+    int64_t args[3] = {domain, type, protocol};
+    char recv_buf[RECV_SIZE];
+    int64_t ret_val;
+    int err_val;
+
+    forward_frame_to_proxy(sockfd, OP_SOCKET, -1, 3, args, NULL, 0,
+                           recv_buf, RECV_SIZE, &ret_val, &err_val);
+
+    if (err_val < 0) {
+      socket_fd_dict[sockfd % MAX_SOCK_FD] = (int) ret_val;
+      return sockfd;
+    }
+    errno = err_val;
+    return -1;
+  }
+
   char arg_list[30] = "";
   char buf[20] = "";
 
@@ -293,6 +481,22 @@ int bind(int sockfd, const struct sockaddr *address, socklen_t address_len)
 
   int repy_sock_fd = socket_fd_dict[sockfd % MAX_SOCK_FD];
 
+  if (FRAMED(sockfd)) {
+    int64_t args[2];
+    char recv_buf[RECV_SIZE];
+    int64_t ret_val;
+    int err_val;
+
+    sockaddr_to_args(address, args);
+    forward_frame_to_proxy(sockfd, OP_BIND, repy_sock_fd, 2, args, NULL, 0,
+                           recv_buf, RECV_SIZE, &ret_val, &err_val);
+
+    if (err_val < 0)
+      return (int) ret_val;
+    errno = err_val;
+    return -1;
+  }
+
   memset(arg_list, 0, strlen(arg_list));
   memset(buf, 0, strlen(buf));
   my_itoa(repy_sock_fd, buf, 10);
@@ -335,7 +539,14 @@ int accept(int sockfd, struct sockaddr *address, socklen_t *address_len)
   int err_val;
 
   // Send the info to the Repy proxy server
-  forward_api_to_proxy(sockfd, "accept", arg_list, recv_buf, &err_val);
+  if (FRAMED(sockfd)) {
+    int64_t ret_val;
+
+    forward_frame_to_proxy(sockfd, OP_ACCEPT, repy_sock_fd, 0, NULL, NULL, 0,
+                           recv_buf, RECV_SIZE - 1, &ret_val, &err_val);
+  }
+  else
+    forward_api_to_proxy(sockfd, "accept", arg_list, recv_buf, &err_val);
 
   if (err_val < 0) {
     /* If we were successful, then we create a new connection to the
@@ -367,6 +578,22 @@ int connect(int sockfd, const struct sockaddr *address, socklen_t address_len)
 
   int repy_sock_fd = socket_fd_dict[sockfd % MAX_SOCK_FD];
 
+  if (FRAMED(sockfd)) {
+    int64_t args[2];
+    char recv_buf[RECV_SIZE];
+    int64_t ret_val;
+    int err_val;
+
+    sockaddr_to_args(address, args);
+    forward_frame_to_proxy(sockfd, OP_CONNECT, repy_sock_fd, 2, args, NULL, 0,
+                           recv_buf, RECV_SIZE, &ret_val, &err_val);
+
+    if (err_val < 0)
+      return (int) ret_val;
+    errno = err_val;
+    return -1;
+  }
+
   memset(arg_list, 0, strlen(arg_list));
   memset(buf, 0, strlen(buf));
   my_itoa(repy_sock_fd, buf, 10);
@@ -400,6 +627,21 @@ int listen(int sockfd, int backlog)
 
   int repy_sock_fd = socket_fd_dict[sockfd % MAX_SOCK_FD];
 
+  if (FRAMED(sockfd)) {
+    int64_t args[1] = {backlog};
+    char recv_buf[RECV_SIZE];
+    int64_t ret_val;
+    int err_val;
+
+    forward_frame_to_proxy(sockfd, OP_LISTEN, repy_sock_fd, 1, args, NULL, 0,
+                           recv_buf, RECV_SIZE, &ret_val, &err_val);
+
+    if (err_val < 0)
+      return (int) ret_val;
+    errno = err_val;
+    return -1;
+  }
+
   memset(arg_list, 0, strlen(arg_list));
   memset(buf, 0, strlen(buf));
   my_itoa(repy_sock_fd, buf, 10);
@@ -430,11 +672,26 @@ int listen(int sockfd, int backlog)
 
 ssize_t send(int sockfd, const void *message, size_t length, int flags)
 {
+  int repy_sock_fd = socket_fd_dict[sockfd % MAX_SOCK_FD];
+
+  if (FRAMED(sockfd)) {
+    int64_t args[1] = {flags};
+    char recv_buf[RECV_SIZE];
+    int64_t ret_val;
+    int err_val;
+
+    forward_frame_to_proxy(sockfd, OP_SEND, repy_sock_fd, 1, args, message, length,
+                           recv_buf, RECV_SIZE, &ret_val, &err_val);
+
+    if (err_val < 0)
+      return (ssize_t) ret_val;
+    errno = err_val;
+    return -1;
+  }
+
   char arg_list[(int)length + 20];
   char buf[20] = "";
 
-  int repy_sock_fd = socket_fd_dict[sockfd % MAX_SOCK_FD];
-
   memset(arg_list, 0, strlen(arg_list));
   memset(buf, 0, strlen(buf));
   my_itoa(repy_sock_fd, buf, 10);
@@ -471,11 +728,28 @@ ssize_t send(int sockfd, const void *message, size_t length, int flags)
 ssize_t sendto(int sockfd, const void *message, size_t length, int flags,
              const struct sockaddr *dest_addr, socklen_t dest_len)
 {
+  int repy_sock_fd = socket_fd_dict[sockfd % MAX_SOCK_FD];
+
+  if (FRAMED(sockfd)) {
+    int64_t args[3];
+    char recv_buf[RECV_SIZE];
+    int64_t ret_val;
+    int err_val;
+
+    args[0] = flags;
+    sockaddr_to_args(dest_addr, args + 1);
+    forward_frame_to_proxy(sockfd, OP_SENDTO, repy_sock_fd, 3, args, message,
+                           length, recv_buf, RECV_SIZE, &ret_val, &err_val);
+
+    if (err_val < 0)
+      return (ssize_t) ret_val;
+    errno = err_val;
+    return -1;
+  }
+
   char arg_list[(int)length + 50];
   char buf[20] = "";
 
-  int repy_sock_fd = socket_fd_dict[sockfd % MAX_SOCK_FD];
-
   memset(arg_list, 0, strlen(arg_list));
   memset(buf, 0, strlen(buf));
   my_itoa(repy_sock_fd, buf, 10);
@@ -514,6 +788,23 @@ ssize_t recv(int sockfd, void *buffer, size_t length, int flags)
 
   int repy_sock_fd = socket_fd_dict[sockfd % MAX_SOCK_FD];
 
+  if (FRAMED(sockfd)) {
+    int64_t args[2] = {(int64_t) length, flags};
+    int64_t ret_val;
+    int err_val;
+    size_t received;
+
+    /* The payload is binary safe, so it goes straight into buffer. */
+    received = forward_frame_to_proxy(sockfd, OP_RECV, repy_sock_fd, 2, args,
+                                      NULL, 0, (char*) buffer, length,
+                                      &ret_val, &err_val);
+
+    if (err_val < 0)
+      return (ssize_t) received;
+    errno = err_val;
+    return (ssize_t) -1;
+  }
+
   memset(arg_list, 0, strlen(arg_list));
   memset(buf, 0, strlen(buf));
   my_itoa(repy_sock_fd, buf, 10);
@@ -578,7 +869,15 @@ ssize_t recvfrom(int sockfd, void *buffer, size_t length,
   char recv_buf[length + 50];
 
   // Send the info to the Repy proxy server
-  forward_api_to_proxy(sockfd, "recvfrom", arg_list, recv_buf, &err_val);
+  if (FRAMED(sockfd)) {
+    int64_t args[2] = {(int64_t) length, flags};
+    int64_t ret_val;
+
+    forward_frame_to_proxy(sockfd, OP_RECVFROM, repy_sock_fd, 2, args, NULL, 0,
+                           recv_buf, length + 49, &ret_val, &err_val);
+  }
+  else
+    forward_api_to_proxy(sockfd, "recvfrom", arg_list, recv_buf, &err_val);
 
 
   /* Check to make sure there was no error. */
@@ -971,7 +1270,15 @@ int close(int sockfd)
   int err_val;
 
   // Send the info to the Repy proxy server
-  forward_api_to_proxy(sockfd, "close", arg_list, recv_buf, &err_val);
+  if (FRAMED(sockfd)) {
+    int64_t ret_val;
+
+    forward_frame_to_proxy(sockfd, OP_CLOSE, repy_sock_fd, 0, NULL, NULL, 0,
+                           recv_buf, RECV_SIZE, &ret_val, &err_val);
+    sprintf(recv_buf, "%lld", (long long) ret_val);
+  }
+  else
+    forward_api_to_proxy(sockfd, "close", arg_list, recv_buf, &err_val);
 
   if (err_val == ERRBADFD)
     return (*libc_close)(sockfd);
@@ -1011,6 +1318,19 @@ void serialize_sockaddr(struct sockaddr* address, char* result_buf)
 
 
 
+/* Place the IPv4 address (in host byte order) and the port of address
+ * in the first two integer arguments of a framed request.
+ */
+void sockaddr_to_args(const struct sockaddr* address, int64_t* args)
+{
+  const struct sockaddr_in* tmp_addr = (const struct sockaddr_in*) address;
+
+  args[0] = (int64_t) ntohl(tmp_addr->sin_addr.s_addr);
+  args[1] = (int64_t) ntohs(tmp_addr->sin_port);
+}
+
+
+
 // ============================= Deserialize Function =====================
 
 void deserialize_proxy_msg(PROXY_REPLY* replystruct, char* result_buffer, int* error_value)
@@ -49,22 +49,53 @@
     interpose_listener = LibnitListener(sample_process_func)
     interpose_listener.serve_forever()
 
+  By default every libnit connection is served by its own thread. When
+  many interposed processes run on one host, the listener can instead
+  multiplex all the connections on a single epoll loop and process the
+  network calls on a bounded pool of worker threads:
+
+    interpose_listener = LibnitListener(sample_process_func,
+                                        event_driven=True, worker_count=16)
+    interpose_listener.serve_forever()
+
 
 <History>
   10/27/2012 - First implementation of LibnitListener.
+  10/18/2026 - Buffered reads and the negotiated framed protocol
+               (see libnit_protocol.py).
+  10/18/2026 - Added the event driven mode.
 """
 
 
+import errno
+import os
+import Queue
+import select
 import socket
 import struct
 import threading
 import traceback
 
+import libnit_protocol
+
 
 # Define some global values and errorcodes.
 ECONNRESET = 104
 EBADF = 9
 
+# The number of worker threads used to process network calls
+# in the event driven mode.
+DEFAULT_WORKER_COUNT = 16
+
+# The order in which the network call processor takes the arguments of a
+# call, as indices into libnit_protocol.CALL_ARGUMENTS. Calls that are not
+# listed take their arguments in the order they are sent.
+PROCESSOR_ARGUMENT_ORDER = {
+  'socket' : (0, 1),
+  'send' : (0, 2, 1),
+  'sendto' : (0, 4, 1, 2, 3)
+}
+
 
 class LibnitListener():
   # LibnitListener is a module that is used to listen and process
@@ -72,7 +103,8 @@ class LibnitListener():
   # on network calls on an application.
 
 
-  def __init__(self, network_call_processor, libnit_port = 53678, debug_mode=False):
+  def __init__(self, network_call_processor, libnit_port = 53678, debug_mode=False,
+               event_driven=False, worker_count=DEFAULT_WORKER_COUNT):
     """
     <Purpose>
       Initialize LibnitListener with a network call processor.
@@ -82,6 +114,12 @@ class LibnitListener():
         be used to process network calls. Take a look at the 
         NetworkCallProcessor class to understand
         which calls need to be defined.
+
+      event_driven - If True, serve all the libnit connections on a
+        single event loop instead of a thread per connection.
+
+      worker_count - The number of threads that process network calls
+        when event_driven is set.
   
     <Exceptions>
       None
@@ -94,6 +132,21 @@ class LibnitListener():
     self.network_call_processor = network_call_processor
     self.libnit_port = libnit_port
     self.debug_mode = debug_mode
+    self.event_driven = event_driven
+    self.worker_count = worker_count
+
+    # Look up the process method and build the argument decoders for
+    # every network call once, so a request only needs a dict lookup.
+    self.call_dispatch = {}
+    self.opcode_dispatch = {}
+    for call_name in libnit_protocol.CALL_ARGUMENTS:
+      argument_order = PROCESSOR_ARGUMENT_ORDER.get(call_name)
+      process_method = getattr(self.network_call_processor, "call_" + call_name)
+
+      self.call_dispatch[call_name] = (process_method,
+        libnit_protocol.make_legacy_decoder(call_name, argument_order))
+      self.opcode_dispatch[libnit_protocol.CALL_OPCODES[call_name]] = (process_method,
+        libnit_protocol.make_frame_decoder(call_name, argument_order))
 
 
 
@@ -119,10 +172,16 @@ class LibnitListener():
     # all the network requests that Libnit makes.
     libnit_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     libnit_sock.bind(('127.0.0.1', self.libnit_port))
-    libnit_sock.listen(1)
 
     print "Starting to listen on port '%d' for Libnit connections." % self.libnit_port
 
+    if self.event_driven:
+      libnit_sock.listen(socket.SOMAXCONN)
+      self.serve_event_loop(libnit_sock)
+      return
+
+    libnit_sock.listen(1)
+
     while True:
       (libnit_conn, libnit_addr) = libnit_sock.accept()
   
@@ -134,6 +193,178 @@ class LibnitListener():
 
 
 
+  def serve_event_loop(self, libnit_sock):
+    """
+    <Purpose>
+      Serve all the libnit connections on a single epoll (or poll) loop.
+      The loop only reads, buffers and writes; every complete request is
+      handed to a bounded pool of worker threads, since processing a
+      network call may block on the network or on TUF. Libnit waits for
+      the reply to a call before making the next one, so a connection has
+      at most one request being processed at any time.
+
+    <Arguments>
+      libnit_sock - the listening socket to accept libnit connections on.
+
+    <Exceptions>
+      Exceptions may be raised if we crash unexpectedly.
+
+    <Return>
+      None
+    """
+
+    if hasattr(select, 'epoll'):
+      poller = select.epoll()
+    else:
+      poller = select.poll()
+
+    # Workers hand finished replies back through this queue and wake up
+    # the loop by writing to the pipe.
+    finished_requests = Queue.Queue()
+    wakeup_read, wakeup_write = os.pipe()
+
+    worker_pool = LibnitWorkerPool(self.worker_count)
+
+    # All the open libnit connections, keyed by their file descriptor.
+    libnit_connections = {}
+
+    def process_in_worker(libnit_connection, request):
+      try:
+        serialized_response = self.process_request(request, libnit_connection.request_buffer)
+      except Exception:
+        if self.debug_mode:
+          print "Got a bad request: " + str(traceback.format_exc())
+        serialized_response = None
+
+      finished_requests.put((libnit_connection, serialized_response))
+      os.write(wakeup_write, 'x')
+
+
+    def close_connection(libnit_connection):
+      if libnit_connection.closed:
+        return
+
+      if self.debug_mode:
+        print "Connection has been closed on: " + str(libnit_connection.libnit_conn)
+
+      libnit_connection.closed = True
+      poller.unregister(libnit_connection.fileno)
+      del libnit_connections[libnit_connection.fileno]
+      libnit_connection.libnit_conn.close()
+
+
+    def dispatch_next_request(libnit_connection):
+      if libnit_connection.busy or libnit_connection.closed:
+        return
+
+      try:
+        request = libnit_connection.request_buffer.next_request()
+      except libnit_protocol.InvalidFrame:
+        close_connection(libnit_connection)
+        return
+
+      if request is None:
+        return
+
+      if self.debug_mode:
+        print "Received request: '%s'" % request
+
+      libnit_connection.busy = True
+      worker_pool.submit(process_in_worker, libnit_connection, request)
+
+
+    def flush_connection(libnit_connection):
+      try:
+        while libnit_connection.outgoing:
+          bytes_sent = libnit_connection.libnit_conn.send(libnit_connection.outgoing)
+          libnit_connection.outgoing = libnit_connection.outgoing[bytes_sent:]
+      except socket.error, err:
+        if err[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+          close_connection(libnit_connection)
+          return
+
+      # Only wait for the connection to become writable while there is
+      # something left to send.
+      if libnit_connection.outgoing:
+        poller.modify(libnit_connection.fileno, select.POLLIN | select.POLLOUT)
+      else:
+        poller.modify(libnit_connection.fileno, select.POLLIN)
+
+
+    libnit_sock.setblocking(0)
+    poller.register(libnit_sock.fileno(), select.POLLIN)
+    poller.register(wakeup_read, select.POLLIN)
+
+    while True:
+      try:
+        events = poller.poll()
+      except (IOError, select.error), err:
+        if err[0] == errno.EINTR:
+          continue
+        raise
+
+      for fileno, event in events:
+        # Accept all the pending libnit connections.
+        if fileno == libnit_sock.fileno():
+          while True:
+            try:
+              (libnit_conn, libnit_addr) = libnit_sock.accept()
+            except socket.error, err:
+              if err[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                break
+              raise
+
+            libnit_conn.setblocking(0)
+            libnit_connection = LibnitConnection(libnit_conn)
+            libnit_connections[libnit_connection.fileno] = libnit_connection
+            poller.register(libnit_connection.fileno, select.POLLIN)
+
+        # Send the replies of all the requests the workers have finished.
+        elif fileno == wakeup_read:
+          os.read(wakeup_read, 4096)
+
+          while not finished_requests.empty():
+            libnit_connection, serialized_response = finished_requests.get()
+            libnit_connection.busy = False
+
+            if libnit_connection.closed:
+              continue
+
+            if serialized_response is None:
+              close_connection(libnit_connection)
+              continue
+
+            if self.debug_mode:
+              print "Returning response: " + serialized_response
+
+            libnit_connection.outgoing += serialized_response
+            flush_connection(libnit_connection)
+            dispatch_next_request(libnit_connection)
+
+        elif fileno in libnit_connections:
+          libnit_connection = libnit_connections[fileno]
+
+          if event & select.POLLOUT:
+            flush_connection(libnit_connection)
+
+          if event & (select.POLLIN | select.POLLHUP | select.POLLERR):
+            try:
+              data = libnit_connection.libnit_conn.recv(libnit_protocol.RECV_CHUNK_SIZE)
+            except socket.error, err:
+              if err[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                continue
+              data = ''
+
+            if not data:
+              close_connection(libnit_connection)
+              continue
+
+            libnit_connection.request_buffer.feed(data)
+            dispatch_next_request(libnit_connection)
+
+
+
+
   def handle_network_requests(self, libnit_conn):
     """
     <Purpose>
@@ -150,50 +381,35 @@ class LibnitListener():
     <Return>
       None
     """
+    # Requests may be split up or coalesced by the network, so all the
+    # data received is buffered until a complete request is available.
+    request_buffer = libnit_protocol.LibnitRequestBuffer()
+
     # Continuously serve all the incoming network call requests.
-    # POSSIBLE BUG: I return from this function when libnit_conn
-    # raises an error on recv or send. Hopefully if the application
-    # closes then a socket.error would be raised. However if no error
-    # is raised when the application closes, then this thread may run
-    # forever.
     while True:
       # Receive the incoming request.
       try:
-        request = libnit_conn.recv(4096)
-      except:
+        request = request_buffer.read_request(libnit_conn)
+      except Exception:
         if self.debug_mode:
           print "Connection has been closed on: " + str(libnit_conn)
         return
 
-      if not request: 
-        continue
-
       if self.debug_mode:
         print "Received request: '%s'" % request
 
-      # Unwrap the request that the application made.
-      network_call_type, call_args = self.deserialize_network_call(request)
-    
       try:
-        return_response, return_err = self.make_network_request(network_call_type, call_args)
-      except Exception, err:
+        serialized_response = self.process_request(request, request_buffer)
+      except libnit_protocol.InvalidFrame:
         if self.debug_mode:
-          print "Got a bad error: " + str(traceback.format_exc())
-
-        # If there is any error at all then we just send back
-        # the ECONNRESET errorcode.
-        return_response = ""
-        return_err = ECONNRESET
-        
-      # Now that we have processed the network call, we are going to serialize
-      # the response and error codes from the call then return it back to libnit.
-      serialized_response = self.serialize_network_call_response(return_response, return_err)
+          print "Got a bad frame: " + str(traceback.format_exc())
+        return
 
       if self.debug_mode:
         print "Returning response: " + serialized_response
 
       try:
-        bytes_sent = libnit_conn.send(serialized_response)
+        libnit_conn.sendall(serialized_response)
       except:
         if self.debug_mode:
           print "Connection has been closed on: " + str(libnit_conn)
@@ -202,6 +418,93 @@ class LibnitListener():
 
 
 
+  def process_request(self, request, request_buffer):
+    """
+    <Purpose>
+      Unwrap a single request received from libnit, process the network
+      call and serialize the reply in the format the connection uses.
+      A legacy 'hello' call negotiates the framed format for the rest of
+      the connection.
+
+    <Arguments>
+      request - a complete request, as returned by request_buffer.
+
+      request_buffer - the LibnitRequestBuffer of the connection the
+        request was received on.
+
+    <Exception>
+      InvalidFrame is raised if a framed request is malformed.
+
+    <Return>
+      The serialized reply to send back to libnit.
+    """
+
+    framed = request_buffer.frame_version is not None
+
+    try:
+      # Unwrap the request that the application made and process it.
+      if framed:
+        return_response, return_err = self.make_framed_network_request(request)
+      else:
+        network_call_type, call_args = self.deserialize_network_call(request)
+
+        if network_call_type == libnit_protocol.NEGOTIATION_CALL:
+          return self.negotiate_frame_version(call_args, request_buffer)
+
+        return_response, return_err = self.make_network_request(network_call_type, call_args)
+    except libnit_protocol.InvalidFrame:
+      raise
+    except Exception, err:
+      if self.debug_mode:
+        print "Got a bad error: " + str(traceback.format_exc())
+
+      # If there is any error at all then we just send back
+      # the ECONNRESET errorcode.
+      return_response = ""
+      return_err = ECONNRESET
+      
+    # Now that we have processed the network call, we are going to serialize
+    # the response and error codes from the call then return it back to libnit.
+    if framed:
+      return libnit_protocol.pack_response_frame(return_response, return_err)
+
+    return self.serialize_network_call_response(return_response, return_err)
+
+
+
+
+  def negotiate_frame_version(self, call_args, request_buffer):
+    """
+    <Purpose>
+      Handle the legacy 'hello' call. Libnit sends the highest framed
+      protocol version it supports, we reply with the version that both
+      sides will use from now on.
+
+    <Arguments>
+      call_args - the highest version supported by libnit.
+
+      request_buffer - the LibnitRequestBuffer of the connection.
+
+    <Return>
+      The serialized legacy reply.
+    """
+
+    try:
+      frame_version = min(int(call_args), libnit_protocol.FRAME_VERSION)
+    except ValueError:
+      frame_version = 0
+
+    if frame_version < 1:
+      return self.serialize_network_call_response("", ECONNRESET)
+
+    # The reply itself still uses the legacy format.
+    serialized_response = self.serialize_network_call_response(frame_version, -1)
+    request_buffer.frame_version = frame_version
+
+    return serialized_response
+
+
+
   def serialize_network_call_response(self, return_response, return_err):
     """
     <Purpose>
@@ -274,71 +577,65 @@ class LibnitListener():
 
 
 
-  def make_network_request(self, call_name, call_args):
+  def make_framed_network_request(self, frame):
     """
     <Purpose>
-      Given a network call name and arguments. Process the
-      call with the arguments.
+      Decode a network call sent over from libnit in the framed format
+      and process it.
 
     <Arguments>
-      call_name - The network call we need to make.
+      frame - a string that contains a complete request frame.
 
-      call_args - A list of all the arguments.
+    <Exception>
+      InvalidFrame is raised if the frame is malformed.
 
     <Return>
-      A tuple with the error code and response.
+      A tuple with the response and error code.
     """
 
-    # Retrieve the process function that will be used to process
-    # the network call.
-    process_method_name = "call_" + call_name
+    body_len, version, opcode, arg_count, sock_fd = \
+        libnit_protocol.REQUEST_HEADER.unpack_from(frame)
 
-    process_method = getattr(self.network_call_processor, process_method_name)
+    try:
+      process_method, decode_arguments = self.opcode_dispatch[opcode]
+    except KeyError:
+      raise libnit_protocol.InvalidFrame("Unknown opcode %d." % opcode)
 
-    # Split the arguments.
-    call_arg_list = call_args.split(',')
+    call_arg_list = decode_arguments(frame, sock_fd, arg_count)
 
     try:
-      # Process the 'socket' call.
-      if call_name == 'socket':
-        domain = call_arg_list[0]
-        socket_type = call_arg_list[1]
-        
-        return process_method(domain, socket_type)
-
-      # Process the 'connect' call.
-      elif call_name == 'connect':
-        sock_fd = call_arg_list[0]
-        conn_ip = call_arg_list[1]
-        conn_port = call_arg_list[2]
-
-        return process_method(sock_fd, conn_ip, conn_port)
-
-      # Process the 'send' call.
-      elif call_name == 'send':
-        # Split the arguments a little differently. The message in send might
-        # have the character ','. So we split it only twice.
-        call_arg_list = call_args.split(',', 2)
-
-        sock_fd = call_arg_list[0]
-        flags = call_arg_list[1]
-        msg_to_send = call_arg_list[2]
-        
-        return process_method(sock_fd, msg_to_send, flags)
-      
-      # Process the 'recv' call.
-      elif call_name == 'recv':
-        sock_fd = call_arg_list[0]
-        len_to_recv = call_arg_list[1]
-        flags = call_arg_list[2] 
-        return process_method(sock_fd, len_to_recv, flags)
+      return process_method(*call_arg_list)
+    except Exception, err:
+      if self.debug_mode:
+        print "Got a bad error: " + str(traceback.format_exc())
+
+      return (0, ECONNRESET)
+
 
-      
-      # Process the 'close' call.
-      elif call_name == 'close':
-        sock_fd = call_arg_list[0]
 
-        return process_method(sock_fd)
+
+
+  def make_network_request(self, call_name, call_args):
+    """
+    <Purpose>
+      Given a network call name and arguments. Process the
+      call with the arguments.
+
+    <Arguments>
+      call_name - The network call we need to make.
+
+      call_args - The comma separated arguments of the call.
+
+    <Return>
+      A tuple with the response and error code.
+    """
+
+    try:
+      # Retrieve the process function that will be used to process
+      # the network call, and the decoder for its arguments.
+      process_method, decode_arguments = self.call_dispatch[call_name]
+
+      return process_method(*decode_arguments(call_args))
     except Exception, err:
       if self.debug_mode:
         print "Got a bad error: " + str(traceback.format_exc())
@@ -346,6 +643,72 @@ class LibnitListener():
       return (0, ECONNRESET)
 
 
+
+
+
+
+class LibnitConnection:
+  """
+  <Purpose>
+    The state the event loop keeps for a single libnit connection.
+  """
+
+  def __init__(self, libnit_conn):
+    self.libnit_conn = libnit_conn
+    self.fileno = libnit_conn.fileno()
+    self.request_buffer = libnit_protocol.LibnitRequestBuffer()
+
+    # Serialized replies that have not been sent yet.
+    self.outgoing = ''
+
+    # True while a worker is processing a request of this connection.
+    self.busy = False
+    self.closed = False
+
+
+
+
+class LibnitWorkerPool:
+  """
+  <Purpose>
+    A fixed number of daemon threads that run submitted functions in
+    the order they were submitted.
+  """
+
+  def __init__(self, worker_count):
+    self.task_queue = Queue.Queue()
+
+    for worker_num in range(worker_count):
+      worker_thread = threading.Thread(target=self._run_tasks)
+      worker_thread.daemon = True
+      worker_thread.start()
+
+
+
+  def submit(self, task_function, *task_args):
+    """
+    <Purpose>
+      Queue task_function(*task_args) to be run by a worker.
+
+    <Return>
+      None
+    """
+
+    self.task_queue.put((task_function, task_args))
+
+
+
+  def _run_tasks(self):
+    while True:
+      task_function, task_args = self.task_queue.get()
+
+      try:
+        task_function(*task_args)
+      except Exception:
+        traceback.print_exc()
+
+
+
     
 # ===========================================================================
 # Define Exceptions
@@ -0,0 +1,452 @@
+"""
+<Program Name>
+  libnit_protocol.py
+
+<Date Started>
+  October 18th, 2026
+
+<Purpose>
+  Define the wire format spoken between Libnit (src/libc) and the
+  LibnitListener.  Two formats are understood:
+
+    * The legacy format.  Every call is a fixed size FUNCSTRUCT of
+      LEGACY_CALL_SIZE bytes (a 20 byte call name followed by a 2048 byte
+      comma separated argument string) and every reply is a 4 byte error
+      code followed by the response string.
+
+    * The framed format.  Every call is a length-prefixed binary frame:
+
+        uint32  body length (number of bytes following the header)
+        uint8   protocol version
+        uint8   opcode (see CALL_OPCODES)
+        uint16  number of integer arguments
+        int32   socket fd the call is made on (-1 if none)
+        int64   integer arguments, 'number of integer arguments' of them
+        ...     raw byte payload, the remainder of the body
+
+      and every reply is a length-prefixed binary frame:
+
+        uint32  payload length
+        int32   error code (-1 on success, like the legacy format)
+        int64   integer return value
+        ...     raw byte payload
+
+  All the values are little endian.  A connection always starts out in
+  the legacy format.  Libnit may then send a legacy 'hello' call whose
+  argument is the highest framed version it supports.  If the listener
+  supports framing it replies with the version it picked and both sides
+  switch to the framed format for the rest of the connection.  Older
+  listeners reply to 'hello' with an error, in which case Libnit keeps
+  using the legacy format.
+
+<Usage>
+  request_buffer = LibnitRequestBuffer()
+  request_buffer.feed(data_received)
+
+  request = request_buffer.next_request()
+  if request is not None:
+    ...
+"""
+
+
+import socket
+import struct
+
+
+# The framed protocol version spoken by this side of the connection.
+FRAME_VERSION = 1
+
+# The size of the legacy FUNCSTRUCT: char func_name[20], char arg_list[2048].
+LEGACY_CALL_SIZE = 20 + 2048
+
+# The legacy call used to negotiate the framed format.
+NEGOTIATION_CALL = 'hello'
+
+# The largest frame body we are willing to buffer.
+MAX_FRAME_BODY_SIZE = 16 * 1024 * 1024
+
+# The number of bytes read from the connection at a time.
+RECV_CHUNK_SIZE = 65536
+
+REQUEST_HEADER = struct.Struct('<IBBHi')
+RESPONSE_HEADER = struct.Struct('<Iiq')
+INTEGER_ARGUMENT = struct.Struct('<q')
+
+# Opcodes for all the calls defined by NetworkCallProcessor.  These must
+# match the OP_* definitions in libc/libnetworkinterpose.c.
+CALL_OPCODES = {
+  'socket' : 1,
+  'connect' : 2,
+  'listen' : 3,
+  'accept' : 4,
+  'bind' : 5,
+  'send' : 6,
+  'recv' : 7,
+  'sendto' : 8,
+  'recvfrom' : 9,
+  'select' : 10,
+  'getsockopt' : 11,
+  'setsockopt' : 12,
+  'close' : 13
+}
+
+# The arguments of every call, in the order they appear in the legacy
+# comma separated format:
+#   'fd'      - the socket fd the call is made on.
+#   'int'     - an integer.
+#   'ip'      - an IPv4 address, sent as an integer (host byte order) in
+#               frames and in dotted form in the legacy format.
+#   'payload' - raw bytes.  Always the last argument, since it may contain
+#               commas.
+# A frame carries the 'fd' in its header, the 'int' and 'ip' arguments as
+# its integer arguments (in this order) and the 'payload' as its payload.
+CALL_ARGUMENTS = {
+  'socket' : ('int', 'int', 'int'),
+  'connect' : ('fd', 'ip', 'int'),
+  'listen' : ('fd', 'int'),
+  'accept' : ('fd',),
+  'bind' : ('fd', 'ip', 'int'),
+  'send' : ('fd', 'int', 'payload'),
+  'recv' : ('fd', 'int', 'int'),
+  'sendto' : ('fd', 'int', 'ip', 'int', 'payload'),
+  'recvfrom' : ('fd', 'int', 'int'),
+  'select' : ('fd', 'int', 'int'),
+  'getsockopt' : ('fd', 'int', 'int'),
+  'setsockopt' : ('fd', 'int', 'int', 'payload'),
+  'close' : ('fd',)
+}
+
+OPCODE_CALLS = dict([(opcode, call_name) for call_name, opcode in CALL_OPCODES.items()])
+
+
+
+
+
+class LibnitRequestBuffer:
+  """
+  <Purpose>
+    Buffer the bytes received on a libnit connection and split them into
+    complete requests, regardless of how the requests were split up or
+    coalesced by the network.  Until 'frame_version' is set, requests are
+    legacy FUNCSTRUCTs, afterwards they are frames.
+  """
+
+  def __init__(self):
+    self.frame_version = None
+    self._buffer = ''
+    self._offset = 0
+
+
+
+  def feed(self, data):
+    """
+    <Purpose>
+      Add data received on the connection to the buffer.
+
+    <Arguments>
+      data - the string received.
+
+    <Return>
+      None
+    """
+
+    if self._offset:
+      self._buffer = self._buffer[self._offset:]
+      self._offset = 0
+
+    self._buffer += data
+
+
+
+  def next_request(self):
+    """
+    <Purpose>
+      Remove the next complete request from the buffer.
+
+    <Exceptions>
+      InvalidFrame is raised if a frame header announces a body larger
+      than MAX_FRAME_BODY_SIZE.
+
+    <Return>
+      The raw request string (a full FUNCSTRUCT or a full frame including
+      its header), or None if no complete request has been buffered yet.
+    """
+
+    available = len(self._buffer) - self._offset
+
+    if self.frame_version is None:
+      request_size = LEGACY_CALL_SIZE
+    else:
+      if available < REQUEST_HEADER.size:
+        return None
+
+      body_len = REQUEST_HEADER.unpack_from(self._buffer, self._offset)[0]
+      if body_len > MAX_FRAME_BODY_SIZE:
+        raise InvalidFrame("Frame body of %d bytes is too large." % body_len)
+
+      request_size = REQUEST_HEADER.size + body_len
+
+    if available < request_size:
+      return None
+
+    request = self._buffer[self._offset:self._offset + request_size]
+    self._offset += request_size
+
+    return request
+
+
+
+  def read_request(self, libnit_conn):
+    """
+    <Purpose>
+      Block on libnit_conn until a complete request has been received.
+
+    <Arguments>
+      libnit_conn - the connection to read from.
+
+    <Exceptions>
+      ConnectionClosed if libnit_conn is closed before a full request
+      arrives.  socket.error if the recv fails.
+
+    <Return>
+      The raw request string.
+    """
+
+    request = self.next_request()
+
+    while request is None:
+      data = libnit_conn.recv(RECV_CHUNK_SIZE)
+      if not data:
+        raise ConnectionClosed("Libnit connection closed.")
+
+      self.feed(data)
+      request = self.next_request()
+
+    return request
+
+
+
+
+
+def pack_request_frame(call_name, sock_fd, int_args=(), payload=''):
+  """
+  <Purpose>
+    Build a framed request.  This is what Libnit sends; it is provided
+    here so the format is documented in one place and can be tested.
+
+  <Return>
+    The frame as a string.
+  """
+
+  body = ''.join([INTEGER_ARGUMENT.pack(arg) for arg in int_args]) + payload
+  header = REQUEST_HEADER.pack(len(body), FRAME_VERSION,
+                               CALL_OPCODES[call_name], len(int_args), sock_fd)
+
+  return header + body
+
+
+
+
+
+def unpack_request_frame(frame):
+  """
+  <Purpose>
+    Split a framed request into its parts.
+
+  <Arguments>
+    frame - a complete frame, as returned by LibnitRequestBuffer.
+
+  <Exceptions>
+    InvalidFrame if the opcode is unknown or the integer arguments do
+    not fit in the frame.
+
+  <Return>
+    A tuple (call_name, sock_fd, int_args, payload).
+  """
+
+  body_len, version, opcode, arg_count, sock_fd = REQUEST_HEADER.unpack_from(frame)
+
+  if opcode not in OPCODE_CALLS:
+    raise InvalidFrame("Unknown opcode %d." % opcode)
+
+  args_end = REQUEST_HEADER.size + arg_count * INTEGER_ARGUMENT.size
+  if args_end > len(frame):
+    raise InvalidFrame("Frame is too short for %d arguments." % arg_count)
+
+  int_args = struct.unpack_from('<%dq' % arg_count, frame, REQUEST_HEADER.size)
+  payload = frame[args_end:]
+
+  return (OPCODE_CALLS[opcode], sock_fd, int_args, payload)
+
+
+
+
+
+def make_legacy_decoder(call_name, argument_order=None):
+  """
+  <Purpose>
+    Build the function that decodes the comma separated arguments of a
+    legacy 'call_name' call, as described by CALL_ARGUMENTS.
+
+  <Arguments>
+    call_name - the network call.
+
+    argument_order - the indices of the arguments to return, in the
+      order to return them.  All the arguments by default.
+
+  <Return>
+    A function that takes the argument string and returns a tuple of the
+    arguments (as strings).
+  """
+
+  argument_kinds = CALL_ARGUMENTS[call_name]
+
+  if argument_order is None:
+    argument_order = range(len(argument_kinds))
+  argument_order = tuple(argument_order)
+
+  # The payload may contain commas, so it gets whatever is left over.
+  if argument_kinds[-1] == 'payload':
+    max_split = len(argument_kinds) - 1
+  else:
+    max_split = -1
+
+  def decode_legacy_arguments(call_args):
+    arg_list = call_args.split(',', max_split)
+    return tuple([arg_list[index] for index in argument_order])
+
+  return decode_legacy_arguments
+
+
+
+
+
+def make_frame_decoder(call_name, argument_order=None):
+  """
+  <Purpose>
+    Build the function that decodes the arguments of a framed
+    'call_name' call, as described by CALL_ARGUMENTS.  The layout of the
+    integer arguments is compiled once, so decoding a frame is a single
+    struct unpack.
+
+  <Arguments>
+    call_name - the network call.
+
+    argument_order - the indices (into CALL_ARGUMENTS[call_name]) of the
+      arguments to return, in the order to return them.  All the
+      arguments by default.
+
+  <Return>
+    A function that takes a complete frame, its socket fd and its number
+    of integer arguments, and returns a tuple of the arguments.  The
+    function raises InvalidFrame if the frame does not carry the number
+    of integer arguments the call needs.
+  """
+
+  argument_kinds = CALL_ARGUMENTS[call_name]
+
+  if argument_order is None:
+    argument_order = range(len(argument_kinds))
+
+  # For every argument, where to find it: the fd, the payload or the
+  # position among the integer arguments.
+  int_count = 0
+  argument_sources = []
+  for kind in argument_kinds:
+    if kind in ('int', 'ip'):
+      argument_sources.append((kind, int_count))
+      int_count += 1
+    else:
+      argument_sources.append((kind, None))
+
+  argument_sources = [argument_sources[index] for index in argument_order]
+  int_arguments = struct.Struct('<%dq' % int_count)
+  payload_start = REQUEST_HEADER.size + int_arguments.size
+
+  def decode_frame_arguments(frame, sock_fd, arg_count):
+    if arg_count != int_count or len(frame) < payload_start:
+      raise InvalidFrame("'%s' needs %d integer arguments, got %d." %
+                         (call_name, int_count, arg_count))
+
+    int_args = int_arguments.unpack_from(frame, REQUEST_HEADER.size)
+
+    call_args = []
+    for kind, int_index in argument_sources:
+      if kind == 'int':
+        call_args.append(int_args[int_index])
+      elif kind == 'fd':
+        call_args.append(sock_fd)
+      elif kind == 'ip':
+        call_args.append(int_to_ip(int_args[int_index]))
+      else:
+        call_args.append(frame[payload_start:])
+
+    return tuple(call_args)
+
+  return decode_frame_arguments
+
+
+
+
+
+def int_to_ip(address):
+  """
+  <Purpose>
+    Convert an IPv4 address sent as an integer argument (host byte
+    order) into its dotted string form.
+
+  <Return>
+    The address as a string, e.g. '127.0.0.1'.
+  """
+
+  return socket.inet_ntoa(struct.pack('!I', address & 0xffffffff))
+
+
+
+
+
+def pack_response_frame(return_response, return_err):
+  """
+  <Purpose>
+    Build a framed reply for a processed call.  Integer responses are
+    returned as the integer return value, string responses as the
+    payload (with their length as the return value) and a None response
+    as the return value -1.
+
+  <Return>
+    The frame as a string.
+  """
+
+  if return_response is None:
+    return_val = -1
+    payload = ''
+  elif isinstance(return_response, (int, long)):
+    return_val = return_response
+    payload = ''
+  else:
+    payload = str(return_response)
+    return_val = len(payload)
+
+  return RESPONSE_HEADER.pack(len(payload), return_err, return_val) + payload
+
+
+
+
+
+# ===========================================================================
+# Define Exceptions
+# ===========================================================================
+class InvalidFrame(Exception):
+  """
+  This error is raised if a frame received from libnit is malformed.
+  """
+  pass
+
+
+
+class ConnectionClosed(Exception):
+  """
+  This error is raised if the libnit connection is closed while
+  waiting for a request.
+  """
+  pass
@@ -18,11 +18,24 @@
 
 
 import sys
+import mmap
+import os
 import socket
+import threading
+import time
+import urlparse
 from network_call_processor import NetworkCallProcessor
 sys.path.append("TUF/src/")
 
+import tuf
 from tuf_client_api import *
+import http_response
+
+#seconds after which mirror host names are resolved again
+MIRROR_RESOLVE_TTL = 300
+
+#ports of the url schemes mirrors are reached with, when the url has none
+DEFAULT_PORTS = {'http': 80, 'https': 443}
 
 class NetworkForwarder(NetworkCallProcessor):
  """
@@ -46,6 +59,11 @@ class NetworkForwarder(NetworkCallProcessor):
   self.misc_network_calls:
    Dictionary for network calls made to ip's not in mirror list
    These network calls are forwarded through the translator between software updater and server
+  self.mirror_index:
+   MirrorIndex used to recognize connections to the server and the mirrors
+  self.response_cursors:
+   Dictionary of TargetResponseCursor, keyed by socket descriptor id, for the
+   updates that are being returned to the software updater
 
  <Methods>
   is_mirror():
@@ -66,19 +84,26 @@ class NetworkForwarder(NetworkCallProcessor):
     Call TUF API to handle security mechanism for mirror(s) and file requested
   call_recv():
     If call_send was successfull, call_recv wraps targeted file request in TUF API download call. 
-    Upon successful download, the function returns the path (or contents) of the downloaded file
-    to the network interposition interface, which returns it to the software updater
+    Upon successful download, the contents of the downloaded file are returned to the network
+    interposition interface buff_size bytes per call, which returns them to the software updater.
+    Once the whole file has been returned, an empty string signals the end of the file
+  make_http_response():
+    Synthesize the HTTP reply (status, headers and body) for a target from the TUF metadata
  call_close():
    upon socket close() call, this function removes the socket from the update_calls dict 
  """
   
- def __init__(self, server_url):
+ def __init__(self, server_url, refresh_interval=METADATA_REFRESH_INTERVAL):
     """
      <Purpose>
        Initiate TUFTranslator that will handle network calls from software updater
      <Arguments>
 	server_ip:
 	  ip address of updater server 
+	refresh_interval:
+	  seconds the TUF metadata is trusted before it is refreshed again, shared
+	  by all the sockets. None refreshes it once per update session, that is
+	  whenever the software updater connects to the server
      <Return>
 	None
     """
@@ -90,48 +115,39 @@ class NetworkForwarder(NetworkCallProcessor):
     self.sock_id = 1024
 	
     self.server_url = server_url
+    repository_session.refresh_interval = refresh_interval
    
     #initial update mirror from server 	
     update_mirrorlist(self.server_url)
     self.mirror_list = get_mirrors()
+    self.mirror_index = MirrorIndex()
+    self.mirror_index.load(self.mirror_list, self.server_url)
     self.network_calls = {}	
 	
     #dict of network calls not made to mirrors
     self.misc_network_calls = {}
+
+    #dict of updates being returned to the software updater
+    self.response_cursors = {}
  
- def url_to_ip(self, url):
-    """
-    <Purpose>
-     Get mirror url and transform to ip address
-    <Return>
-     ip:port of url
-    """  
-    url_split = url.split("//")
-    url_only = ''.join(url_split[len(url_split)-1])
-    url_split = url_only.split(":")
-    url_only = url_split[0] 
-    port = ''.join(url_split[len(url_split)-1])
-    if url_only == port:
-      return socket.gethostbyname(url_only)
-    return socket.gethostbyname(url_only)+":"+port
-  
-   
  def is_mirror(self,ip):
     """
       <Purpose>
-        Check if ip is in mirror list dict
+        Check if ip is in mirror list dict. No host names are resolved,
+        the mirror index is used instead
       <Arguments>
 	ip_port:
-	   ip: ip of connect() parameter
+	   ip: ip of connect() parameter, with or without :port
       <Return>
 	 0 if mirror is not in list, 1 if it is
     """
-    for mirror_name in self.mirror_list:
-      mirror_url = self.mirror_list[mirror_name]['url_prefix']
-      mirror_ip = self.url_to_ip(mirror_url)
-      if mirror_ip == ip:
-       return 1
-    return 0 
+    ip_split = ip.split(":")
+    port = None
+    if len(ip_split) > 1:
+      port = ip_split[1]
+    if self.mirror_index.lookup(ip_split[0], port) is None:
+      return 0
+    return 1 
  
  def call_socket(self,domain,socket_type):	
     """
@@ -193,21 +209,16 @@ class NetworkForwarder(NetworkCallProcessor):
     if not self.network_calls.get(str_sock_id):
       return (None,9)	
 	
-    ai_addr = addr + ':'+str(port)
-    if port == None:
-      ai_addr = addr
-
-    #check if ai_addr is the server
-    ai_addr = self.url_to_ip(ai_addr) 
-    server_ip = self.url_to_ip(self.server_url) 
+    #check if addr is the server
+    if self.mirror_index.is_server(addr, port):
+      #update mirror list, if it changed, and start a new update session
+      if update_mirrorlist(self.server_url):
+        self.mirror_list = get_mirrors()
+        self.mirror_index.load(self.mirror_list, self.server_url)
+      start_update_session()
     
-    if server_ip == ai_addr:
-      #update mirror list 
-      update_mirrorlist(self.server_url)
-      self.mirror_list = get_mirrors()
-    
-    mirror = self.is_mirror(ai_addr)
-    if mirror:
+    mirror = self.mirror_index.lookup(addr, port)
+    if mirror is not None:
       self.network_calls[str_sock_id]['addr'] = addr
       self.network_calls[str_sock_id]['port'] = int(port)
       return (0,-1)
@@ -261,17 +272,16 @@ class NetworkForwarder(NetworkCallProcessor):
       except socket.error,error_msg:
         return (None, error_msg[0])
     else:
-      #split request into its components
-      #[method][request-uri][protocol]
-      request_components = msg.split()
-      if  len(request_components) > 1:
-        if len(request_components[1]) == 0 or len(request_components[1]) == '/':
+      http_request = http_response.parse_request(msg)
+      if http_request is not None:
+        if len(http_request.path) == 0:
           return (None,22) 
-        else:
-	  requested_file = request_components[1]
-          if request_components[1][0] == '/': #remove initial, unecessary /
-	    requested_file = request_components[1][1:]
-          self.network_calls[str_sock_id]['target_update']=requested_file	
+        self.network_calls[str_sock_id]['target_update'] = http_request.path
+        self.network_calls[str_sock_id]['http_request'] = http_request
+
+        #a new request on a kept alive connection replaces the previous response
+        if self.response_cursors.get(str_sock_id):
+          self.response_cursors.pop(str_sock_id).close()
       return (len(msg),-1)
 
 
@@ -305,14 +315,72 @@ class NetworkForwarder(NetworkCallProcessor):
       except socket.error, msg:
         return (None, msg[0])
     else:
-      try:
-        target = self.network_calls[str_sock_id]['target_update'] 
-        recv_buf = perform_an_update(target)
-        if recv_buf is None:
-          return (None, 2) #simulate file not found error
-        return (recv_buf, -1)
-      except:
-        return (None, 2)#simulate file not found error
+      #the update is downloaded on the first recv, later calls continue
+      #where the previous one stopped
+      if not self.response_cursors.get(str_sock_id):
+        try:
+          http_request = self.network_calls[str_sock_id]['http_request']
+          self.response_cursors[str_sock_id] = self.make_http_response(http_request)
+        except:
+          return (None, 2)#simulate file not found error
+
+      recv_buf = self.response_cursors[str_sock_id].read(int(buff_size))
+      return (recv_buf, -1)
+
+
+ def make_http_response(self, http_request):
+    """
+    <Purpose>
+      Answer an HTTP request for a TUF target. The status line and headers
+      are synthesized from the trusted metadata: Content-Length is the
+      target's length and the ETag is its sha256 hash. HEAD requests and
+      conditional GETs that match the ETag get the headers only. Unknown
+      targets get a 404.
+
+    <Arguments>
+      http_request:
+        the http_response.HttpRequest sent on the socket
+
+    <Exceptions>
+      tuf.Error if the target cannot be updated and the request expects
+      a bare HTTP/0.9 reply
+
+    <Return>
+      TargetResponseCursor for the reply
+    """
+    if http_request.method not in http_response.SUPPORTED_METHODS:
+      if http_request.is_simple():
+        raise tuf.Error("Unsupported method " + repr(http_request.method))
+      return TargetResponseCursor(
+          header=http_response.make_error_response(http_request, 501))
+
+    download = http_request.method == 'GET'
+    try:
+      target_filepath, fileinfo = update_target(http_request.path, download=download)
+    except tuf.Error, error:
+      if http_request.is_simple():
+        raise
+      if isinstance(error, tuf.RepositoryError):
+        status = 404
+      else:
+        status = 503
+      return TargetResponseCursor(
+          header=http_response.make_error_response(http_request, status))
+
+    etag = http_response.make_etag(fileinfo)
+    if http_request.etag_matches(etag):
+      header = http_response.make_response_header(http_request, 304,
+          [('ETag', etag)])
+      return TargetResponseCursor(header=header)
+
+    header = http_response.make_response_header(http_request, 200,
+        [('Content-Type', 'application/octet-stream'),
+         ('Content-Length', fileinfo['length']),
+         ('ETag', etag)])
+
+    if not download:
+      return TargetResponseCursor(header=header)
+    return TargetResponseCursor(target_filepath, header)
 
 
 
@@ -337,6 +405,9 @@ class NetworkForwarder(NetworkCallProcessor):
     if not self.network_calls.get(str_sock_id):
       return (None, 9)
 
+    if self.response_cursors.get(str_sock_id):
+      self.response_cursors.pop(str_sock_id).close()
+
     if self.misc_network_calls.get(str_sock_id):
       try:
         sock_close = self.misc_network_calls[str_sock_id]["sock_obj"].close()
@@ -352,3 +423,282 @@ class NetworkForwarder(NetworkCallProcessor):
     return (0,-1)		
 
 
+
+class MirrorIndex:
+ """
+ <Purpose>
+  Map the (ip, port) a software updater connects to onto the mirror it
+  belongs to, without resolving host names on every connect(). The host
+  names of the mirrors and of the server are resolved when the mirror list
+  is loaded, and again every resolve_ttl seconds by a background thread.
+
+ <Attributes>
+  self.resolve_ttl:
+   seconds after which host names are resolved again
+  self.mirror_urls:
+   dict of mirror name to url prefix the index was built from
+  self.server_url:
+   url of the update server
+  self.mirror_addrs:
+   dict of (ip, port) to mirror name
+  self.server_addrs:
+   set of (ip, port) of the update server
+ """
+
+ def __init__(self, resolve_ttl=MIRROR_RESOLVE_TTL):
+    """
+     <Purpose>
+       Create an empty index.
+     <Arguments>
+	resolve_ttl:
+	  seconds after which host names are resolved again
+     <Return>
+	None
+    """
+    self.resolve_ttl = resolve_ttl
+    self.mirror_urls = {}
+    self.server_url = None
+    self.mirror_addrs = {}
+    self.server_addrs = frozenset()
+
+    self.lock = threading.Lock()
+    self.generation = 0
+    self.resolver_thread = None
+
+ def load(self, mirror_list, server_url):
+    """
+     <Purpose>
+       Build the index for a mirror list. Nothing is resolved if the
+       mirror urls and the server url did not change since the last load.
+     <Arguments>
+	mirror_list:
+	  dict of mirrors, conformant to tuf.formats.MIRRORDICT_SCHEMA
+	server_url:
+	  url of the update server
+     <Return>
+	None
+    """
+    mirror_urls = {}
+    for mirror_name in mirror_list:
+      mirror_urls[mirror_name] = mirror_list[mirror_name]['url_prefix']
+
+    self.lock.acquire()
+    try:
+      if mirror_urls == self.mirror_urls and server_url == self.server_url:
+        return
+      self.mirror_urls = mirror_urls
+      self.server_url = server_url
+      self.generation += 1
+    finally:
+      self.lock.release()
+
+    self.resolve()
+
+    if self.resolver_thread is None and self.resolve_ttl is not None:
+      self.resolver_thread = threading.Thread(target=self._resolve_forever)
+      self.resolver_thread.daemon = True
+      self.resolver_thread.start()
+
+ def resolve(self):
+    """
+     <Purpose>
+       Resolve the host names of the mirrors and the server and swap in
+       the new index. Addresses that fail to resolve keep their previous
+       entries.
+     <Return>
+	None
+    """
+    self.lock.acquire()
+    try:
+      generation = self.generation
+      mirror_urls = dict(self.mirror_urls)
+      server_url = self.server_url
+      old_mirror_addrs = self.mirror_addrs
+      old_server_addrs = self.server_addrs
+    finally:
+      self.lock.release()
+
+    mirror_addrs = {}
+    for mirror_name, mirror_url in mirror_urls.items():
+      addrs = url_to_addrs(mirror_url)
+      if addrs is None:
+        addrs = [addr for addr in old_mirror_addrs
+                 if old_mirror_addrs[addr] == mirror_name]
+      for addr in addrs:
+        mirror_addrs[addr] = mirror_name
+
+    server_addrs = url_to_addrs(server_url)
+    if server_addrs is None:
+      server_addrs = old_server_addrs
+
+    self.lock.acquire()
+    try:
+      #a newer mirror list was loaded while we were resolving
+      if generation != self.generation:
+        return
+      self.mirror_addrs = mirror_addrs
+      self.server_addrs = frozenset(server_addrs)
+    finally:
+      self.lock.release()
+
+ def lookup(self, ip, port):
+    """
+     <Purpose>
+       Find the mirror an address belongs to.
+     <Arguments>
+	ip:
+	  ip address of the connect() call
+	port:
+	  port of the connect() call, None for the default http port
+     <Return>
+	the mirror name, or None if the address is not a mirror
+    """
+    return self.mirror_addrs.get(make_addr(ip, port))
+
+ def is_server(self, ip, port):
+    """
+     <Purpose>
+       Check whether an address is the update server.
+     <Return>
+	True if it is
+    """
+    return make_addr(ip, port) in self.server_addrs
+
+ def _resolve_forever(self):
+    """
+     <Purpose>
+       Resolve the host names again every resolve_ttl seconds.
+     <Return>
+	None
+    """
+    while True:
+      time.sleep(self.resolve_ttl)
+      try:
+        self.resolve()
+      except Exception:
+        pass
+
+
+
+
+def make_addr(ip, port):
+    """
+     <Purpose>
+       Build the key the MirrorIndex uses for an address.
+     <Return>
+	(ip, port) tuple
+    """
+    if port is None:
+      port = DEFAULT_PORTS['http']
+    return (ip, int(port))
+
+
+def url_to_addrs(url):
+    """
+     <Purpose>
+       Resolve the host name of a url.
+     <Arguments>
+	url:
+	  url, with or without scheme and port
+     <Return>
+	list of (ip, port) tuples, None if the host name cannot be resolved
+    """
+    if "//" not in url:
+      url = "http://" + url
+    parsed_url = urlparse.urlparse(url)
+
+    port = parsed_url.port
+    if port is None:
+      port = DEFAULT_PORTS.get(parsed_url.scheme, DEFAULT_PORTS['http'])
+
+    try:
+      ips = socket.gethostbyname_ex(parsed_url.hostname)[2]
+    except (socket.error, TypeError):
+      return None
+
+    return [(ip, port) for ip in ips]
+
+
+
+
+class TargetResponseCursor:
+ """
+ <Purpose>
+  Return a response to the software updater in slices: the synthesized
+  header (if any) followed by the verified update. The file is memory
+  mapped, so successive recv() calls are served from the page cache
+  without the whole file being read into memory.
+
+ <Attributes>
+  self.filepath:
+   path of the verified target file, None if the response has no body
+  self.header:
+   string sent before the file
+  self.offset:
+   number of bytes already returned
+ """
+
+ def __init__(self, filepath=None, header=''):
+    """
+     <Purpose>
+       Open and map the target file.
+     <Arguments>
+	filepath:
+	  path of the verified target file, or None
+	header:
+	  string to send before the file
+     <Return>
+	None
+    """
+    self.filepath = filepath
+    self.header = header
+    self.offset = 0
+    self.target_map = ''
+
+    if filepath is None:
+      return
+
+    target_file = open(filepath, 'rb')
+    try:
+      #empty files cannot be mapped
+      if os.fstat(target_file.fileno()).st_size > 0:
+        self.target_map = mmap.mmap(target_file.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+      target_file.close()
+
+ def read(self, size):
+    """
+     <Purpose>
+       Return the next size bytes of the response and advance the cursor.
+     <Arguments>
+	size:
+	  maximum number of bytes to return
+     <Return>
+	the data, or an empty string once the end of the response is reached
+    """
+    data = ''
+    header_len = len(self.header)
+
+    if self.offset < header_len:
+      data = self.header[self.offset:self.offset + size]
+      self.offset += len(data)
+      size -= len(data)
+
+    if size > 0:
+      map_offset = self.offset - header_len
+      body = self.target_map[map_offset:map_offset + size]
+      self.offset += len(body)
+      data += body
+
+    return data
+
+ def close(self):
+    """
+     <Purpose>
+       Unmap the target file.
+     <Return>
+	None
+    """
+    if isinstance(self.target_map, mmap.mmap):
+      self.target_map.close()
+    self.target_map = ''
@@ -9,6 +9,7 @@
 #before starting the legacy software updater processed
 
 #usage: (on a separate shell) python socket_interposer.py 
+#       [--event-driven]  serve all processes on one event loop
 
 import os,sys
 import libnit_listener
@@ -24,7 +25,9 @@ def main():
 	# it can just as easily be passed as a command-line argument
 	test = NetworkForwarder("http://localhost:8101")
 	
-	new_listener = libnit_listener.LibnitListener(test, debug_mode = True) 
+	event_driven = '--event-driven' in sys.argv[1:]
+	new_listener = libnit_listener.LibnitListener(test, debug_mode = True,
+						event_driven = event_driven) 
    	#new_listener = libnit_listener.LibnitListener(test, debug_mode = False) 
    	new_listener.serve_forever()
 
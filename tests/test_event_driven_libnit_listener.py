@@ -0,0 +1,131 @@
+"""
+<Purpose>
+  Test the event driven mode of the LibnitListener. A number of
+  connections are opened at once, half of them negotiate the framed
+  protocol, and every connection makes a few echo calls which are sent
+  one byte at a time.
+
+<Date Started>
+  October 18th, 2026
+"""
+
+import sys
+sys.path.append("../src") #hardcoded for testing purposes
+
+import socket
+import struct
+import threading
+import time
+
+import libnit_protocol
+from libnit_listener import LibnitListener
+from network_call_processor import NetworkCallProcessor
+
+
+LIBNIT_PORT = 53690
+CONNECTION_COUNT = 50
+
+
+class EchoProcessor(NetworkCallProcessor):
+
+  def __init__(self):
+    NetworkCallProcessor.__init__(self)
+    self.messages = {}
+    self.lock = threading.Lock()
+
+  def call_send(self, sockfd, msg, flags):
+    self.lock.acquire()
+    self.messages[int(sockfd)] = msg
+    self.lock.release()
+    return (len(msg), -1)
+
+  def call_recv(self, sockfd, msg_len, flags):
+    # Pretend this is slow TUF work.
+    time.sleep(0.01)
+    return (self.messages[int(sockfd)], -1)
+
+
+
+def legacy_call(call_name, call_args):
+  return call_name.ljust(20, '\0') + call_args.ljust(2048, '\0')
+
+
+
+def send_slowly(test_sock, data):
+  for byte in data:
+    test_sock.send(byte)
+
+
+
+def recv_exactly(test_sock, length):
+  data = ''
+  while len(data) < length:
+    received = test_sock.recv(length - len(data))
+    assert received, "Connection closed early."
+    data += received
+  return data
+
+
+
+def run_client(client_num, framed, results):
+  test_sock = socket.create_connection(('127.0.0.1', LIBNIT_PORT))
+  sock_fd = 2000 + client_num
+  message = "message %d," % client_num
+
+  if framed:
+    send_slowly(test_sock, legacy_call('hello', str(libnit_protocol.FRAME_VERSION)))
+    assert struct.unpack('<i1s', recv_exactly(test_sock, 5)) == (-1, '1')
+
+  for call_num in range(3):
+    if framed:
+      send_slowly(test_sock, libnit_protocol.pack_request_frame('send', sock_fd, (0,), message))
+      send_slowly(test_sock, libnit_protocol.pack_request_frame('recv', sock_fd, (1024, 0)))
+
+      header_size = libnit_protocol.RESPONSE_HEADER.size
+      recv_exactly(test_sock, header_size)
+      response = recv_exactly(test_sock, header_size)
+      payload_len, err, ret_val = libnit_protocol.RESPONSE_HEADER.unpack(response)
+      response = recv_exactly(test_sock, payload_len)
+    else:
+      send_slowly(test_sock, legacy_call('send', '%d,0,%s' % (sock_fd, message)))
+      send_slowly(test_sock, legacy_call('recv', '%d,1024,0' % sock_fd))
+
+      recv_exactly(test_sock, 4 + len(str(len(message))))
+      response = recv_exactly(test_sock, 4 + len(message))[4:]
+
+    assert response == message, (response, message)
+
+  test_sock.close()
+  results.append(client_num)
+
+
+
+def main():
+  """
+  Launch the main test for the event driven LibnitListener.
+  """
+
+  listener = LibnitListener(EchoProcessor(), libnit_port=LIBNIT_PORT,
+                            event_driven=True, worker_count=4)
+  listener_thread = threading.Thread(target=listener.serve_forever)
+  listener_thread.daemon = True
+  listener_thread.start()
+  time.sleep(0.5)
+
+  results = []
+  client_threads = []
+  for client_num in range(CONNECTION_COUNT):
+    client_thread = threading.Thread(target=run_client,
+                                     args=(client_num, client_num % 2 == 0, results))
+    client_thread.start()
+    client_threads.append(client_thread)
+
+  for client_thread in client_threads:
+    client_thread.join()
+
+  assert len(results) == CONNECTION_COUNT, results
+
+
+
+if __name__ == '__main__':
+  main()
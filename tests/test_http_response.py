@@ -0,0 +1,88 @@
+"""
+<Purpose>
+  Test the http_response library to make sure requests are parsed
+  correctly and that the synthesized replies can be read by httplib.
+
+<Date Started>
+  October 18th, 2026
+"""
+
+import sys
+sys.path.append("../src") #hardcoded for testing purposes
+
+import httplib
+import StringIO
+
+import http_response
+
+
+
+class FakeSocket:
+  # httplib reads the reply through makefile().
+
+  def __init__(self, data):
+    self.data = data
+
+  def makefile(self, *args):
+    return StringIO.StringIO(self.data)
+
+
+
+def test_parse_request():
+  http_request = http_response.parse_request(
+      "GET /moo.txt HTTP/1.1\r\nHost: localhost\r\nIf-None-Match: \"ab\"\r\n\r\n")
+  assert http_request.method == 'GET'
+  assert http_request.path == 'moo.txt'
+  assert not http_request.is_simple()
+  assert http_request.keep_alive()
+  assert http_request.etag_matches('"ab"')
+  assert not http_request.etag_matches('"cd"')
+
+  http_request = http_response.parse_request("GET moo.txt HTTP/0.9\n\n")
+  assert http_request.path == 'moo.txt'
+  assert http_request.is_simple()
+  assert http_response.make_response_header(http_request, 200) == ''
+
+  http_request = http_response.parse_request("GET /moo.txt HTTP/1.0\r\n\r\n")
+  assert not http_request.keep_alive()
+
+  assert http_response.parse_request("hello") is None
+
+
+
+def test_responses():
+  http_request = http_response.parse_request("GET /moo.txt HTTP/1.1\r\n\r\n")
+  fileinfo = {'length': 5, 'hashes': {'sha256': 'ab'}}
+  etag = http_response.make_etag(fileinfo)
+  assert etag == '"ab"'
+
+  header = http_response.make_response_header(http_request, 200,
+      [('Content-Length', fileinfo['length']), ('ETag', etag)])
+
+  response = httplib.HTTPResponse(FakeSocket(header + "hello"), method='GET')
+  response.begin()
+  assert response.status == 200
+  assert response.getheader('etag') == '"ab"'
+  assert not response.will_close
+  assert response.read() == "hello"
+
+  response = httplib.HTTPResponse(
+      FakeSocket(http_response.make_error_response(http_request, 404)), method='GET')
+  response.begin()
+  assert response.status == 404
+  assert response.read() == "404 Not Found\n"
+
+
+
+def main():
+  """
+  Launch the main test for http_response.
+  """
+
+  test_parse_request()
+  test_responses()
+
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,130 @@
+"""
+<Purpose>
+  Test the libnit_protocol library to make sure requests are split
+  correctly no matter how they arrive, and that frames survive a round
+  trip.
+
+<Date Started>
+  October 18th, 2026
+"""
+
+import sys
+sys.path.append("../src") #hardcoded for testing purposes
+
+import libnit_protocol
+from libnit_listener import LibnitListener
+from network_call_processor import NetworkCallProcessor
+
+
+
+class RecordingProcessor(NetworkCallProcessor):
+
+  def call_send(self, sockfd, msg, flags):
+    return (('send', sockfd, msg, flags), -1)
+
+  def call_connect(self, sockfd, conn_ip, conn_port):
+    return (('connect', sockfd, conn_ip, conn_port), -1)
+
+  def call_recvfrom(self, sockfd, msg_len, flags):
+    return (('recvfrom', sockfd, msg_len, flags), -1)
+
+
+
+def test_legacy_requests():
+  # Two legacy calls split in odd places must come out whole.
+  call = "recv".ljust(20, '\0') + "1025,100,0".ljust(2048, '\0')
+  data = call + call
+
+  request_buffer = libnit_protocol.LibnitRequestBuffer()
+  request_buffer.feed(data[:7])
+  assert request_buffer.next_request() is None
+
+  request_buffer.feed(data[7:3000])
+  assert request_buffer.next_request() == call
+  assert request_buffer.next_request() is None
+
+  request_buffer.feed(data[3000:])
+  assert request_buffer.next_request() == call
+
+
+
+def test_framed_requests():
+  payload = "GET /moo.txt HTTP/1.0\r\n\r\n" + ",\0" * 2000
+  frame = libnit_protocol.pack_request_frame('send', 1025, (0,), payload)
+
+  request_buffer = libnit_protocol.LibnitRequestBuffer()
+  request_buffer.frame_version = libnit_protocol.FRAME_VERSION
+
+  # Coalesced with the start of the next frame.
+  request_buffer.feed(frame + frame[:5])
+  assert request_buffer.next_request() == frame
+  assert request_buffer.next_request() is None
+
+  request_buffer.feed(frame[5:])
+  assert request_buffer.next_request() == frame
+
+  assert libnit_protocol.unpack_request_frame(frame) == ('send', 1025, (0,), payload)
+
+  listener = LibnitListener(RecordingProcessor())
+  assert listener.make_framed_network_request(frame) == (('send', 1025, payload, 0), -1)
+
+  connect_frame = libnit_protocol.pack_request_frame('connect', 1025, (0x7f000001, 8101))
+  assert listener.make_framed_network_request(connect_frame) == \
+      (('connect', 1025, '127.0.0.1', 8101), -1)
+
+  # A call with the wrong number of integer arguments is rejected.
+  bad_frame = libnit_protocol.pack_request_frame('connect', 1025, (0x7f000001,))
+  try:
+    listener.make_framed_network_request(bad_frame)
+  except libnit_protocol.InvalidFrame:
+    pass
+  else:
+    assert False, "Expected InvalidFrame."
+
+
+
+def test_legacy_dispatch():
+  listener = LibnitListener(RecordingProcessor())
+
+  # The message is the last argument and may contain commas.
+  assert listener.make_network_request('send', '1025,0,a,b,c') == \
+      (('send', '1025', 'a,b,c', '0'), -1)
+
+  assert listener.make_network_request('recvfrom', '1025,100,0') == \
+      (('recvfrom', '1025', '100', '0'), -1)
+
+  # Calls the processor does not define reset the connection.
+  assert listener.make_network_request('listen', '1025,5') == (0, 104)
+  assert listener.make_network_request('bogus', '1025') == (0, 104)
+
+
+
+def test_response_frames():
+  header_size = libnit_protocol.RESPONSE_HEADER.size
+
+  response = libnit_protocol.pack_response_frame("data", -1)
+  assert libnit_protocol.RESPONSE_HEADER.unpack(response[:header_size]) == (4, -1, 4)
+  assert response[header_size:] == "data"
+
+  response = libnit_protocol.pack_response_frame(1025, -1)
+  assert libnit_protocol.RESPONSE_HEADER.unpack(response) == (0, -1, 1025)
+
+  response = libnit_protocol.pack_response_frame(None, 9)
+  assert libnit_protocol.RESPONSE_HEADER.unpack(response) == (0, 9, -1)
+
+
+
+def main():
+  """
+  Launch the main test for libnit_protocol.
+  """
+
+  test_legacy_requests()
+  test_framed_requests()
+  test_legacy_dispatch()
+  test_response_frames()
+
+
+
+if __name__ == '__main__':
+  main()